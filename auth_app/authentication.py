@@ -0,0 +1,170 @@
+# users/authentication.py
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.functional import SimpleLazyObject
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+# Claims copied from CustomUser into every token, enough to answer
+# "who is this and what may they do" without loading the row.
+ROLE_CLAIM = 'role'
+IS_ACTIVE_CLAIM = 'is_active'
+
+
+def add_user_claims(token, user):
+    token[ROLE_CLAIM] = user.role
+    token[IS_ACTIVE_CLAIM] = user.is_active
+    return token
+
+
+class ClaimsRefreshToken(RefreshToken):
+    """Refresh token carrying role/is_active; access tokens derived from it inherit the claims"""
+
+    @classmethod
+    def for_user(cls, user):
+        return add_user_claims(super().for_user(user), user)
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = ClaimsRefreshToken
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        # Re-stamp the claims so role changes reach the client on the next refresh
+        access = AccessToken(data['access'])
+        user = get_cached_user(access[api_settings.USER_ID_CLAIM])
+        if user is not None:
+            data['access'] = str(add_user_claims(access, user))
+        return data
+
+
+# ============================ USER CACHE ============================
+_user_cache = {}
+_user_cache_lock = threading.Lock()
+
+
+def get_cached_user(user_id):
+    """
+    Return a fresh CustomUser instance for user_id, served from a short-TTL
+    in-process cache of row values. Entries are dropped on user save/delete
+    (see the receivers in models.py). Returns None if the user does not exist.
+    """
+    User = get_user_model()
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+
+    now = time.monotonic()
+    with _user_cache_lock:
+        entry = _user_cache.get(user_id)
+    if entry is None or entry[0] < now:
+        field_names = [f.attname for f in User._meta.concrete_fields]
+        values = User._default_manager.filter(pk=user_id).values_list(*field_names).first()
+        if values is None:
+            return None
+        entry = (now + getattr(settings, 'AUTH_USER_CACHE_TTL', 30), field_names, values)
+        with _user_cache_lock:
+            if len(_user_cache) >= getattr(settings, 'AUTH_USER_CACHE_SIZE', 1024):
+                _user_cache.clear()
+            _user_cache[user_id] = entry
+
+    # Build a new instance per call so requests never share mutable model state
+    return User.from_db(User._default_manager.db, entry[1], entry[2])
+
+
+def invalidate_cached_user(user_id):
+    with _user_cache_lock:
+        _user_cache.pop(user_id, None)
+
+
+def clear_user_cache():
+    # For queryset.update() on many users, which sends no post_save
+    with _user_cache_lock:
+        _user_cache.clear()
+
+
+# ============================ STATELESS JWT AUTH ============================
+class ClaimsUser(SimpleLazyObject):
+    """
+    request.user built from token claims. id, pk, role, is_active and
+    is_admin are answered from the token; touching anything else (profile,
+    email, passing it to the ORM, ...) loads the full CustomUser through
+    get_cached_user(), so existing views keep working unchanged.
+    """
+
+    def __init__(self, user_id, role, is_active):
+        super().__init__(lambda: self._load_user())
+        self.__dict__['_claims'] = {'id': user_id, 'role': role, 'is_active': is_active}
+
+    def _load_user(self):
+        user = get_cached_user(self.__dict__['_claims']['id'])
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        return user
+
+    @property
+    def id(self):
+        return self.__dict__['_claims']['id']
+
+    @property
+    def pk(self):
+        return self.__dict__['_claims']['id']
+
+    @property
+    def role(self):
+        return self.__dict__['_claims']['role']
+
+    @property
+    def is_active(self):
+        return self.__dict__['_claims']['is_active']
+
+    @property
+    def is_admin(self):
+        return self.role == get_user_model().Role.ADMIN
+
+    def __bool__(self):
+        # IsAuthenticated does bool(request.user); don't load the row for it
+        return True
+
+    @property
+    def is_authenticated(self):
+        return True
+
+    @property
+    def is_anonymous(self):
+        return False
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication without the per-request CustomUser query.
+    Tokens issued by ClaimsRefreshToken produce a ClaimsUser; older tokens
+    without the claims fall back to the cached full user.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = int(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError, TypeError, ValueError):
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        if ROLE_CLAIM in validated_token and IS_ACTIVE_CLAIM in validated_token:
+            user = ClaimsUser(user_id, validated_token[ROLE_CLAIM], validated_token[IS_ACTIVE_CLAIM])
+        else:
+            user = get_cached_user(user_id)
+            if user is None:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return user
@@ -0,0 +1,256 @@
+# users/downloads.py
+"""
+File downloads for FileFields and other files under MEDIA_ROOT.
+
+send_file() answers a request with a file in one of two ways:
+
+* DOWNLOADS['SENDFILE_BACKEND'] set: the front proxy sends the bytes.
+  Django only checks the conditional headers (304/412 without touching the
+  proxy) and replies with an empty body plus
+    'x-sendfile'        X-Sendfile: <absolute path>    (Apache mod_xsendfile, lighttpd)
+    'x-accel-redirect'  X-Accel-Redirect: <ACCEL_PREFIX><media path>    (nginx)
+  The proxy then handles Range itself. For nginx, ACCEL_PREFIX must be an
+  `internal` location aliased to MEDIA_ROOT. Files outside MEDIA_ROOT are
+  served in process.
+* otherwise streaming.ranged_file_response(): conditional GET, Range, and a
+  FileResponse over the file descriptor that sendfile-capable WSGI servers
+  send with os.sendfile().
+
+Either way the file is never read into Python buffers by the view.
+
+zip_stream() builds a ZIP archive of several files while it is sent: each
+entry is written through a generator in BLOCK_SIZE pieces, so the first
+bytes go out at once and memory stays constant whatever the archive size.
+Files that are already compressed (PDF, images, video, office documents)
+are stored as they are, everything else is deflated.
+
+DownloadMixin gives viewsets download_response() for their download
+actions and bundle_response() for ZIP bundles of their filtered queryset.
+"""
+import mimetypes
+import os
+import time
+import zipfile
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date
+from django.utils.text import slugify
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import streaming
+
+DOWNLOADS_DEFAULTS = {
+    'SENDFILE_BACKEND': None,       # None, 'x-sendfile' or 'x-accel-redirect'
+    'ACCEL_PREFIX': '/protected-media/',
+    'MAX_BUNDLE_FILES': 1000,
+}
+
+# Formats whose content is compressed already: deflating them again costs
+# CPU and saves nothing
+STORED_EXTENSIONS = {
+    '.pdf', '.jpg', '.jpeg', '.png', '.gif', '.webp', '.mp4', '.mov', '.webm', '.m4v',
+    '.mp3', '.m4a', '.zip', '.gz', '.docx', '.xlsx', '.pptx', '.odt', '.ods', '.odp',
+}
+
+# Earliest time a ZIP entry can carry
+_ZIP_EPOCH = time.mktime((1980, 1, 1, 0, 0, 0, 0, 0, -1))
+
+
+def download_setting(name):
+    return getattr(settings, 'DOWNLOADS', {}).get(name, DOWNLOADS_DEFAULTS[name])
+
+
+def _media_path(path):
+    """`path` relative to MEDIA_ROOT, or None when it is outside"""
+    root = os.path.realpath(settings.MEDIA_ROOT)
+    path = os.path.realpath(path)
+    if os.path.commonpath([root, path]) != root:
+        return None
+    return os.path.relpath(path, root).replace(os.sep, '/')
+
+
+def _offload_header(path):
+    backend = download_setting('SENDFILE_BACKEND')
+    if backend == 'x-sendfile':
+        return 'X-Sendfile', path
+    if backend == 'x-accel-redirect':
+        media_path = _media_path(path)
+        if media_path is not None:
+            return 'X-Accel-Redirect', quote(download_setting('ACCEL_PREFIX').rstrip('/') + '/' + media_path)
+    return None
+
+
+def send_file(request, path, content_type=None, filename=None, as_attachment=False):
+    """Response for the file at `path`: offloaded to the front proxy when configured, else ranged"""
+    offload = _offload_header(path)
+    if offload is None:
+        return streaming.ranged_file_response(
+            request, path, content_type=content_type, filename=filename, as_attachment=as_attachment
+        )
+
+    stat = os.stat(path)
+    etag = streaming.file_etag(stat)
+    last_modified = int(stat.st_mtime)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        if content_type is None:
+            content_type, _ = mimetypes.guess_type(filename or path)
+        response = HttpResponse(content_type=content_type or 'application/octet-stream')
+        response[offload[0]] = offload[1]
+        if as_attachment or filename:
+            response['Content-Disposition'] = content_disposition_header(
+                as_attachment, filename or os.path.basename(path)
+            )
+        response['Last-Modified'] = http_date(last_modified)
+    response['ETag'] = etag
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def field_file_response(request, field_file, filename=None, as_attachment=True):
+    """Download of a FileField value; Http404 when it is empty or missing on disk"""
+    if not field_file:
+        raise Http404("File not found")
+    try:
+        path = field_file.path
+    except NotImplementedError:
+        # Only files on local storage can be sent
+        raise Http404("File not found")
+    if not os.path.isfile(path):
+        raise Http404("File not found")
+    return send_file(
+        request, path, filename=filename or os.path.basename(field_file.name), as_attachment=as_attachment
+    )
+
+
+# ============================ ZIP BUNDLES ============================
+class _ZipSink:
+    """Write-only, unseekable target for ZipFile; drain() hands over what was written since the last call"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def archive_names(names):
+    """Unique archive entry names (base names, numbered on collision) for storage names"""
+    used = set()
+    result = []
+    for name in names:
+        stem, ext = os.path.splitext(os.path.basename(name))
+        candidate, number = stem + ext, 1
+        while candidate.lower() in used:
+            number += 1
+            candidate = f'{stem} ({number}){ext}'
+        used.add(candidate.lower())
+        result.append(candidate)
+    return result
+
+
+def zip_stream(entries):
+    """Generator of a ZIP archive of [(path, archive name)]; files that disappeared are left out"""
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for path, name in entries:
+            try:
+                file = open(path, 'rb')
+            except FileNotFoundError:
+                continue
+            with file:
+                stat = os.fstat(file.fileno())
+                info = zipfile.ZipInfo(name, date_time=time.localtime(max(stat.st_mtime, _ZIP_EPOCH))[:6])
+                info.file_size = stat.st_size
+                info.external_attr = 0o644 << 16
+                stored = os.path.splitext(name)[1].lower() in STORED_EXTENSIONS
+                info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+                with archive.open(info, 'w') as target:
+                    for block in iter(lambda: file.read(streaming.BLOCK_SIZE), b''):
+                        target.write(block)
+                        data = sink.drain()
+                        if data:
+                            yield data
+            # Rest of the entry and its data descriptor
+            yield sink.drain()
+    # The central directory, written when the archive closes
+    yield sink.drain()
+
+
+def zip_response(names, storage, filename):
+    """Streaming ZIP download of the files stored under `names`"""
+    entries = zip(
+        (storage.path(name) for name in names),
+        archive_names(names),
+    )
+    response = StreamingHttpResponse(zip_stream(entries), content_type='application/zip')
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+class DownloadMixin:
+    """
+    download_response() for viewset download actions and bundle_response()
+    for ZIP bundles. download_field names the FileField; download_error is
+    the 404 message.
+    """
+    download_field = 'document'
+    download_error = 'Document not found'
+
+    def download_filename(self, obj, field_file):
+        return os.path.basename(field_file.name)
+
+    def download_response(self, request, obj, field=None):
+        field_file = getattr(obj, field or self.download_field)
+        try:
+            return field_file_response(request, field_file, filename=self.download_filename(obj, field_file))
+        except Http404:
+            return Response({'error': self.download_error}, status=status.HTTP_404_NOT_FOUND)
+
+    def bundle_response(self, request, field=None):
+        """
+        ZIP of the files of the filtered queryset (the list endpoint's
+        filters apply), optionally limited to ?id=1&id=2...
+        """
+        field = field or self.download_field
+        queryset = self.filter_queryset(self.get_queryset())
+        ids = request.query_params.getlist('id')
+        if ids:
+            try:
+                queryset = queryset.filter(pk__in=[int(pk) for pk in ids])
+            except ValueError:
+                return Response({'error': 'id must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = download_setting('MAX_BUNDLE_FILES')
+        names = list(
+            queryset.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+            .values_list(field, flat=True)[:limit + 1]
+        )
+        if not names:
+            return Response({'error': 'No files to bundle'}, status=status.HTTP_404_NOT_FOUND)
+        if len(names) > limit:
+            return Response(
+                {'error': f'At most {limit} files can be bundled, narrow the filters'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        model = queryset.model
+        filename = f"{slugify(model._meta.verbose_name_plural)}.zip"
+        return zip_response(names, model._meta.get_field(field).storage, filename)
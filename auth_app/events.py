@@ -0,0 +1,125 @@
+# users/events.py
+"""
+In-process pub/sub for message events, consumed by the server-sent events
+stream in views.MessageEventStreamView.
+
+Events are published after the transaction that produced them commits:
+
+    message.created  -> the serialized Message
+    unread.count     -> {"new_messages_count": <MessageCounter value>}
+
+Each subscriber is an asyncio.Queue bound to the event loop of its stream;
+publishers may run on any thread. The broker only sees events from its own
+process, so streams also fall back to polling the database every
+MESSAGE_EVENTS['DB_POLL_INTERVAL'] seconds to pick up changes made by other
+workers.
+"""
+import asyncio
+import itertools
+import json
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+EVENTS_DEFAULTS = {
+    'HISTORY': 256,             # recent events kept for Last-Event-ID resume
+    'QUEUE_SIZE': 100,          # per-subscriber backlog before old events are dropped
+    'KEEPALIVE': 15,            # seconds between keepalive comments
+    'DB_POLL_INTERVAL': 30,     # seconds between fallback DB checks (None disables)
+    'RETRY': 3000,              # ms the browser waits before reconnecting
+}
+
+MESSAGE_CREATED = 'message.created'
+UNREAD_COUNT = 'unread.count'
+
+
+def events_setting(name):
+    return getattr(settings, 'MESSAGE_EVENTS', {}).get(name, EVENTS_DEFAULTS[name])
+
+
+class Event:
+    __slots__ = ('id', 'name', 'data')
+
+    def __init__(self, event_id, name, data):
+        self.id = event_id
+        self.name = name
+        self.data = data
+
+    def encode(self):
+        payload = json.dumps(self.data, cls=DjangoJSONEncoder)
+        event_id = f"id: {self.id}\n" if self.id is not None else ''
+        return f"{event_id}event: {self.name}\ndata: {payload}\n\n"
+
+
+class Broker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._history = deque(maxlen=events_setting('HISTORY'))
+        self._subscribers = set()
+
+    def publish(self, name, data):
+        with self._lock:
+            event = Event(next(self._ids), name, data)
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, event)
+            except RuntimeError:
+                # Loop already closed, the stream's finally block removes it
+                pass
+        return event
+
+    @staticmethod
+    def _offer(queue, event):
+        if queue.full():
+            # Slow client: drop its oldest event rather than block publishers
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    def subscribe(self, last_event_id=None):
+        """
+        Register a queue on the running loop. Returns (entry, resumed) where
+        resumed is False if last_event_id is no longer in the history (the
+        caller should send a fresh snapshot instead of a replay).
+        """
+        queue = asyncio.Queue(maxsize=events_setting('QUEUE_SIZE'))
+        entry = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            resumed = False
+            if last_event_id is not None and self._history:
+                oldest = self._history[0].id
+                if oldest - 1 <= last_event_id <= self._history[-1].id:
+                    resumed = True
+                    for event in self._history:
+                        if event.id > last_event_id:
+                            self._offer(queue, event)
+            self._subscribers.add(entry)
+        return entry, resumed
+
+    def unsubscribe(self, entry):
+        with self._lock:
+            self._subscribers.discard(entry)
+
+
+broker = Broker()
+
+
+# ============================ PUBLISHERS ============================
+def publish_message_created(message):
+    def publish():
+        from .serializers import MessageSerializer
+        broker.publish(MESSAGE_CREATED, MessageSerializer(message).data)
+    transaction.on_commit(publish)
+
+
+def publish_unread_count():
+    def publish():
+        from .models import MessageCounter
+        # One read per change, shared by every open stream
+        broker.publish(UNREAD_COUNT, {'new_messages_count': MessageCounter.get_value(MessageCounter.UNREAD)})
+    transaction.on_commit(publish)
@@ -0,0 +1,119 @@
+# users/hashers.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher,
+    ScryptPasswordHasher,
+    make_password,
+    verify_password,
+)
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+def _profile_param(name, default):
+    """Read a tuning parameter from AUTH_HASHER_PARAMS, falling back to Django's default"""
+    return getattr(settings, 'AUTH_HASHER_PARAMS', {}).get(name, default)
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    """
+    Scrypt hasher whose cost is read from settings.AUTH_HASHER_PARAMS.
+    Keeps the 'scrypt' algorithm name so hashes stay compatible with Django's hasher.
+    """
+
+    @property
+    def work_factor(self):
+        return _profile_param('scrypt_work_factor', ScryptPasswordHasher.work_factor)
+
+    @property
+    def block_size(self):
+        return _profile_param('scrypt_block_size', ScryptPasswordHasher.block_size)
+
+    @property
+    def parallelism(self):
+        return _profile_param('scrypt_parallelism', ScryptPasswordHasher.parallelism)
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """
+    Argon2 hasher whose cost is read from settings.AUTH_HASHER_PARAMS.
+    Requires the argon2-cffi package when selected as the active profile.
+    """
+
+    @property
+    def time_cost(self):
+        return _profile_param('argon2_time_cost', Argon2PasswordHasher.time_cost)
+
+    @property
+    def memory_cost(self):
+        return _profile_param('argon2_memory_cost', Argon2PasswordHasher.memory_cost)
+
+    @property
+    def parallelism(self):
+        return _profile_param('argon2_parallelism', Argon2PasswordHasher.parallelism)
+
+
+# ============================ HASHING POOL ============================
+class HasherBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Authentication service is busy. Please try again shortly.'
+    default_code = 'hasher_busy'
+
+
+_pool = None
+_pool_slots = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool, _pool_slots
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                workers = getattr(settings, 'AUTH_HASHER_POOL_SIZE', 2)
+                queue_depth = getattr(settings, 'AUTH_HASHER_QUEUE_DEPTH', workers * 4)
+                _pool_slots = threading.BoundedSemaphore(workers + queue_depth)
+                _pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='auth-hasher')
+    return _pool, _pool_slots
+
+
+def run_in_hash_pool(func, *args):
+    """
+    Run a CPU-heavy hashing call on the bounded hasher pool.
+
+    hashlib's scrypt/pbkdf2 and argon2-cffi release the GIL, so at most
+    AUTH_HASHER_POOL_SIZE hashes run at once no matter how many request threads
+    are logging in. Callers beyond the queue depth wait up to
+    AUTH_HASHER_QUEUE_TIMEOUT seconds and then get a 503 instead of piling up.
+    Only pure hashing goes through the pool; database access stays on the request thread.
+    """
+    if not getattr(settings, 'AUTH_PERFORMANCE_MODE', False):
+        return func(*args)
+
+    pool, slots = _get_pool()
+    if not slots.acquire(timeout=getattr(settings, 'AUTH_HASHER_QUEUE_TIMEOUT', 5)):
+        raise HasherBusy()
+    try:
+        return pool.submit(func, *args).result()
+    finally:
+        slots.release()
+
+
+def make_password_pooled(raw_password):
+    """make_password() executed on the hasher pool"""
+    return run_in_hash_pool(make_password, raw_password)
+
+
+def check_password_pooled(raw_password, encoded, setter=None):
+    """
+    Pooled equivalent of django.contrib.auth.hashers.check_password().
+    The verification runs on the pool; the setter (which rehashes and saves
+    outdated hashes, e.g. PBKDF2 -> scrypt) runs on the calling thread.
+    """
+    is_correct, must_update = run_in_hash_pool(verify_password, raw_password, encoded)
+    if setter and is_correct and must_update:
+        setter(raw_password)
+    return is_correct
@@ -0,0 +1,371 @@
+# users/imaging.py
+"""
+Resized WebP/JPEG variants of uploaded images, for thumbnails and srcset.
+
+Each raster Image gets up to one file per (size, format) of
+IMAGE_DERIVATIVES, scaled down to the size's width and never up:
+
+    images/derivatives/<image id>/<source stem>-<size>.webp / .jpg
+
+The source stem (the uuid name of the upload) is part of the file name, so
+replacing the image changes every variant URL and the files can be cached
+forever. Names and dimensions follow from the Image row alone, which lets
+ImageSerializer emit srcset without touching the disk.
+
+Variants are written in the background after an upload commits. A variant
+that does not exist yet (older images, job still queued) is generated on
+the first request for it by serve_media.
+
+extract_metadata() reads what the Image row stores (size, displayed
+dimensions, dominant colour, BlurHash placeholder) from the upload itself,
+before it is saved: only the header and a reduced-scale decode are needed.
+"""
+import logging
+import math
+import os
+import re
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image as PILImage, ImageOps
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVES_DEFAULTS = {
+    'ENABLED': True,
+    'SIZES': {'thumb': 320, 'medium': 800, 'large': 1600},   # name -> max width in pixels
+    'FORMATS': ('webp', 'jpeg'),
+    'QUALITY': {'webp': 80, 'jpeg': 82},
+    'WORKERS': 1,
+}
+
+OUTPUT_DIR = 'images/derivatives'
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+
+_NAME_RE = re.compile(r'^%s/(\d+)/(.+)-([a-z0-9_]+)\.(webp|jpg)$' % re.escape(OUTPUT_DIR))
+
+# EXIF orientations that swap width and height
+_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+def derivatives_setting(name):
+    return getattr(settings, 'IMAGE_DERIVATIVES', {}).get(name, DERIVATIVES_DEFAULTS[name])
+
+
+def oriented_size(img):
+    """(width, height) of an open PIL image as displayed, i.e. after EXIF rotation"""
+    width, height = img.size
+    if img.getexif().get(0x0112) in _TRANSPOSED_ORIENTATIONS:
+        return height, width
+    return width, height
+
+
+def parse_dimensions(dimensions):
+    try:
+        width, height = (int(value) for value in dimensions.split('x'))
+    except (AttributeError, ValueError):
+        return None
+    return (width, height) if width > 0 and height > 0 else None
+
+
+def _stem(image):
+    return os.path.splitext(os.path.basename(image.image_file.name))[0]
+
+
+def derivative_name(image, size, fmt):
+    return f'{OUTPUT_DIR}/{image.pk}/{_stem(image)}-{size}.{EXTENSIONS[fmt]}'
+
+
+def plan(image):
+    """[(size, width, height)] for the variants of image, smallest first"""
+    if not image.image_file or image.file_format == 'svg':
+        return []
+    dimensions = parse_dimensions(image.dimensions)
+    if dimensions is None:
+        return []
+    width, height = dimensions
+    variants = []
+    for size, max_width in sorted(derivatives_setting('SIZES').items(), key=lambda item: item[1]):
+        if max_width >= width:
+            # Never upscale; the original is the next srcset candidate
+            break
+        variants.append((size, max_width, max(1, round(height * max_width / width))))
+    return variants
+
+
+def variants(image):
+    """Serializer view: {size: {'width', 'height', <format>: url}}"""
+    formats = derivatives_setting('FORMATS')
+    return {
+        size: {'width': width, 'height': height,
+               **{fmt: default_storage.url(derivative_name(image, size, fmt)) for fmt in formats}}
+        for size, width, height in plan(image)
+    }
+
+
+def srcset(image, fmt):
+    """`srcset` value listing the variants in fmt and the original"""
+    if fmt not in derivatives_setting('FORMATS'):
+        return ''
+    candidates = [
+        f'{default_storage.url(derivative_name(image, size, fmt))} {width}w'
+        for size, width, _ in plan(image)
+    ]
+    dimensions = parse_dimensions(image.dimensions)
+    if image.image_file and dimensions:
+        candidates.append(f'{image.image_file.url} {dimensions[0]}w')
+    return ', '.join(candidates)
+
+
+# ============================ METADATA ============================
+# Tiny picture the colour summaries are computed from
+ANALYSIS_SIZE = 32
+BLURHASH_COMPONENTS = (4, 3)   # x, y
+_BASE83 = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~'
+_SRGB_TO_LINEAR = [
+    value / 12.92 if value <= 0.04045 else ((value + 0.055) / 1.055) ** 2.4
+    for value in (v / 255 for v in range(256))
+]
+
+
+def extract_metadata(upload):
+    """
+    Model field values for an uploaded (not yet saved) image file:
+    file_size, and for raster images dimensions (as displayed, after EXIF
+    rotation), dominant_color and blurhash. Fields that cannot be read are
+    left out; the upload is rewound for the storage.
+    """
+    metadata = {'file_size': upload.size}
+    if os.path.splitext(upload.name)[1].lower() == '.svg':
+        return metadata
+    try:
+        upload.seek(0)
+        with PILImage.open(upload) as img:
+            width, height = oriented_size(img)
+            metadata['dimensions'] = f"{width}x{height}"
+            img.draft('RGB', (ANALYSIS_SIZE * 2, ANALYSIS_SIZE * 2))
+            picture = ImageOps.exif_transpose(img)
+        picture = _flatten(picture)
+        picture.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE), PILImage.BILINEAR, reducing_gap=2.0)
+        metadata['dominant_color'] = dominant_color(picture)
+        metadata['blurhash'] = blurhash(picture, *BLURHASH_COMPONENTS)
+    except (OSError, ValueError, PILImage.DecompressionBombError) as e:
+        logger.warning("Could not read image metadata of %s: %s", upload.name, e)
+    finally:
+        upload.seek(0)
+    return metadata
+
+
+def _flatten(picture):
+    """RGB copy of picture, transparent areas on white"""
+    if picture.mode == 'RGB':
+        return picture
+    if 'transparency' in picture.info or picture.mode in ('RGBA', 'LA', 'PA', 'P'):
+        picture = picture.convert('RGBA')
+        flattened = PILImage.new('RGB', picture.size, (255, 255, 255))
+        flattened.paste(picture, mask=picture.getchannel('A'))
+        return flattened
+    return picture.convert('RGB')
+
+
+def dominant_color(picture):
+    """'#rrggbb' of the most common colour of an RGB picture, after reducing it to a small palette"""
+    quantized = picture.quantize(colors=8, method=PILImage.Quantize.MEDIANCUT)
+    _, index = max(quantized.getcolors())
+    red, green, blue = quantized.getpalette()[index * 3:index * 3 + 3]
+    return f'#{red:02x}{green:02x}{blue:02x}'
+
+
+def blurhash(picture, x_components, y_components):
+    """BlurHash (https://blurha.sh) of an RGB picture"""
+    width, height = picture.size
+    pixels = [tuple(_SRGB_TO_LINEAR[channel] for channel in pixel) for pixel in picture.getdata()]
+    factors = []
+    for j in range(y_components):
+        cos_y = [math.cos(math.pi * j * y / height) for y in range(height)]
+        for i in range(x_components):
+            cos_x = [math.cos(math.pi * i * x / width) for x in range(width)]
+            red = green = blue = 0.0
+            for y in range(height):
+                row = y * width
+                for x in range(width):
+                    basis = cos_x[x] * cos_y[y]
+                    r, g, b = pixels[row + x]
+                    red += basis * r
+                    green += basis * g
+                    blue += basis * b
+            scale = (1 if i == j == 0 else 2) / (width * height)
+            factors.append((red * scale, green * scale, blue * scale))
+
+    dc, ac = factors[0], factors[1:]
+    result = _base83((x_components - 1) + (y_components - 1) * 9, 1)
+    if ac:
+        quantised_max = max(0, min(82, math.floor(max(abs(value) for factor in ac for value in factor) * 166 - 0.5)))
+        maximum = (quantised_max + 1) / 166
+        result += _base83(quantised_max, 1)
+    else:
+        maximum = 1
+        result += _base83(0, 1)
+    result += _base83((_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2]), 4)
+    for factor in ac:
+        r, g, b = (
+            max(0, min(18, math.floor(math.copysign(abs(value / maximum) ** 0.5, value) * 9 + 9.5)))
+            for value in factor
+        )
+        result += _base83(r * 19 * 19 + g * 19 + b, 2)
+    return result
+
+
+def _linear_to_srgb(value):
+    value = max(0.0, min(1.0, value))
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def _base83(value, length):
+    return ''.join(_BASE83[value // 83 ** (length - i) % 83] for i in range(1, length + 1))
+
+
+# ============================ GENERATION ============================
+def generate_derivatives(image):
+    """Write every missing variant of image and drop variants of earlier files. Returns the names written."""
+    variants_plan = plan(image)
+    directory = default_storage.path(f'{OUTPUT_DIR}/{image.pk}')
+    stem = _stem(image)
+    if os.path.isdir(directory):
+        for entry in os.scandir(directory):
+            if not entry.name.startswith(f'{stem}-'):
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+    if not variants_plan:
+        return []
+
+    formats = derivatives_setting('FORMATS')
+    quality = derivatives_setting('QUALITY')
+    missing = [
+        (size, width, height) for size, width, height in variants_plan
+        if any(not default_storage.exists(derivative_name(image, size, fmt)) for fmt in formats)
+    ]
+    if not missing:
+        return []
+
+    os.makedirs(directory, exist_ok=True)
+    written = []
+    with PILImage.open(image.image_file.path) as img:
+        # JPEG sources decode straight at a reduced scale (DCT scaling);
+        # draft() works on the stored, not yet rotated, orientation
+        _, width, height = missing[-1]
+        img.draft('RGB', (width, height) if oriented_size(img) == img.size else (height, width))
+        current = ImageOps.exif_transpose(img)
+        if current.mode not in ('RGB', 'RGBA'):
+            current = current.convert('RGBA' if 'transparency' in current.info or current.mode in ('LA', 'PA') else 'RGB')
+
+        # Largest first, each variant resized from the previous one
+        for size, width, height in reversed(missing):
+            current = current.resize((width, height), PILImage.LANCZOS, reducing_gap=3.0)
+            for fmt in formats:
+                name = derivative_name(image, size, fmt)
+                _save(current, default_storage.path(name), fmt, quality[fmt])
+                written.append(name)
+    return written
+
+
+def _save(img, path, fmt, quality):
+    if fmt == 'jpeg' and img.mode == 'RGBA':
+        flattened = PILImage.new('RGB', img.size, (255, 255, 255))
+        flattened.paste(img, mask=img.getchannel('A'))
+        img = flattened
+    options = {'quality': quality}
+    if fmt == 'jpeg':
+        options.update(optimize=True, progressive=True)
+    else:
+        options.update(method=4)
+    # Written next to the target and renamed, so readers never see half a file
+    temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        img.save(temporary, format=fmt.upper(), **options)
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+
+def ensure_derivative(name):
+    """
+    Generate the variants of the image `name` belongs to, if name is a
+    current variant. Returns True when the file exists afterwards.
+    """
+    match = _NAME_RE.match(name)
+    if match is None or not derivatives_setting('ENABLED'):
+        return False
+    from .models import Image
+
+    image_id, stem, size, _ = match.groups()
+    image = Image.objects.filter(pk=image_id).first()
+    if image is None or not image.image_file or _stem(image) != stem:
+        return False
+    if size not in {variant[0] for variant in plan(image)}:
+        return False
+    try:
+        generate_derivatives(image)
+    except (OSError, ValueError, PILImage.DecompressionBombError) as e:
+        logger.warning("Could not generate variants of image %s: %s", image.pk, e)
+        return False
+    return default_storage.exists(name)
+
+
+def is_derivative(name):
+    return _NAME_RE.match(name) is not None
+
+
+def delete_derivatives(image):
+    try:
+        path = default_storage.path(f'{OUTPUT_DIR}/{image.pk}')
+    except NotImplementedError:
+        return
+    shutil.rmtree(path, ignore_errors=True)
+
+
+# ============================ QUEUE ============================
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(
+                    max_workers=derivatives_setting('WORKERS'), thread_name_prefix='image-derivatives'
+                )
+    return _pool
+
+
+def schedule_derivatives(image):
+    """Generate the variants of image in the background once the current transaction commits"""
+    if not derivatives_setting('ENABLED') or not plan(image):
+        return
+    image_id = image.pk
+    transaction.on_commit(lambda: _get_pool().submit(_run_job, image_id))
+
+
+def _run_job(image_id):
+    from .models import Image
+
+    close_old_connections()
+    try:
+        image = Image.objects.filter(pk=image_id).first()
+        if image is not None:
+            generate_derivatives(image)
+    except Exception:
+        logger.exception("Could not generate variants of image %s", image_id)
+    finally:
+        close_old_connections()
@@ -0,0 +1,72 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from auth_app.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark login throughput (password verification stage of UserLoginAPIView) "
+        "for each hasher profile, with and without the bounded hasher pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', default='pbkdf2,scrypt',
+                            help="Comma separated hasher profiles (pbkdf2, scrypt, argon2)")
+        parser.add_argument('--clients', type=int, default=16,
+                            help="Concurrent login requests")
+        parser.add_argument('--logins', type=int, default=200,
+                            help="Logins per profile")
+        parser.add_argument('--no-pool', action='store_true',
+                            help="Hash on the request threads (AUTH_PERFORMANCE_MODE=False)")
+
+    def handle(self, *args, **options):
+        profiles = [p.strip() for p in options['profiles'].split(',') if p.strip()]
+        unknown = set(profiles) - set(settings.AUTH_HASHER_PROFILES)
+        if unknown:
+            raise CommandError(f"Unknown profile(s): {', '.join(sorted(unknown))}")
+
+        pooled = not options['no_pool']
+        self.stdout.write(
+            f"clients={options['clients']} logins={options['logins']} "
+            f"pool={'on (%d workers)' % settings.AUTH_HASHER_POOL_SIZE if pooled else 'off'}"
+        )
+        for profile in profiles:
+            hashers = [settings.AUTH_HASHER_PROFILES[profile]] + [
+                h for h in settings.PASSWORD_HASHERS if h != settings.AUTH_HASHER_PROFILES[profile]
+            ]
+            with override_settings(PASSWORD_HASHERS=hashers, AUTH_PERFORMANCE_MODE=pooled):
+                self._run_profile(profile, options['clients'], options['logins'])
+
+    def _run_profile(self, profile, clients, logins):
+        password = 'Bench-Passw0rd!'
+        # Unsaved user: the benchmark never touches the database.
+        user = CustomUser(username='UDOM-ZONE-BENCH', email='bench@example.com')
+        try:
+            user.set_password(password)
+        except ValueError as e:
+            self.stdout.write(self.style.WARNING(f"{profile:>8}: skipped ({e})"))
+            return
+
+        def one_login(_):
+            started = time.perf_counter()
+            if not user.check_password(password):
+                raise CommandError("Password verification failed")
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            latencies = sorted(executor.map(one_login, range(logins)))
+        elapsed = time.perf_counter() - started
+
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        self.stdout.write(
+            f"{profile:>8}: {logins / elapsed:8.1f} logins/s  "
+            f"p50 {statistics.median(latencies) * 1000:7.1f} ms  "
+            f"p95 {p95 * 1000:7.1f} ms"
+        )
@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, models, transaction
+from django.db.models.signals import post_save
+from django.test.utils import CaptureQueriesContext
+
+from auth_app.models import CustomUser, UserProfile
+
+
+def legacy_save_user_profile(sender, instance, **kwargs):
+    # The receiver removed in favour of CustomUser.get_profile(): lazy-load the
+    # profile and write it back on every user save.
+    if hasattr(instance, 'profile'):
+        models.Model.save(instance.profile)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark CustomUser updates per second (load user, change a field, save), "
+        "with the current profile lifecycle and with the legacy save_user_profile receiver. "
+        "Runs inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200, help="Users to create")
+        parser.add_argument('--updates', type=int, default=2000, help="Updates per run")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            pks = self._create_users(options['users'])
+            for label, legacy in (('legacy signals', True), ('current', False)):
+                self._run(label, legacy, pks, options['updates'])
+            transaction.set_rollback(True)
+
+    def _create_users(self, count):
+        users = CustomUser.objects.bulk_create([
+            CustomUser(
+                username=f'UDOM-ZONE-BENCH-{i:06d}', email=f'bench-user-{i}@example.com',
+                first_name='Bench', last_name=str(i), password='!',
+            )
+            for i in range(count)
+        ])
+        UserProfile.create_missing()
+        return [user.pk for user in users]
+
+    def _run(self, label, legacy, pks, updates):
+        if legacy:
+            post_save.connect(legacy_save_user_profile, sender=CustomUser, dispatch_uid='bench-legacy-profile')
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                for i in range(updates):
+                    user = CustomUser.objects.get(pk=pks[i % len(pks)])
+                    user.is_active = not user.is_active
+                    user.save()
+                elapsed = time.perf_counter() - started
+        finally:
+            post_save.disconnect(sender=CustomUser, dispatch_uid='bench-legacy-profile')
+
+        self.stdout.write(
+            f"{label:>15}: {updates / elapsed:8.1f} updates/s  "
+            f"{len(queries) / updates:4.1f} queries/update"
+        )
@@ -0,0 +1,101 @@
+import os
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models
+
+from auth_app import imaging, transcoding
+from auth_app.models import FileBlob, FileBlobReference
+from auth_app.storage import ContentAddressedStorage, blob_name, file_digest
+
+# Written by background jobs and deleted as directories, never through the storage
+GENERATED_DIRS = (f'{transcoding.OUTPUT_DIR}/', f'{imaging.OUTPUT_DIR}/')
+
+
+class Command(BaseCommand):
+    help = (
+        "Hash media files referenced by FileFields that are not in the content store yet, "
+        "hard-link duplicates to one blob and recount blob references."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report what would be linked, change nothing")
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError("The default storage is not auth_app.storage.ContentAddressedStorage")
+        dry_run = options['dry_run']
+
+        referenced = set(FileBlobReference.objects.values_list('name', flat=True))
+        names = sorted(self.field_names() - referenced)
+        seen = set(FileBlob.objects.values_list('digest', flat=True))
+        added = linked = reclaimed = missing = 0
+
+        for name in names:
+            path = default_storage.path(name)
+            if not os.path.isfile(path):
+                missing += 1
+                continue
+            stat = os.stat(path)
+            digest = file_digest(path)
+            blob_path = default_storage.path(blob_name(digest))
+            duplicate = digest in seen
+            seen.add(digest)
+            if duplicate and stat.st_nlink == 1:
+                reclaimed += stat.st_size
+                linked += 1
+                self.log(options, f"{name}: duplicate of {digest[:12]}")
+            added += 1
+            if dry_run:
+                continue
+
+            if not os.path.exists(blob_path):
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                os.link(path, blob_path)
+            elif not os.path.samefile(path, blob_path):
+                # Swap the copy for a link to the blob, atomically
+                temporary = f'{path}.dedupe'
+                os.link(blob_path, temporary)
+                os.replace(temporary, path)
+            default_storage.add_reference(name, digest, stat.st_size)
+
+        recounted = 0 if dry_run else self.recount()
+
+        verb = "Would reference" if dry_run else "Referenced"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {added} files ({linked} duplicates, {reclaimed / (1024 * 1024):.1f}MB reclaimed); "
+            f"{missing} referenced files missing on disk; {recounted} blob counts corrected"
+        ))
+
+    def field_names(self):
+        """Every non-empty FileField value in the database, generated outputs excluded"""
+        names = set()
+        for model in apps.get_models():
+            fields = [
+                field.attname for field in model._meta.concrete_fields
+                if isinstance(field, models.FileField) and field.storage is default_storage
+            ]
+            for field in fields:
+                values = model._base_manager.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+                names.update(values.values_list(field, flat=True).distinct().iterator())
+        return {name for name in names if not name.startswith(GENERATED_DIRS)}
+
+    def recount(self):
+        """Set FileBlob.refcount from the references; drop blobs nothing points at"""
+        corrected = 0
+        for blob in FileBlob.objects.annotate(references_count=models.Count('references')):
+            if blob.refcount != blob.references_count:
+                FileBlob.objects.filter(pk=blob.pk).update(refcount=blob.references_count)
+                corrected += 1
+            if blob.references_count == 0:
+                blob.delete()
+                try:
+                    os.remove(default_storage.path(blob_name(blob.digest)))
+                except FileNotFoundError:
+                    pass
+        return corrected
+
+    def log(self, options, message):
+        if options['verbosity'] > 1:
+            self.stdout.write(message)
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from auth_app.models import Video
+from auth_app.transcoding import transcode_video
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the MP4/HLS rendition ladder for videos, synchronously. Use --pending after a "
+        "restart to finish uploads whose background job never ran."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', type=int, help="Video ids to (re)transcode")
+        parser.add_argument('--pending', action='store_true',
+                            help="Every video that is pending, processing or failed")
+
+    def handle(self, *args, **options):
+        ids = list(options['ids'])
+        if options['pending']:
+            ids += Video.objects.exclude(
+                transcode_status=Video.TranscodeStatus.READY
+            ).order_by('pk').values_list('pk', flat=True)
+        if not ids:
+            raise CommandError("Give video ids or --pending")
+
+        ids = list(dict.fromkeys(ids))
+        transcoded = 0
+        for video_id in ids:
+            started = time.perf_counter()
+            renditions = transcode_video(video_id)
+            elapsed = time.perf_counter() - started
+            if renditions is None:
+                self.stdout.write(self.style.ERROR(f"video {video_id}: failed ({elapsed:.1f}s)"))
+            else:
+                transcoded += 1
+                labels = sorted({r.label for r in renditions}, key=lambda label: int(label[:-1]))
+                self.stdout.write(f"video {video_id}: {', '.join(labels)} ({elapsed:.1f}s)")
+
+        summary = f"Transcoded {transcoded} of {len(ids)} videos"
+        if transcoded < len(ids):
+            raise CommandError(summary)
+        self.stdout.write(self.style.SUCCESS(summary))
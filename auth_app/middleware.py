@@ -0,0 +1,294 @@
+# users/middleware.py
+"""
+Per-route request instrumentation.
+
+RouteMetricsMiddleware counts every request per resolved route (router
+basename + viewset action, or URL name for plain views). For a sampled
+fraction of requests it also records histograms of total latency, DB query
+count, DB time, view time, serializer (.data) time and render time.
+MetricsAPIView in views.py renders them in the Prometheus text format.
+
+The view and render boundaries come from the process_view and
+process_template_response hooks. Serializer time is reported by viewsets
+using SerializerTimingMixin: their get_serializer() hands out a subclass of
+the serializer (and of its many=True list serializer) whose .data is timed.
+DRF itself is not patched.
+
+settings.API_METRICS_SAMPLE_RATE is the fraction of requests timed
+(0: requests are only counted). Metrics are per process.
+"""
+import contextvars
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from rest_framework import serializers
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+_current_request = contextvars.ContextVar('route_metrics_request', default=None)
+
+
+class _RequestStats:
+    __slots__ = (
+        'queries', 'db_time', 'view_started', 'view_time', 'render_started', 'render_time',
+        'serializer_time', 'serializer_depth',
+    )
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.view_started = None
+        self.view_time = None
+        self.render_started = None
+        self.render_time = 0.0
+
+    def rendered(self, response):
+        if self.render_started is not None:
+            self.render_time = time.perf_counter() - self.render_started
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.requests = defaultdict(int)    # (route, action, method, status) -> count
+        self.latency = {}                   # (route, action, method) -> Histogram
+        self.queries = {}
+        self.db_time = {}
+        self.view_time = {}
+        self.serializer_time = {}
+        self.render_time = {}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = RouteMetrics()
+
+    def observe(self, route, action, method, status, total=None, stats=None):
+        """Count the request; record its timings too when it was sampled (stats given)"""
+        key = (route, action, method)
+        with self._lock:
+            m = self._metrics
+            m.requests[key + (str(status),)] += 1
+            if stats is None:
+                return
+            for store, buckets, value in (
+                (m.latency, LATENCY_BUCKETS, total),
+                (m.queries, QUERY_BUCKETS, stats.queries),
+                (m.db_time, LATENCY_BUCKETS, stats.db_time),
+                (m.view_time, LATENCY_BUCKETS, stats.view_time or 0.0),
+                (m.serializer_time, LATENCY_BUCKETS, stats.serializer_time),
+                (m.render_time, LATENCY_BUCKETS, stats.render_time),
+            ):
+                histogram = store.get(key)
+                if histogram is None:
+                    histogram = store[key] = Histogram(buckets)
+                histogram.observe(value)
+
+    def reset(self):
+        with self._lock:
+            self._metrics = RouteMetrics()
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        with self._lock:
+            m = self._metrics
+            lines += [
+                '# HELP api_requests_total Requests handled, by route and status.',
+                '# TYPE api_requests_total counter',
+            ]
+            for (route, action, method, status), count in sorted(m.requests.items()):
+                labels = _labels(route=route, action=action, method=method, status=status)
+                lines.append(f'api_requests_total{{{labels}}} {count}')
+
+            for name, help_text, store in (
+                ('api_request_duration_seconds', 'Total request latency.', m.latency),
+                ('api_db_queries', 'Database queries per request.', m.queries),
+                ('api_db_duration_seconds', 'Time spent in database queries per request.', m.db_time),
+                ('api_view_duration_seconds', 'Time spent in the view, serializers included.', m.view_time),
+                ('api_serializer_duration_seconds', 'Time spent building serializer .data per request.', m.serializer_time),
+                ('api_render_duration_seconds', 'Time spent rendering the response body.', m.render_time),
+            ):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for (route, action, method), histogram in sorted(store.items()):
+                    labels = _labels(route=route, action=action, method=method)
+                    for bound, count in histogram.cumulative():
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                    lines.append(f'{name}_sum{{{labels}}} {histogram.sum:.6f}')
+                    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(**labels):
+    return ','.join(
+        '{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for k, v in labels.items()
+    )
+
+
+registry = MetricsRegistry()
+
+
+# ============================ SERIALIZER TIMING ============================
+class TimedDataMixin:
+    """Serializer mixin: .data reports its build time into the sampled request"""
+
+    @property
+    def data(self):
+        stats = _current_request.get()
+        if stats is None or stats.serializer_depth:
+            # Not sampled, or nested .data already being timed by the caller
+            return super().data
+        stats.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().data
+        finally:
+            stats.serializer_time += time.perf_counter() - started
+            stats.serializer_depth -= 1
+
+
+_timed_classes = {}
+_timed_classes_lock = threading.Lock()
+
+
+def timed_serializer_class(serializer_class):
+    """Subclass of serializer_class (and of its list serializer for many=True) with timed .data"""
+    timed = _timed_classes.get(serializer_class)
+    if timed is not None:
+        return timed
+    with _timed_classes_lock:
+        timed = _timed_classes.get(serializer_class)
+        if timed is None:
+            meta = getattr(serializer_class, 'Meta', None)
+            list_class = getattr(meta, 'list_serializer_class', serializers.ListSerializer)
+            timed_list = type(list_class.__name__, (TimedDataMixin, list_class), {
+                '__module__': list_class.__module__,
+            })
+            timed_meta = type('Meta', (meta,) if meta else (), {'list_serializer_class': timed_list})
+            timed = type(serializer_class.__name__, (TimedDataMixin, serializer_class), {
+                '__module__': serializer_class.__module__,
+                'Meta': timed_meta,
+            })
+            _timed_classes[serializer_class] = timed
+    return timed
+
+
+class SerializerTimingMixin:
+    """Viewset mixin: serializers from get_serializer() report .data time on sampled requests"""
+
+    def get_serializer(self, *args, **kwargs):
+        if _current_request.get() is None:
+            return super().get_serializer(*args, **kwargs)
+        serializer_class = timed_serializer_class(self.get_serializer_class())
+        kwargs.setdefault('context', self.get_serializer_context())
+        return serializer_class(*args, **kwargs)
+
+
+# ============================ MIDDLEWARE ============================
+def route_label(request):
+    """(route, action) for the resolved view, e.g. ('message', 'list')"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved', ''
+    func = match.func
+    initkwargs = getattr(func, 'initkwargs', None) or {}
+    actions = getattr(func, 'actions', None)
+    if actions:
+        route = initkwargs.get('basename') or func.cls.__name__
+        return route, actions.get(request.method.lower(), request.method.lower())
+    if match.url_name:
+        return match.url_name, ''
+    view_class = getattr(func, 'cls', None) or getattr(func, 'view_class', None)
+    return (view_class.__name__ if view_class else match._func_path), ''
+
+
+class RouteMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = float(getattr(settings, 'API_METRICS_SAMPLE_RATE', 0))
+
+    def __call__(self, request):
+        if self.sample_rate <= 0 or (self.sample_rate < 1 and random.random() >= self.sample_rate):
+            response = self.get_response(request)
+            route, action = route_label(request)
+            registry.observe(route, action, request.method, response.status_code)
+            return response
+
+        stats = _RequestStats()
+        token = _current_request.set(stats)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(stats.db_wrapper))
+                response = self.get_response(request)
+        finally:
+            _current_request.reset(token)
+        finished = time.perf_counter()
+        total = finished - started
+        if stats.view_time is None and stats.view_started is not None:
+            # No render step: the view ran until the response came back
+            stats.view_time = finished - stats.view_started
+
+        route, action = route_label(request)
+        registry.observe(route, action, request.method, response.status_code, total, stats)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = _current_request.get()
+        if stats is not None:
+            stats.view_started = time.perf_counter()
+        return None
+
+    def process_template_response(self, request, response):
+        # Called after the view returned and before the response is rendered
+        stats = _current_request.get()
+        if stats is not None:
+            now = time.perf_counter()
+            if stats.view_started is not None:
+                stats.view_time = now - stats.view_started
+            stats.render_started = now
+            response.add_post_render_callback(stats.rendered)
+        return response
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_app', '0058_video_bitrate_video_codec_video_height_video_width'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='hls_manifest',
+            field=models.FileField(blank=True, help_text='HLS master playlist', max_length=255, null=True, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='poster',
+            field=models.FileField(blank=True, help_text='Poster frame (JPEG)', max_length=255, null=True, upload_to=''),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='transcode_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', help_text='State of the rendition ladder (see auth_app.transcoding)', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='VideoRendition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('mp4', 'MP4'), ('hls', 'HLS')], max_length=8)),
+                ('label', models.CharField(help_text='Ladder rung, e.g. 480p', max_length=16)),
+                ('width', models.PositiveIntegerField(blank=True, null=True)),
+                ('height', models.PositiveIntegerField(blank=True, null=True)),
+                ('bitrate', models.BigIntegerField(blank=True, help_text='Bits per second', null=True)),
+                ('file', models.FileField(help_text='MP4 file or variant playlist', max_length=255, upload_to='')),
+                ('file_size', models.BigIntegerField(blank=True, help_text='Bytes, segments included for HLS', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='renditions', to='auth_app.video')),
+            ],
+            options={
+                'ordering': ['video', 'kind', 'height'],
+                'constraints': [models.UniqueConstraint(fields=('video', 'kind', 'label'), name='unique_video_rendition')],
+            },
+        ),
+    ]
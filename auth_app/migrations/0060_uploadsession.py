@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:56
+
+import auth_app.mixins
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_app', '0059_video_hls_manifest_video_poster_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('target', models.CharField(choices=[('video', 'Video'), ('image', 'Image'), ('writings', 'Writings'), ('document', 'Document')], max_length=16)),
+                ('filename', models.CharField(max_length=255)),
+                ('content_type', models.CharField(blank=True, default='', max_length=100)),
+                ('upload_length', models.BigIntegerField(help_text='Total size in bytes')),
+                ('offset', models.BigIntegerField(default=0, help_text='Bytes received so far')),
+                ('metadata', models.JSONField(blank=True, default=dict, help_text='Fields for the target object, e.g. title')),
+                ('status', models.CharField(choices=[('uploading', 'Uploading'), ('complete', 'Complete'), ('failed', 'Failed')], default='uploading', max_length=16)),
+                ('result_id', models.BigIntegerField(blank=True, help_text='Id of the object created on completion', null=True)),
+                ('error', models.JSONField(blank=True, null=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+            bases=(auth_app.mixins.DirtyFieldsMixin, models.Model),
+        ),
+    ]
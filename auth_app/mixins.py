@@ -0,0 +1,153 @@
+# users/mixins.py
+import copy
+import datetime
+import uuid
+from decimal import Decimal
+
+from django.db.models import Expression, F, JSONField
+from django.utils import timezone
+
+# Values that cannot change in place, so a snapshot may hold them by reference
+_IMMUTABLE_TYPES = (str, bytes, int, float, bool, type(None), Decimal, datetime.date, datetime.time,
+                    datetime.timedelta, uuid.UUID)
+
+
+def _frozen(value):
+    return value if isinstance(value, _IMMUTABLE_TYPES) else copy.deepcopy(value)
+
+
+class DirtyFieldsMixin:
+    """
+    Track which concrete fields changed since the instance was loaded.
+
+    save() on a loaded instance without explicit update_fields writes only the
+    changed columns (plus auto_now timestamps) and is skipped entirely when
+    nothing changed. New instances and explicit update_fields behave exactly
+    like Model.save().
+
+    set_fields() updates columns with a single UPDATE ... WHERE pk, without a
+    read-modify-write of the whole row and without save() signals. Values may
+    be expressions (F(), Case/When) so toggles are evaluated by the database.
+
+    Loading a row only takes a shallow copy of its values (and copies of its
+    JSONField values, which are changed in place); the comparable snapshot is
+    built the first time it is needed, so rows that are only read stay cheap.
+    """
+    DIRTY_IGNORE_FIELDS = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        loaded = instance.__dict__.copy()
+        for attname in cls._mutable_attnames():
+            if attname in loaded:
+                loaded[attname] = copy.deepcopy(loaded[attname])
+        instance._loaded_values = loaded
+        return instance
+
+    @classmethod
+    def _tracked_fields(cls):
+        # Per class, not inherited from a parent model's cache
+        fields = cls.__dict__.get('_dirty_tracked_fields')
+        if fields is None:
+            fields = [
+                f for f in cls._meta.concrete_fields
+                if not f.primary_key and f.name not in cls.DIRTY_IGNORE_FIELDS
+                and not getattr(f, 'auto_now', False) and not getattr(f, 'auto_now_add', False)
+            ]
+            cls._dirty_tracked_fields = fields
+        return fields
+
+    @classmethod
+    def _mutable_attnames(cls):
+        attnames = cls.__dict__.get('_dirty_mutable_attnames')
+        if attnames is None:
+            attnames = [f.attname for f in cls._tracked_fields() if isinstance(f, JSONField)]
+            cls._dirty_mutable_attnames = attnames
+        return attnames
+
+    def get_loaded_state(self):
+        """{attname: stored value} as last loaded or saved, None if the instance was not loaded"""
+        state = self.__dict__.get('_loaded_state')
+        if state is None:
+            values = self.__dict__.pop('_loaded_values', None)
+            if values is None:
+                return None
+            state = self._loaded_state = {
+                f.attname: f.get_prep_value(values[f.attname])
+                for f in self._tracked_fields() if f.attname in values
+            }
+        return state
+
+    def _set_loaded_state(self, state):
+        self.__dict__.pop('_loaded_values', None)
+        self._loaded_state = state
+
+    def _dirty_state(self, fields=None):
+        return {
+            f.attname: _frozen(f.get_prep_value(getattr(self, f.attname)))
+            for f in self._tracked_fields()
+            if f.attname in self.__dict__ and (fields is None or f.attname in fields)
+        }
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        loaded = self.get_loaded_state()
+        if loaded is None or fields is None:
+            self._set_loaded_state(self._dirty_state())
+        else:
+            # Only the refreshed columns now match the database
+            attnames = {self._meta.get_field(name).attname for name in fields}
+            loaded.update(self._dirty_state(attnames))
+
+    def get_dirty_fields(self):
+        """Names of fields changed since load, or None if the instance was not loaded from the database"""
+        loaded = self.get_loaded_state()
+        if loaded is None:
+            return None
+        return [
+            f.name for f in self._tracked_fields()
+            if f.attname in self.__dict__
+            and (f.attname not in loaded or loaded[f.attname] != f.get_prep_value(getattr(self, f.attname)))
+        ]
+
+    def _auto_now_fields(self):
+        return [f.name for f in self._meta.concrete_fields if getattr(f, 'auto_now', False)]
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert') and not args):
+            dirty = self.get_dirty_fields()
+            if dirty is not None:
+                if not dirty:
+                    return
+                kwargs['update_fields'] = dirty + self._auto_now_fields()
+        super().save(*args, **kwargs)
+        self._set_loaded_state(self._dirty_state())
+
+    def set_fields(self, **values):
+        """
+        Atomically UPDATE the given columns of this row and apply them to the
+        instance. Expression values are read back from the database.
+        Returns the number of rows updated (0 if the row no longer exists).
+        """
+        now = timezone.now()
+        for name in self._auto_now_fields():
+            values.setdefault(name, now)
+
+        updated = type(self)._base_manager.filter(pk=self.pk).update(**values)
+
+        expressions = [name for name, value in values.items() if isinstance(value, (Expression, F))]
+        for name, value in values.items():
+            if name not in expressions:
+                setattr(self, name, value)
+        if updated and expressions:
+            self.refresh_from_db(fields=expressions)
+
+        loaded = self.get_loaded_state()
+        if loaded is not None:
+            for name in values:
+                field = self._meta.get_field(name)
+                if field.attname in loaded:
+                    loaded[field.attname] = _frozen(field.get_prep_value(getattr(self, field.attname)))
+        return updated
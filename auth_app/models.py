@@ -1,11 +1,13 @@
 # users/models.py
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from .managers import CustomUserManager
+from .mixins import DirtyFieldsMixin
 
-class CustomUser(AbstractBaseUser, PermissionsMixin):
+class CustomUser(DirtyFieldsMixin, AbstractBaseUser, PermissionsMixin):
     class Role(models.TextChoices):
         ADMIN = 'admin', _('Admin')
         USER = 'user', _('User')
@@ -36,6 +38,18 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
 
     objects = CustomUserManager()
 
+    class Meta:
+        indexes = [
+            # Admin directory (UserDirectoryView): filters + keyset order
+            models.Index(fields=['-date_joined', '-id'], name='user_joined_keyset_idx'),
+            models.Index(fields=['role', 'is_active', '-date_joined'], name='user_role_active_joined_idx'),
+            # Case-insensitive prefix search as range scans on lower(column)
+            models.Index(Lower('first_name'), name='user_first_name_lower_idx'),
+            models.Index(Lower('last_name'), name='user_last_name_lower_idx'),
+            models.Index(Lower('email'), name='user_email_lower_idx'),
+            models.Index(Lower('username'), name='user_username_lower_idx'),
+        ]
+
     def __str__(self):
         return self.username
 
@@ -50,12 +64,49 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
         if self.role == self.Role.ADMIN:
             self.is_staff = True
         super().save(*args, **kwargs)
-    
+
+    def set_password(self, raw_password):
+        # Hash on the bounded hasher pool (see auth_app/hashers.py)
+        from .hashers import make_password_pooled
+        self.password = make_password_pooled(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        """
+        Verify on the bounded hasher pool. Hashes made with an older hasher
+        (e.g. PBKDF2) are transparently rehashed with the active profile.
+        """
+        from .hashers import check_password_pooled
+
+        def setter(raw_password):
+            self.set_password(raw_password)
+            # Password hash upgrades shouldn't be considered password changes.
+            self._password = None
+            self.save(update_fields=['password'])
+
+        return check_password_pooled(raw_password, self.password, setter)
+
     @property
     def is_admin(self):
         return self.role == self.Role.ADMIN
-    
-    # OTP fields
+
+    def set_fields(self, **values):
+        updated = super().set_fields(**values)
+        # set_fields() sends no post_save, drop the cached row here
+        from .authentication import invalidate_cached_user
+        invalidate_cached_user(self.pk)
+        return updated
+
+    def get_profile(self):
+        """Profile for this user, created on first access if it is missing (e.g. bulk-created users)"""
+        try:
+            return self.profile
+        except UserProfile.DoesNotExist:
+            profile, _ = UserProfile.objects.get_or_create(user=self)
+            self.profile = profile
+            return profile
+
+    # OTP fields (legacy: OTP state now lives in the cache-backed store, auth_app/otp.py)
     otp = models.CharField(max_length=6, blank=True, null=True)
     otp_expiry = models.DateTimeField(blank=True, null=True)
     otp_verified = models.BooleanField(default=False)
@@ -63,38 +114,12 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
     otp_max_out = models.DateTimeField(blank=True, null=True)
     
     def generate_otp(self):
-        import random
-        from datetime import timedelta
-        from django.utils import timezone
-        
-        self.otp = str(random.randint(100000, 999999))
-        self.otp_expiry = timezone.now() + timedelta(minutes=10)
-        self.otp_verified = False
-        self.otp_attempts = 0
-        self.save()
-        return self.otp
+        from .otp import issue_otp
+        return issue_otp(self.email)
     
     def verify_otp(self, entered_otp):
-        from django.utils import timezone
-        
-        if self.otp_max_out and timezone.now() < self.otp_max_out:
-            return False, "Maximum OTP attempts reached. Please request a new OTP."
-            
-        if self.otp_expiry and timezone.now() > self.otp_expiry:
-            return False, "OTP has expired. Please request a new OTP."
-            
-        if self.otp == entered_otp:
-            self.otp_verified = True
-            self.otp_attempts = 0
-            self.save()
-            return True, "OTP verified successfully."
-        else:
-            self.otp_attempts += 1
-            if self.otp_attempts >= 3:
-                from datetime import timedelta
-                self.otp_max_out = timezone.now() + timedelta(minutes=30)
-            self.save()
-            return False, f"Invalid OTP. {3 - self.otp_attempts} attempts remaining."
+        from .otp import verify_otp
+        return verify_otp(self.email, entered_otp)
         
     # users/models.py - Add this method to CustomUser model
 def save(self, *args, **kwargs):
@@ -113,7 +138,9 @@ def save(self, *args, **kwargs):
     super().save(*args, **kwargs)
 
 
-class UserProfile(models.Model):
+class UserProfile(DirtyFieldsMixin, models.Model):
+    # Saves write only the changed columns (DirtyFieldsMixin), so an unchanged
+    # profile is never rewritten.
     user = models.OneToOneField(
         CustomUser,
         on_delete=models.CASCADE,
@@ -156,24 +183,50 @@ class UserProfile(models.Model):
     def __str__(self):
         return f"{self.user.get_full_name()} - Profile"
 
+    @classmethod
+    def create_missing(cls, batch_size=1000):
+        """
+        Create empty profiles for users that have none, in bulk. Use after
+        bulk_create()/imports, which bypass the post_save receiver.
+        """
+        created = 0
+        last_pk = 0
+        while True:
+            pks = list(
+                CustomUser.objects.filter(pk__gt=last_pk, profile__isnull=True)
+                .order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not pks:
+                return created
+            cls.objects.bulk_create([cls(user_id=pk) for pk in pks], ignore_conflicts=True)
+            created += len(pks)
+            last_pk = pks[-1]
+
 # Signals
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
 
 @receiver(post_save, sender=CustomUser)
 def create_user_profile(sender, instance, created, **kwargs):
-    if created:
+    # Only on INSERT. Profile edits are saved by the profile views/serializers
+    # themselves, so plain user updates (OTP, activation, role) never touch it.
+    if created and not kwargs.get('raw'):
         UserProfile.objects.create(user=instance)
 
-@receiver(post_save, sender=CustomUser)
-def save_user_profile(sender, instance, **kwargs):
-    if hasattr(instance, 'profile'):
-        instance.profile.save()
+@receiver([post_save, post_delete], sender=CustomUser)
+def invalidate_user_cache(sender, instance, **kwargs):
+    # Drop the cached row used by StatelessJWTAuthentication
+    from .authentication import invalidate_cached_user
+    invalidate_cached_user(instance.pk)
 
 
 
 
 # ===============================NOTIFICATION SETTINGS=================================
+from django.db import connection, transaction
+from django.db.models import F
+from . import events
+
 class Message(models.Model):
     sender_name = models.CharField(max_length=255)
     subject = models.CharField(max_length=255, blank=True, null=True)
@@ -183,6 +236,121 @@ class Message(models.Model):
     
     is_read = models.BooleanField(default=False)  # NEW FIELD
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_read', 'created_at']),
+            models.Index(fields=['created_at', 'id']),  # keyset pagination (inbox/sync)
+        ]
+
+    THREAD_MAX_DEPTH = 50
+
+    @classmethod
+    def get_thread(cls, root_id, max_depth=THREAD_MAX_DEPTH):
+        """
+        Load root_id and its whole reply tree in one recursive CTE query.
+        Returns the root message with each node's children in `thread_replies`
+        (oldest first), or None if root_id does not exist.
+        """
+        table = connection.ops.quote_name(cls._meta.db_table)
+        messages = list(cls.objects.raw(
+            f"""
+            WITH RECURSIVE thread(id, depth) AS (
+                SELECT id, 0 FROM {table} WHERE id = %s
+                UNION ALL
+                SELECT m.id, thread.depth + 1
+                FROM {table} m JOIN thread ON m.parent_id = thread.id
+                WHERE thread.depth < %s
+            )
+            SELECT m.*, thread.depth AS depth
+            FROM {table} m JOIN thread ON m.id = thread.id
+            ORDER BY thread.depth, m.created_at, m.id
+            """,
+            [root_id, max_depth],
+        ))
+        if not messages:
+            return None
+
+        by_id = {}
+        for message in messages:
+            message.thread_replies = []
+            by_id[message.id] = message
+            if message.depth:
+                by_id[message.parent_id].thread_replies.append(message)
+        return messages[0]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        adding = self._state.adding
+        # Written with a conditional UPDATE so that of two concurrent saves
+        # only the one that actually flips is_read moves the unread counter
+        write_is_read = not adding and 'is_read' not in self.get_deferred_fields() and (
+            update_fields is None or 'is_read' in update_fields
+        )
+        with transaction.atomic():
+            if write_is_read:
+                flipped = Message.objects.filter(pk=self.pk, is_read=not self.is_read).update(is_read=self.is_read)
+                deferred = self.get_deferred_fields()
+                kwargs['update_fields'] = [
+                    f.name for f in self._meta.concrete_fields
+                    if not f.primary_key and f.name != 'is_read' and f.attname not in deferred
+                    and (update_fields is None or f.name in update_fields)
+                ]
+            super().save(*args, **kwargs)
+            if adding:
+                events.publish_message_created(self)
+                if not self.is_read:
+                    MessageCounter.adjust(MessageCounter.UNREAD, 1)
+            elif write_is_read and flipped:
+                MessageCounter.adjust(MessageCounter.UNREAD, -flipped if self.is_read else flipped)
+
+
+class MessageCounter(models.Model):
+    """
+    Maintained message counters (e.g. unread badge), so polling the count is a
+    single-row read instead of a COUNT(*) over Message.
+    """
+    UNREAD = 'unread'
+
+    name = models.CharField(max_length=50, unique=True)
+    value = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+    @classmethod
+    def get_value(cls, name):
+        value = cls.objects.filter(name=name).values_list('value', flat=True).first()
+        if value is None:
+            value = cls.rebuild(name)
+        return value
+
+    @classmethod
+    def adjust(cls, name, delta):
+        """Atomically add delta; a missing row is rebuilt from Message on the next read"""
+        cls.objects.filter(name=name).update(value=F('value') + delta)
+        events.publish_unread_count()
+
+    @classmethod
+    def rebuild(cls, name=UNREAD):
+        # Uses the (is_read, created_at) index
+        value = Message.objects.filter(is_read=False).count()
+        cls.objects.update_or_create(name=name, defaults={'value': value})
+        return value
+
+
+@receiver(pre_delete, sender=Message)
+def claim_unread_message(sender, instance, **kwargs):
+    # Decided on the row, not on the possibly stale instance: the conditional
+    # UPDATE only matches if nobody marked it read since it was loaded, and
+    # runs in the delete's transaction
+    instance._deleted_unread = Message.objects.filter(pk=instance.pk, is_read=False).update(is_read=True)
+
+
+@receiver(post_delete, sender=Message)
+def decrement_unread_counter(sender, instance, **kwargs):
+    if instance.__dict__.pop('_deleted_unread', 0):
+        MessageCounter.adjust(MessageCounter.UNREAD, -1)
+
 
 
 
@@ -276,7 +444,7 @@ from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 
-class Members(models.Model):
+class Members(DirtyFieldsMixin, models.Model):
     class Role(models.TextChoices):
         ADMIN = 'admin', _('Admin')
         USER = 'user', _('User')
@@ -969,7 +1137,7 @@ class MinistryInfos(models.Model):
 from django.db import models
 from django.core.validators import FileExtensionValidator
 
-class CalendarEvent(models.Model):
+class CalendarEvent(DirtyFieldsMixin, models.Model):
     EVENT_STATUS = [
         ('pending', 'Pending'),
         ('on_process', 'On Process'),
@@ -1001,11 +1169,17 @@ class CalendarEvent(models.Model):
 from django.db import models
 from django.core.validators import FileExtensionValidator
 
-class Video(models.Model):
+class Video(DirtyFieldsMixin, models.Model):
     VIDEO_STATUS = [
         ('active', 'Active'),
         ('inactive', 'Inactive'),
     ]
+
+    class TranscodeStatus(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        PROCESSING = 'processing', 'Processing'
+        READY = 'ready', 'Ready'
+        FAILED = 'failed', 'Failed'
     
     title = models.CharField(max_length=200)
     video_file = models.FileField(
@@ -1015,7 +1189,17 @@ class Video(models.Model):
     description = models.TextField(blank=True, null=True)
     duration = models.FloatField(blank=True, null=True, help_text="Duration in seconds")
     file_size = models.BigIntegerField(blank=True, null=True, help_text="File size in bytes")
+    width = models.PositiveIntegerField(blank=True, null=True, help_text="Frame width in pixels")
+    height = models.PositiveIntegerField(blank=True, null=True, help_text="Frame height in pixels")
+    codec = models.CharField(max_length=32, blank=True, default='', help_text="Video codec, e.g. h264")
+    bitrate = models.BigIntegerField(blank=True, null=True, help_text="Overall bitrate in bits per second")
     status = models.CharField(max_length=20, choices=VIDEO_STATUS, default='active')
+    transcode_status = models.CharField(
+        max_length=20, choices=TranscodeStatus.choices, default=TranscodeStatus.PENDING,
+        help_text="State of the rendition ladder (see auth_app.transcoding)"
+    )
+    poster = models.FileField(max_length=255, blank=True, null=True, help_text="Poster frame (JPEG)")
+    hls_manifest = models.FileField(max_length=255, blank=True, null=True, help_text="HLS master playlist")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -1029,9 +1213,45 @@ class Video(models.Model):
         # Delete the actual file when the model is deleted
         if self.video_file:
             self.video_file.delete(save=False)
+        from .transcoding import delete_renditions
+        delete_renditions(self)
         super().delete(*args, **kwargs)
 
 
+class VideoRendition(models.Model):
+    """One transcoded variant of a Video: a progressive MP4 or an HLS variant playlist"""
+    class Kind(models.TextChoices):
+        MP4 = 'mp4', 'MP4'
+        HLS = 'hls', 'HLS'
+
+    video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='renditions')
+    kind = models.CharField(max_length=8, choices=Kind.choices)
+    label = models.CharField(max_length=16, help_text="Ladder rung, e.g. 480p")
+    width = models.PositiveIntegerField(blank=True, null=True)
+    height = models.PositiveIntegerField(blank=True, null=True)
+    bitrate = models.BigIntegerField(blank=True, null=True, help_text="Bits per second")
+    file = models.FileField(max_length=255, help_text="MP4 file or variant playlist")
+    file_size = models.BigIntegerField(blank=True, null=True, help_text="Bytes, segments included for HLS")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['video', 'kind', 'height']
+        constraints = [
+            models.UniqueConstraint(fields=['video', 'kind', 'label'], name='unique_video_rendition')
+        ]
+
+    def __str__(self):
+        return f"{self.video_id} {self.kind} {self.label}"
+
+
+@receiver(post_save, sender=Video)
+def schedule_video_transcode(sender, instance, created, **kwargs):
+    # New uploads only; the pipeline runs after the transaction commits
+    if created and not kwargs.get('raw'):
+        from .transcoding import schedule_transcode
+        schedule_transcode(instance)
+
+
 
 # ==================// IMAGES //==============
 # models.py
@@ -1048,7 +1268,7 @@ def image_upload_path(instance, filename):
     unique_filename = f"{uuid4().hex}.{ext}"
     return f"images/{unique_filename}"
 
-class Image(models.Model):
+class Image(DirtyFieldsMixin, models.Model):
     STATUS_CHOICES = [
         ('active', 'Active'),
         ('inactive', 'Inactive'),
@@ -1063,6 +1283,8 @@ class Image(models.Model):
     file_size = models.BigIntegerField(null=True, blank=True)  # Size in bytes
     file_format = models.CharField(max_length=10, blank=True)  # jpg, png, etc.
     dimensions = models.CharField(max_length=20, blank=True)  # e.g., "1920x1080"
+    dominant_color = models.CharField(max_length=7, blank=True)  # e.g., "#3a5f8c"
+    blurhash = models.CharField(max_length=100, blank=True)  # placeholder shown while loading
     status = models.CharField(
         max_length=10, 
         choices=STATUS_CHOICES, 
@@ -1118,6 +1340,12 @@ class Image(models.Model):
         return "Unknown"
 
 
+@receiver(post_delete, sender=Image)
+def delete_image_derivatives(sender, instance, **kwargs):
+    from .imaging import delete_derivatives
+    delete_derivatives(instance)
+
+
 
 
 
@@ -1671,7 +1899,142 @@ class Document(models.Model):
         return self.title
 
 
+# =========================// RESUMABLE UPLOADS  //=================
+class UploadSession(DirtyFieldsMixin, models.Model):
+    """
+    A resumable upload (see auth_app/uploads.py). Chunks are appended to a
+    part file; when offset reaches upload_length the part file becomes the
+    media file of a new Video, Image, Writings or Document.
+    """
+    class Target(models.TextChoices):
+        VIDEO = 'video', 'Video'
+        IMAGE = 'image', 'Image'
+        WRITINGS = 'writings', 'Writings'
+        DOCUMENT = 'document', 'Document'
+
+    class Status(models.TextChoices):
+        UPLOADING = 'uploading', 'Uploading'
+        COMPLETE = 'complete', 'Complete'
+        FAILED = 'failed', 'Failed'
+
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    target = models.CharField(max_length=16, choices=Target.choices)
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True, default='')
+    upload_length = models.BigIntegerField(help_text="Total size in bytes")
+    offset = models.BigIntegerField(default=0, help_text="Bytes received so far")
+    metadata = models.JSONField(default=dict, blank=True, help_text="Fields for the target object, e.g. title")
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.UPLOADING)
+    result_id = models.BigIntegerField(blank=True, null=True, help_text="Id of the object created on completion")
+    error = models.JSONField(blank=True, null=True)
+    created_by = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, null=True, blank=True, related_name='upload_sessions'
+    )
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.upload_length})"
+
+    def delete(self, *args, **kwargs):
+        from .uploads import discard_part
+        discard_part(self)
+        return super().delete(*args, **kwargs)
+
+
+# =========================// CONTENT-ADDRESSED STORAGE  //=================
+class FileBlob(models.Model):
+    """
+    One stored file content, kept once under its SHA-256 digest by
+    auth_app.storage.ContentAddressedStorage. refcount is the number of
+    storage names (FileBlobReference) that currently point at it.
+    """
+    digest = models.CharField(max_length=64, unique=True, help_text="SHA-256, hex")
+    size = models.BigIntegerField(help_text="Bytes")
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.digest[:12]} ({self.refcount} refs)"
+
+
+class FileBlobReference(models.Model):
+    """A storage name (the value of a FileField) backed by a FileBlob"""
+    name = models.CharField(max_length=500, unique=True)
+    blob = models.ForeignKey(FileBlob, on_delete=models.CASCADE, related_name='references')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+# Files of deleted rows, and files replaced by a new upload, are deleted from
+# the storage once the transaction commits; ContentAddressedStorage drops the
+# blob with its last reference
+from django.db import transaction
+from django.db.models.signals import pre_save
+
+
+def _stored_file_fields(model):
+    from django.core.files.storage import default_storage
+    if model._meta.app_label != 'auth_app':
+        return []
+    return [
+        f for f in model._meta.concrete_fields
+        if isinstance(f, models.FileField) and f.storage is default_storage
+    ]
+
+
+def _delete_stored_file(model, field, name):
+    from .imaging import OUTPUT_DIR as DERIVATIVES_DIR
+    from .transcoding import OUTPUT_DIR as RENDITIONS_DIR
+    # Generated outputs are removed with their directories
+    if not name or name.startswith((f'{DERIVATIVES_DIR}/', f'{RENDITIONS_DIR}/')):
+        return
+    # Rows created by bulk seeding/imports may share one name
+    if model._base_manager.filter(**{field.attname: name}).exists():
+        return
+    field.storage.delete(name)
+
+
+def _delete_stored_files(model, files):
+    for field, name in files:
+        _delete_stored_file(model, field, name)
+
+
+@receiver(pre_save)
+def remember_replaced_files(sender, instance, raw=False, **kwargs):
+    fields = _stored_file_fields(sender)
+    if raw or not fields or instance._state.adding:
+        return
+    loaded = instance.get_loaded_state() if isinstance(instance, DirtyFieldsMixin) else None
+    if loaded is not None and all(f.attname in loaded for f in fields):
+        previous = {f.attname: loaded[f.attname] for f in fields}
+    else:
+        previous = sender._base_manager.filter(pk=instance.pk).values(*[f.attname for f in fields]).first() or {}
+    instance._replaced_files = [
+        (f, previous[f.attname]) for f in fields
+        if previous.get(f.attname) and previous[f.attname] != getattr(instance, f.attname).name
+    ]
+
+
+@receiver(post_save)
+def delete_replaced_files(sender, instance, raw=False, **kwargs):
+    replaced = instance.__dict__.pop('_replaced_files', None)
+    if replaced:
+        transaction.on_commit(lambda: _delete_stored_files(sender, replaced))
+
 
+@receiver(post_delete)
+def delete_stored_files(sender, instance, **kwargs):
+    files = [(f, getattr(instance, f.attname).name) for f in _stored_file_fields(sender)]
+    files = [(f, name) for f, name in files if name]
+    if files:
+        transaction.on_commit(lambda: _delete_stored_files(sender, files))
 
 
 # =========================// APTEC  //=================
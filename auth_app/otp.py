@@ -0,0 +1,105 @@
+# users/otp.py
+"""
+Cache-backed OTP store for password reset.
+
+OTP codes, attempt counters, lockouts and request throttles live in Django's
+cache (settings.CACHES) with TTLs, so the reset flow never writes to the
+CustomUser row until the password itself changes. Counters use cache.add() +
+cache.incr(), which are atomic on the locmem, Redis and Memcached backends.
+"""
+import hashlib
+import secrets
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+OTP_DEFAULTS = {
+    'TTL': 600,                 # seconds an OTP stays valid
+    'MAX_ATTEMPTS': 3,          # wrong codes before lockout
+    'LOCKOUT': 1800,            # seconds verification stays locked
+    'THROTTLE_WINDOW': 3600,    # seconds for the request/verify throttles below
+    'REQUESTS_PER_EMAIL': 5,
+    'REQUESTS_PER_IP': 20,
+    'VERIFY_PER_IP': 30,
+}
+
+
+def otp_setting(name):
+    return getattr(settings, 'OTP_STORE', {}).get(name, OTP_DEFAULTS[name])
+
+
+def _key(kind, ident):
+    # Hash identifiers so keys are fixed-length and never contain raw emails
+    digest = hashlib.sha256(str(ident).strip().lower().encode()).hexdigest()[:32]
+    return f'otp:{kind}:{digest}'
+
+
+def _code_digest(email, code):
+    return salted_hmac('auth_app.otp', f'{email.strip().lower()}:{code}').hexdigest()
+
+
+def _incr(key, ttl):
+    """Atomically increment a counter that expires ttl seconds after its first hit"""
+    cache.add(key, 0, ttl)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # The key expired between add() and incr()
+        cache.add(key, 1, ttl)
+        return 1
+
+
+def is_rate_limited(scope, ident, limit):
+    """Count one hit for (scope, ident) and return True once it exceeds limit in the window"""
+    if not ident:
+        return False
+    return _incr(_key(f'rl:{scope}', ident), otp_setting('THROTTLE_WINDOW')) > limit
+
+
+def otp_request_limited(email, ip):
+    return (
+        is_rate_limited('request-email', email, otp_setting('REQUESTS_PER_EMAIL'))
+        or is_rate_limited('request-ip', ip, otp_setting('REQUESTS_PER_IP'))
+    )
+
+
+def otp_verify_limited(ip):
+    return is_rate_limited('verify-ip', ip, otp_setting('VERIFY_PER_IP'))
+
+
+def issue_otp(email):
+    """Create a new 6 digit OTP for email, replacing any previous one"""
+    code = str(secrets.randbelow(900000) + 100000)
+    cache.set(_key('code', email), _code_digest(email, code), otp_setting('TTL'))
+    cache.delete(_key('attempts', email))
+    return code
+
+
+def verify_otp(email, code):
+    """
+    Check code against the stored OTP. Returns (is_valid, message).
+    Wrong codes count towards MAX_ATTEMPTS; reaching it locks verification
+    for LOCKOUT seconds and discards the OTP.
+    """
+    if cache.get(_key('lock', email)):
+        return False, "Maximum OTP attempts reached. Please request a new OTP."
+
+    digest = cache.get(_key('code', email))
+    if digest is None:
+        return False, "OTP has expired. Please request a new OTP."
+
+    if constant_time_compare(digest, _code_digest(email, code)):
+        return True, "OTP verified successfully."
+
+    max_attempts = otp_setting('MAX_ATTEMPTS')
+    attempts = _incr(_key('attempts', email), otp_setting('TTL'))
+    if attempts >= max_attempts:
+        cache.set(_key('lock', email), True, otp_setting('LOCKOUT'))
+        cache.delete_many([_key('code', email), _key('attempts', email)])
+    return False, f"Invalid OTP. {max(max_attempts - attempts, 0)} attempts remaining."
+
+
+def consume_otp(email):
+    """Discard the OTP once the password has been changed"""
+    cache.delete_many([_key('code', email), _key('attempts', email)])
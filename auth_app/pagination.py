@@ -0,0 +1,156 @@
+# users/pagination.py
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset ("seek") pagination over a unique ordering such as
+    ('-created_at', '-id'). Each page is an index range scan starting after
+    the last row of the previous page: no OFFSET and no COUNT(*).
+
+    The cursor is the ordering values of the last row, base64 encoded. It is
+    returned even when the page is empty so clients can resume from it later
+    (incremental sync).
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ordering=None):
+        if ordering is not None:
+            self.ordering = tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.queryset = queryset
+        self.model = queryset.model
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after(position))
+
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        self.position = self._position(rows[-1]) if rows else position
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def get_cursor(self):
+        if self.position is None:
+            return None
+        # isoformat() keeps microseconds (DjangoJSONEncoder rounds to ms,
+        # which would skip or repeat rows sharing a millisecond)
+        values = [v.isoformat() if hasattr(v, 'isoformat') else v for v in self.position]
+        raw = json.dumps(values, cls=DjangoJSONEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.get_cursor())
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'cursor': self.get_cursor(),
+            'has_more': self.has_next,
+            'results': data,
+        })
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4))
+            values = json.loads(raw)
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+            return [
+                self._field(name).to_python(value)
+                for name, value in zip(self._field_names(), values)
+            ]
+        except (TypeError, ValueError, ValidationError) as e:
+            raise NotFound(self.invalid_cursor_message) from e
+
+    # -------------------- helpers --------------------
+    def _field_names(self):
+        return [name.lstrip('-') for name in self.ordering]
+
+    def _field(self, name):
+        return self.model._meta.get_field(name)
+
+    def _position(self, obj):
+        return [getattr(obj, self._field(name).attname) for name in self._field_names()]
+
+    def _after(self, position):
+        """
+        Rows strictly after position in self.ordering:
+        (a > x) OR (a = x AND b > y) OR ... with < for descending fields.
+        """
+        condition = Q()
+        equal = Q()
+        for order, value in zip(self.ordering, position):
+            name = order.lstrip('-')
+            lookup = 'lt' if order.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+
+class ApproximateCountKeysetPagination(KeysetPagination):
+    """
+    KeysetPagination that also reports a total on the first page only.
+
+    Unfiltered tables on PostgreSQL use the planner's row estimate
+    (pg_class.reltuples); otherwise the rows are counted up to count_cap and
+    the total is reported as "at least count_cap" beyond that.
+    """
+    count_cap = 10000
+
+    def get_count(self):
+        queryset = self.queryset
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= 0:
+                return row[0], False
+        count = queryset.order_by()[:self.count_cap + 1].count()
+        if count > self.count_cap:
+            return self.count_cap, False
+        return count, True
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.request.query_params.get(self.cursor_query_param):
+            return response
+        count, exact = self.get_count()
+        response.data = {'count': count, 'count_is_exact': exact, **response.data}
+        return response
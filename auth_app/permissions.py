@@ -8,9 +8,9 @@ class IsOwnerOrAdmin(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         # Check if the user is the owner of the object or an admin
         if hasattr(obj, 'user'):
-            return obj.user == request.user or request.user.is_admin()
+            return obj.user == request.user or getattr(request.user, 'is_admin', False)
         elif hasattr(obj, 'id'):
-            return obj.id == request.user.id or request.user.is_admin()
+            return obj.id == request.user.id or getattr(request.user, 'is_admin', False)
         return False
 
 class IsAdmin(permissions.BasePermission):
@@ -19,10 +19,10 @@ class IsAdmin(permissions.BasePermission):
     """
     
     def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.is_admin()
+        return request.user.is_authenticated and request.user.is_admin
     
     def has_object_permission(self, request, view, obj):
-        return request.user.is_authenticated and request.user.is_admin()
+        return request.user.is_authenticated and request.user.is_admin
     
 
 
@@ -0,0 +1,330 @@
+# users/resizing.py
+"""
+On-demand resized copies of uploaded pictures:
+
+    media-resize/<width>x<height>/<media path>?mode=fit|crop&format=webp|jpeg|png&sig=...
+
+* fit scales the picture to fit inside width x height, crop fills the box
+  and cuts off the overflow (centred). 0 for one side means "any". Pictures
+  are never upscaled.
+* Sizes listed in IMAGE_RESIZE['SIZES'] can be requested by anyone; any
+  other size needs the `sig` that resize_url() (or api/media-resize/sign/)
+  adds, so clients cannot fill the cache with arbitrary sizes. The sign
+  endpoint signs SIGNED_SIZES for any signed-in user and other sizes for
+  admins only.
+* JPEG sources are decoded at reduced scale with draft(), and large
+  downscales go through Image.reduce() (reducing_gap) before the final
+  Lanczos resample.
+* Results are kept in CACHE_DIR, keyed by source path and mtime and the
+  requested variant. The cache is bounded by MAX_CACHE_SIZE. When it grows
+  past that, files that were not used for the longest time are evicted
+  (use refreshes the file's mtime).
+* Concurrent requests for the same variant in a process wait (at most
+  RENDER_TIMEOUT seconds) for one render. Across processes duplicates are
+  harmless, since results are renamed into place.
+"""
+import hashlib
+import logging
+import math
+import os
+import posixpath
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import SuspiciousFileOperation
+from django.urls import reverse
+from django.utils._os import safe_join
+from django.utils.http import urlencode
+from PIL import Image as PILImage, ImageOps
+
+from .imaging import oriented_size
+
+logger = logging.getLogger(__name__)
+
+RESIZE_DEFAULTS = {
+    'CACHE_DIR': None,                      # None: resize_cache/ next to MEDIA_ROOT
+    'MAX_CACHE_SIZE': 512 * 1024 * 1024,    # bytes
+    'MAX_DIMENSION': 2400,
+    'SIZES': ('64x64', '128x128', '256x256', '320x0', '640x0'),  # unsigned sizes
+    # Sizes api/media-resize/sign/ signs for users who are not admins
+    'SIGNED_SIZES': ('96x96', '160x160', '480x0', '800x0', '1024x0', '1280x0', '1600x0'),
+    'PATH_PREFIXES': ('images/', 'members/images/', 'profile_pictures/'),
+    'QUALITY': {'webp': 80, 'jpeg': 82},
+    'RENDER_TIMEOUT': 30,                   # seconds a request waits for another one's render
+}
+
+MODES = ('fit', 'crop')
+FORMATS = {'jpeg': ('jpg', 'image/jpeg'), 'webp': ('webp', 'image/webp'), 'png': ('png', 'image/png')}
+SOURCE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp')
+
+_signer = signing.Signer(salt='auth_app.resizing')
+
+
+def resize_setting(name):
+    return getattr(settings, 'IMAGE_RESIZE', {}).get(name, RESIZE_DEFAULTS[name])
+
+
+class ResizeError(Exception):
+    pass
+
+
+class SignatureError(ResizeError):
+    pass
+
+
+class RenderTimeout(ResizeError):
+    pass
+
+
+def cache_directory():
+    directory = resize_setting('CACHE_DIR')
+    if not directory:
+        directory = os.path.join(os.path.dirname(os.path.normpath(settings.MEDIA_ROOT)), 'resize_cache')
+    return directory
+
+
+# ============================ URLS ============================
+def _signature_value(path, width, height, mode, fmt):
+    return f'{width}x{height}/{mode}/{fmt or ""}/{path}'
+
+
+def signature(path, width, height, mode='fit', fmt=None):
+    return _signer.signature(_signature_value(path, width, height, mode, fmt))
+
+
+def resize_url(path, width, height=0, mode='fit', fmt=None):
+    """Signed URL of `path` (relative to MEDIA_ROOT) resized to width x height"""
+    query = {'mode': mode}
+    if fmt:
+        query['format'] = fmt
+    query['sig'] = signature(path, width, height, mode, fmt)
+    url = reverse('media-resize', kwargs={'width': width, 'height': height, 'path': path})
+    return f'{url}?{urlencode(query)}'
+
+
+def validate(path, width, height, mode, fmt):
+    """Raise ResizeError unless the parameters describe a resize that may be served"""
+    if mode not in MODES:
+        raise ResizeError(f"mode must be one of {', '.join(MODES)}")
+    if fmt is not None and fmt not in FORMATS:
+        raise ResizeError(f"format must be one of {', '.join(FORMATS)}")
+    limit = resize_setting('MAX_DIMENSION')
+    if not (width or height) or width > limit or height > limit:
+        raise ResizeError(f"Width and height must be at most {limit}, and not both 0")
+    if mode == 'crop' and not (width and height):
+        raise ResizeError("crop needs both a width and a height")
+    if posixpath.normpath(path) != path or not path.startswith(tuple(resize_setting('PATH_PREFIXES'))):
+        raise ResizeError("This file cannot be resized")
+
+
+def check_request(path, width, height, mode, fmt, sig):
+    """Raise ResizeError unless the request is allowed, SignatureError if it needs a valid signature"""
+    validate(path, width, height, mode, fmt)
+    if f'{width}x{height}' in resize_setting('SIZES'):
+        return
+    if not sig or not signing.constant_time_compare(sig, signature(path, width, height, mode, fmt)):
+        raise SignatureError("Invalid signature for this size")
+
+
+def source_path(path):
+    """Absolute path of the source picture, or None"""
+    if not path.lower().endswith(SOURCE_EXTENSIONS):
+        return None
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        return None
+    return full_path if os.path.isfile(full_path) else None
+
+
+# ============================ RENDERING ============================
+def output_format(source, fmt):
+    if fmt:
+        return fmt
+    return 'png' if source.lower().endswith(('.png', '.gif')) else 'jpeg'
+
+
+def target_geometry(source_size, width, height, mode):
+    """(output size, crop box in the source or None)"""
+    source_width, source_height = source_size
+    if mode == 'crop':
+        # Never upscale: shrink the box, keeping its aspect ratio
+        factor = min(1.0, source_width / width, source_height / height)
+        width, height = max(1, round(width * factor)), max(1, round(height * factor))
+        # Largest centred box with the target aspect ratio
+        scale = min(source_width / width, source_height / height)
+        box_width, box_height = width * scale, height * scale
+        left, top = (source_width - box_width) / 2, (source_height - box_height) / 2
+        return (width, height), (left, top, left + box_width, top + box_height)
+    scales = [1.0]
+    if width:
+        scales.append(width / source_width)
+    if height:
+        scales.append(height / source_height)
+    scale = min(scales)
+    return (max(1, round(source_width * scale)), max(1, round(source_height * scale))), None
+
+
+def render(source, destination, width, height, mode, fmt):
+    with PILImage.open(source) as img:
+        oriented = oriented_size(img)
+        size, box = target_geometry(oriented, width, height, mode)
+        # Decode no more pixels than needed (JPEG DCT scaling). For a crop the
+        # whole picture must keep enough pixels for the box; draft() works on
+        # the stored, not yet rotated, orientation
+        needed = size if box is None else (
+            math.ceil(size[0] * oriented[0] / (box[2] - box[0])),
+            math.ceil(size[1] * oriented[1] / (box[3] - box[1])),
+        )
+        img.draft('RGB', needed if oriented == img.size else needed[::-1])
+        picture = ImageOps.exif_transpose(img)
+    if box is not None and picture.size != oriented:
+        scale_x, scale_y = picture.width / oriented[0], picture.height / oriented[1]
+        box = (box[0] * scale_x, box[1] * scale_y, box[2] * scale_x, box[3] * scale_y)
+    if picture.mode not in ('RGB', 'RGBA'):
+        keep_alpha = 'transparency' in picture.info or picture.mode in ('LA', 'PA')
+        picture = picture.convert('RGBA' if keep_alpha else 'RGB')
+    picture = picture.resize(size, PILImage.LANCZOS, box=box, reducing_gap=3.0)
+
+    if fmt == 'jpeg' and picture.mode == 'RGBA':
+        flattened = PILImage.new('RGB', picture.size, (255, 255, 255))
+        flattened.paste(picture, mask=picture.getchannel('A'))
+        picture = flattened
+    options = {}
+    if fmt in ('jpeg', 'webp'):
+        options['quality'] = resize_setting('QUALITY')[fmt]
+    if fmt == 'jpeg':
+        options.update(optimize=True, progressive=True)
+
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    temporary = f'{destination}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        picture.save(temporary, format=fmt.upper(), **options)
+        os.replace(temporary, destination)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+    return os.path.getsize(destination)
+
+
+# ============================ CACHE ============================
+_inflight = {}
+_inflight_lock = threading.Lock()
+_cache_bytes = None
+_cache_lock = threading.Lock()
+
+# Hits refresh the LRU clock at most this often per file
+TOUCH_INTERVAL = 60
+
+
+def cache_path(source, path, width, height, mode, fmt):
+    stat = os.stat(source)
+    key = hashlib.sha256(
+        f'{path}|{stat.st_mtime_ns}|{stat.st_size}|{width}x{height}|{mode}|{fmt}'.encode()
+    ).hexdigest()
+    return os.path.join(cache_directory(), key[:2], f'{key}.{FORMATS[fmt][0]}')
+
+
+def get_or_render(path, width, height, mode='fit', fmt=None):
+    """
+    (cached file, content type) for the resized picture at `path`. Renders
+    it when missing; concurrent callers for the same variant share one render.
+    Raises ResizeError when the source does not exist or cannot be decoded,
+    RenderTimeout when another request's render takes too long.
+    """
+    source = source_path(path)
+    if source is None:
+        raise ResizeError("File not found")
+    fmt = output_format(source, fmt)
+    destination = cache_path(source, path, width, height, mode, fmt)
+    content_type = FORMATS[fmt][1]
+
+    try:
+        stat = os.stat(destination)
+    except FileNotFoundError:
+        pass
+    else:
+        if time.time() - stat.st_mtime > TOUCH_INTERVAL:
+            try:
+                os.utime(destination)
+            except FileNotFoundError:
+                pass
+        return destination, content_type
+
+    with _inflight_lock:
+        future = _inflight.get(destination)
+        leader = future is None
+        if leader:
+            future = _inflight[destination] = Future()
+    if not leader:
+        try:
+            future.result(timeout=resize_setting('RENDER_TIMEOUT'))
+        except FutureTimeoutError:
+            raise RenderTimeout("The resized picture is still being rendered")
+        return destination, content_type
+
+    try:
+        size = render(source, destination, width, height, mode, fmt)
+    except (OSError, ValueError, PILImage.DecompressionBombError) as e:
+        error = ResizeError(f"Cannot resize this file: {e}")
+        future.set_exception(error)
+        raise error from e
+    except BaseException as e:
+        # Anything else (struct.error, MemoryError...) must not leave followers waiting
+        future.set_exception(e)
+        raise
+    else:
+        future.set_result(destination)
+    finally:
+        with _inflight_lock:
+            _inflight.pop(destination, None)
+    _account(size)
+    return destination, content_type
+
+
+def _scan():
+    """[(mtime, size, path)] of every cached file"""
+    entries = []
+    for root, _, files in os.walk(cache_directory()):
+        for name in files:
+            if name.endswith('.tmp'):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    return entries
+
+
+def _account(size):
+    global _cache_bytes
+    with _cache_lock:
+        if _cache_bytes is None:
+            _cache_bytes = sum(entry[1] for entry in _scan())
+        else:
+            _cache_bytes += size
+        if _cache_bytes > resize_setting('MAX_CACHE_SIZE'):
+            _cache_bytes = evict()
+
+
+def evict(target=None):
+    """Delete least recently used files until the cache is below target (90% of the maximum). Returns its size."""
+    if target is None:
+        target = resize_setting('MAX_CACHE_SIZE') * 0.9
+    entries = sorted(_scan())
+    total = sum(entry[1] for entry in entries)
+    for _, size, path in entries:
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+    logger.info("Image resize cache evicted down to %d bytes", total)
+    return total
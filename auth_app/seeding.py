@@ -0,0 +1,499 @@
+# users/seeding.py
+"""
+Deterministic synthetic data for load testing (manage.py seed_perf) and the
+performance test suite.
+
+Seeder(scale, seed).run() fills every auth_app table with referentially
+consistent rows: districts -> collages -> users (+ profiles) -> members ->
+collage members, a multi-year ledger with revenue sources and expense
+categories, charity periods, messages with nested reply threads, calendars,
+timetables, writings, ministries, events, APTEC groups and media rows that
+point at a few placeholder files.
+
+Everything goes through bulk_create in batches; save() overrides and signals
+are bypassed, so denormalised values (district/collage totals, unread
+message counter) are computed here instead. Row counts are ROWS_PER_SCALE
+multiplied by scale (fractions allowed); scale=100 is about one million rows.
+The same (scale, seed) always produces the same data, and different seeds
+can be loaded side by side.
+
+Seeded rows are recognisable, which is what clear_seeded_data() deletes by:
+usernames start with SEED_USERNAME_PREFIX, and a text column of every other
+row (name, title, notes, ...) with SEED_LABEL_PREFIX. Charity periods have
+no free text, so they are only seeded for periods without a row and are
+never cleared.
+"""
+import datetime
+import io
+import random
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.storage import default_storage
+from django.db import NotSupportedError, connection, models, transaction
+
+from .models import (
+    CustomUser, UserProfile, Message, MessageCounter, District, Collage, Members,
+    CollageMembers, CharityPerformance, CollageCalendar, DistrictCalendar,
+    CollageTimetable, DistrictTimetable, Writings, Ministry, MinistryInfos,
+    CalendarEvent, Video, Image, RevenueSource, ExpenseCategory, FinancialRecord,
+    Document, APTEC, APTEC_MISSION,
+)
+
+# Rows created per unit of scale (about 9.5k rows in total, profiles included)
+ROWS_PER_SCALE = {
+    'districts': 2,
+    'collages': 10,
+    'users': 1500,
+    'collage_members': 1200,
+    'financial_records': 2500,
+    'messages': 1200,
+    'calendars': 5,          # per calendar/timetable model
+    'writings': 10,
+    'ministries': 2,
+    'calendar_events': 50,
+    'videos': 20,
+    'images': 60,
+    'documents': 20,
+    'aptec_groups': 5,
+    'aptec_missions': 15,
+}
+
+SEED_USERNAME_PREFIX = 'UDOM-ZONE-PERF'
+SEED_LABEL_PREFIX = 'PERF-S'
+SEED_MEDIA_DIR = 'seed'
+ANCHOR = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+
+REVENUE_SOURCES = [
+    'Tithes', 'Offerings', 'Thanksgiving', 'Harvest', 'Building fund', 'Donations',
+    'Fundraising', 'Camp meeting', 'Sponsorship', 'Sales',
+]
+EXPENSE_CATEGORIES = [
+    'Rent', 'Utilities', 'Transport', 'Food', 'Stationery', 'Evangelism', 'Charity',
+    'Maintenance', 'Equipment', 'Allowances', 'Communication', 'Events', 'Medical',
+    'Training', 'Miscellaneous',
+]
+FIRST_NAMES = [
+    'Amani', 'Baraka', 'Neema', 'Rehema', 'Juma', 'Zawadi', 'Upendo', 'Imani', 'Daudi',
+    'Esther', 'Joseph', 'Grace', 'Faraji', 'Halima', 'Elia', 'Mariam', 'Petro', 'Ruth',
+]
+LAST_NAMES = [
+    'Mushi', 'Mwakyusa', 'Kimaro', 'Massawe', 'Mrema', 'Lyimo', 'Swai', 'Mollel',
+    'Nyirenda', 'Komba', 'Mbwambo', 'Shirima', 'Temba', 'Urio', 'Minja', 'Laizer',
+]
+COURSES = ['BSc Computer Science', 'BEd Arts', 'BA Economics', 'BSc Nursing', 'LLB', 'BCom Accounting']
+
+
+class Seeder:
+    def __init__(self, scale=1, seed=0, batch_size=5000, media=True, password=None, log=None):
+        self.scale = scale
+        self.seed = seed
+        self.batch_size = batch_size
+        self.media = media
+        self.password = password
+        self.log = log or (lambda message: None)
+        self.random = random.Random(seed)
+        self.label = f'{SEED_LABEL_PREFIX}{seed}'
+        self.counts = {}
+
+    def rows(self, key):
+        return max(1, round(ROWS_PER_SCALE[key] * self.scale))
+
+    def run(self):
+        """Seed everything in one transaction. Returns {model name: rows created}."""
+        if not connection.features.can_return_rows_from_bulk_insert:
+            # Rows point at rows inserted before them (users, collages, reply
+            # parents), so bulk_create must fill in the primary keys
+            raise NotSupportedError(
+                f"Seeding needs bulk inserts that return primary keys, which {connection.vendor} does not support"
+            )
+        with transaction.atomic():
+            self.files = self.placeholder_files()
+            self.seed_organisation()
+            self.seed_ledger()
+            self.seed_charity()
+            self.seed_messages()
+            self.seed_documents()
+            self.seed_media()
+            self.seed_aptec()
+        return self.counts
+
+    # -------------------- helpers --------------------
+    def insert(self, model, objs):
+        """bulk_create in batches; auto_now(_add) fields keep values set by the caller"""
+        started = time.perf_counter()
+        auto_fields = [
+            f for f in model._meta.concrete_fields
+            if getattr(f, 'auto_now', False) or getattr(f, 'auto_now_add', False)
+        ]
+        for obj in objs:
+            # updated_at defaults to created_at, anything else to ANCHOR
+            stamp = None
+            for field in auto_fields:
+                value = getattr(obj, field.attname)
+                if value is None:
+                    value = stamp or ANCHOR
+                    if field.get_internal_type() == 'DateField' and isinstance(value, datetime.datetime):
+                        value = value.date()
+                    setattr(obj, field.attname, value)
+                stamp = stamp or value
+
+        with _auto_now_disabled(auto_fields):
+            created = model.objects.bulk_create(objs, batch_size=self.batch_size)
+
+        self.counts[model.__name__] = self.counts.get(model.__name__, 0) + len(created)
+        self.log(f"{model.__name__:>20}: {len(created):>9} rows in {time.perf_counter() - started:6.2f}s")
+        return created
+
+    def moment(self, days):
+        """A deterministic moment within `days` before ANCHOR"""
+        return ANCHOR - datetime.timedelta(seconds=self.random.randrange(int(days * 86400)))
+
+    def money(self, low, high):
+        return Decimal(self.random.randrange(low * 100, high * 100)) / 100
+
+    def placeholder_files(self):
+        """Storage names of one small file per media kind, written once when media=True"""
+        names = {
+            'pdf': f'{SEED_MEDIA_DIR}/placeholder.pdf',
+            'image': f'{SEED_MEDIA_DIR}/placeholder.jpg',
+            'video': f'{SEED_MEDIA_DIR}/placeholder.mp4',
+        }
+        if not self.media:
+            return names
+        from django.core.files.base import ContentFile
+        from PIL import Image as PILImage
+
+        buffer = io.BytesIO()
+        PILImage.new('RGB', (64, 48), (46, 125, 50)).save(buffer, 'JPEG')
+        contents = {
+            'pdf': b'%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n'
+                   b'2 0 obj<</Type/Pages/Kids[]/Count 0>>endobj\ntrailer<</Root 1 0 R>>\n%%EOF\n',
+            'image': buffer.getvalue(),
+            # ftyp box only: enough for content-type sniffing and byte serving
+            'video': b'\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42isom',
+        }
+        for kind, name in names.items():
+            if not default_storage.exists(name):
+                default_storage.save(name, ContentFile(contents[kind]))
+        return names
+
+    # -------------------- organisation --------------------
+    def seed_organisation(self):
+        rng = self.random
+        regions = [value for value, _ in CollageMembers.TanzaniaRegions.choices]
+        n_districts, n_collages = self.rows('districts'), self.rows('collages')
+        n_users, n_collage_members = self.rows('users'), self.rows('collage_members')
+
+        # Assign collage members up front so the denormalised totals are right
+        member_collage = [rng.randrange(n_collages) for _ in range(min(n_collage_members, n_users))]
+        collage_district = [i % n_districts for i in range(n_collages)]
+        collage_totals = [0] * n_collages
+        for index in member_collage:
+            collage_totals[index] += 1
+
+        districts = self.insert(District, [
+            District(
+                name=f'{self.label} {regions[i % len(regions)].replace("_", " ").title()} {i + 1}',
+                pastor_name=f'Pastor {rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                date_created=self.moment(3650),
+                number_churches=rng.randrange(5, 60),
+                number_collages=collage_district.count(i),
+                total_members=sum(t for t, d in zip(collage_totals, collage_district) if d == i),
+            )
+            for i in range(n_districts)
+        ])
+        self.collages = self.insert(Collage, [
+            Collage(collage_name=f'{self.label} Collage {i + 1}', district=districts[collage_district[i]],
+                    total_members=collage_totals[i])
+            for i in range(n_collages)
+        ])
+        self.districts = districts
+
+        password = make_password(self.password)  # hashed once for every user
+        admin_every = 500
+        users = self.insert(CustomUser, [
+            CustomUser(
+                username=f'{SEED_USERNAME_PREFIX}-S{self.seed}-{i:07d}',
+                email=f'perf.s{self.seed}.{i}@example.com',
+                first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES),
+                password=password,
+                role=CustomUser.Role.ADMIN if i % admin_every == 0 else CustomUser.Role.USER,
+                is_staff=i % admin_every == 0,
+                is_active=rng.random() < 0.9,
+                agree_to_terms=True,
+                date_joined=self.moment(5 * 365),
+            )
+            for i in range(n_users)
+        ])
+        # The post_save receiver does not run for bulk_create; same as UserProfile.create_missing()
+        # without looking the users up again
+        self.insert(UserProfile, [UserProfile(user_id=user.pk) for user in users])
+
+        members = self.insert(Members, [
+            Members(
+                user=user, role=user.role, mobile_number=f'07{rng.randrange(10 ** 8):08d}',
+                date_joined=user.date_joined.date(), is_active=user.is_active,
+            )
+            for user in users
+        ])
+        nationalities = [value for value, _ in CollageMembers.NationalityChoices.choices]
+        levels = [value for value, _ in CollageMembers.EducationLevelChoices.choices]
+        self.users = users
+        self.insert(CollageMembers, [
+            CollageMembers(
+                user=users[i], member=members[i],
+                collage_name=self.collages[collage], district=self.collages[collage].district,
+                nationality=nationalities[0] if rng.random() < 0.9 else rng.choice(nationalities),
+                region=rng.choice(regions), education_level=rng.choice(levels),
+                your_course=rng.choice(COURSES),
+                date_of_birth=(ANCHOR - datetime.timedelta(days=rng.randrange(18 * 365, 30 * 365))).date(),
+                created_at=users[i].date_joined,
+            )
+            for i, collage in enumerate(member_collage)
+        ])
+
+    # -------------------- finance --------------------
+    def seed_ledger(self, years=5):
+        rng = self.random
+        marker = f'{self.label} synthetic'
+        sources = self.insert(RevenueSource, [
+            RevenueSource(name=name, description=marker) for name in REVENUE_SOURCES
+        ])
+        categories = self.insert(ExpenseCategory, [
+            ExpenseCategory(name=name, description=marker) for name in EXPENSE_CATEGORIES
+        ])
+        records = []
+        for _ in range(self.rows('financial_records')):
+            created = self.moment(years * 365)
+            if rng.random() < 0.6:
+                records.append(FinancialRecord(
+                    date=created.date(), source=rng.choice(sources), amount_received=self.money(10, 5000),
+                    amount_used=0, notes=marker, created_at=created,
+                ))
+            else:
+                records.append(FinancialRecord(
+                    date=created.date(), expense_category=rng.choice(categories), amount_received=0,
+                    amount_used=self.money(5, 3000), expense_reason='Synthetic expense', notes=marker,
+                    created_at=created,
+                ))
+        self.insert(FinancialRecord, records)
+
+    def seed_charity(self, years=5):
+        rng = self.random
+        existing = set(CharityPerformance.objects.values_list('period_type', 'period_label', 'period_date'))
+        rows = []
+        for year in range(ANCHOR.year - years, ANCHOR.year):
+            periods = [('annually', str(year), datetime.date(year, 1, 1))]
+            periods += [('quarterly', f'Q{q + 1}', datetime.date(year, 3 * q + 1, 1)) for q in range(4)]
+            periods += [
+                ('monthly', label, datetime.date(year, m + 1, 1))
+                for m, (label, _) in enumerate(CharityPerformance.MONTH_CHOICES)
+            ]
+            for period_type, label, date in periods:
+                received = self.money(100, 20000)
+                if (period_type, label, date) in existing:
+                    continue
+                rows.append(CharityPerformance(
+                    period_type=period_type, period_label=label, period_date=date,
+                    donations_received=received, funds_distributed=received * Decimal(rng.randrange(40, 95)) / 100,
+                ))
+        self.insert(CharityPerformance, rows)
+
+    # -------------------- messages --------------------
+    def seed_messages(self):
+        """Half root messages, half replies to an earlier message (so threads nest)"""
+        rng = self.random
+        total = self.rows('messages')
+        roots = self.insert(Message, [
+            Message(
+                sender_name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                subject=f'Subject {i + 1}',
+                body=f'{self.label} ' + 'Synthetic message body. ' * rng.randrange(1, 8),
+                is_read=rng.random() < 0.7, created_at=self.moment(365),
+            )
+            for i in range(total // 2 or 1)
+        ])
+        replies = []
+        thread = list(roots)
+        for _ in range(total - len(roots)):
+            parent = rng.choice(thread)
+            reply = Message(
+                sender_name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}', body=f'{self.label} Synthetic reply.',
+                parent=parent, is_read=rng.random() < 0.5,
+                created_at=parent.created_at + datetime.timedelta(minutes=rng.randrange(1, 7 * 24 * 60)),
+            )
+            replies.append(reply)
+            thread.append(reply)
+        # Replies to replies need their parents' primary keys: insert level by level
+        level = replies
+        while level:
+            ready = [m for m in level if m.parent.pk is not None]
+            if not ready:
+                raise NotSupportedError("bulk_create did not set the primary keys of the inserted messages")
+            self.insert(Message, ready)
+            level = [m for m in level if m.pk is None]
+        MessageCounter.rebuild()
+
+    # -------------------- documents --------------------
+    def seed_documents(self):
+        rng = self.random
+        pdf = self.files['pdf']
+        n = self.rows('calendars')
+        creators = [user for user in self.users if user.role == CustomUser.Role.ADMIN] or self.users[:1]
+
+        def span():
+            start = self.moment(3 * 365).date()
+            return start, start + datetime.timedelta(days=rng.randrange(30, 365))
+
+        def common(i):
+            start, end = span()
+            created = self.moment(3 * 365)
+            return dict(
+                title=f'{self.label} document {i + 1}', document=pdf, start_date=start, end_date=end,
+                created_by=rng.choice(creators), created_at=created,
+            )
+
+        self.insert(CollageCalendar, [
+            CollageCalendar(academic_year=f'{ANCHOR.year - 1}/{ANCHOR.year}', **common(i)) for i in range(n)
+        ])
+        self.insert(DistrictCalendar, [
+            DistrictCalendar(district=rng.choice(self.districts), year=str(ANCHOR.year), **common(i)) for i in range(n)
+        ])
+        self.insert(CollageTimetable, [
+            CollageTimetable(collage=rng.choice(self.collages), **common(i)) for i in range(n)
+        ])
+        self.insert(DistrictTimetable, [
+            DistrictTimetable(district=rng.choice(self.districts), period='Weekly', **common(i)) for i in range(n)
+        ])
+        document_types = [value for value, _ in Writings.DocumentType.choices]
+        self.insert(Writings, [
+            Writings(title=f'{self.label} writing {i + 1}', document=pdf, document_type=rng.choice(document_types),
+                     created_by=rng.choice(creators), created_at=self.moment(3 * 365))
+            for i in range(self.rows('writings'))
+        ])
+        self.insert(Ministry, [
+            Ministry(ministry_name=f'{self.label} Ministry {i + 1}', services='Preaching, choir, outreach')
+            for i in range(self.rows('ministries'))
+        ])
+        self.insert(MinistryInfos, [
+            MinistryInfos(ministry_name=f'{self.label} Ministry {i + 1}', services='Preaching, choir, outreach',
+                          costs_per_ministry=self.money(100, 5000))
+            for i in range(self.rows('ministries'))
+        ])
+        self.insert(CalendarEvent, [
+            CalendarEvent(
+                title=f'{self.label} event {i + 1}',
+                date=ANCHOR + datetime.timedelta(hours=rng.randrange(-365 * 24, 365 * 24)),
+                is_done=rng.choice(['pending', 'on_process', 'done']),
+            )
+            for i in range(self.rows('calendar_events'))
+        ])
+        self.insert(Document, [
+            Document(title=f'{self.label} document {i + 1}', file=pdf, created_at=self.moment(3 * 365))
+            for i in range(self.rows('documents'))
+        ])
+
+    # -------------------- media --------------------
+    def seed_media(self):
+        rng = self.random
+        videos = []
+        for i in range(self.rows('videos')):
+            duration, size = float(rng.randrange(30, 3600)), rng.randrange(5, 500) * 1024 * 1024
+            width, height = rng.choice([(640, 360), (1280, 720), (1920, 1080)])
+            videos.append(Video(
+                title=f'{self.label} video {i + 1}', video_file=self.files['video'],
+                duration=duration, file_size=size, width=width, height=height,
+                codec=rng.choice(['h264', 'h264', 'hevc', 'vp9']), bitrate=int(size * 8 / duration),
+                status='active' if rng.random() < 0.9 else 'inactive', created_at=self.moment(2 * 365),
+            ))
+        self.insert(Video, videos)
+        self.insert(Image, [
+            Image(
+                title=f'{self.label} image {i + 1}', image_file=self.files['image'],
+                file_size=rng.randrange(50, 5000) * 1024, file_format='jpg', dimensions='64x48',
+                status='active' if rng.random() < 0.9 else 'inactive', created_at=self.moment(2 * 365),
+            )
+            for i in range(self.rows('images'))
+        ])
+
+    def seed_aptec(self):
+        rng = self.random
+        groups = self.insert(APTEC, [
+            APTEC(name=f'{self.label} APTEC {i + 1}', name_collage=rng.choice(self.collages).collage_name,
+                  name_member=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}', talent_member='Music')
+            for i in range(self.rows('aptec_groups'))
+        ])
+        self.insert(APTEC_MISSION, [
+            APTEC_MISSION(
+                title_mission=f'{self.label} mission {i + 1}', description='Outreach mission',
+                cost=self.money(50, 5000), location_expected=rng.choice(self.districts).name,
+                list_members_expected='Group members', role_per_member='Various',
+                success_reached=rng.choice(['Yes', 'No', 'Partial']), assets_required='Transport',
+                aptec_group=rng.choice(groups),
+            )
+            for i in range(self.rows('aptec_missions'))
+        ])
+
+
+@contextmanager
+def _auto_now_disabled(fields):
+    """
+    Let bulk_create keep the timestamps set on the objects. The flags live on
+    the shared field instances, so they are put back however the block exits.
+    """
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    try:
+        for field in fields:
+            field.auto_now = field.auto_now_add = False
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+# Seeded rows by their marked text column, children before parents
+SEEDED_ROWS = [
+    (APTEC_MISSION, 'title_mission'), (APTEC, 'name'), (Image, 'title'), (Video, 'title'),
+    (Document, 'title'), (CalendarEvent, 'title'), (MinistryInfos, 'ministry_name'),
+    (Ministry, 'ministry_name'), (Writings, 'title'), (DistrictTimetable, 'title'),
+    (CollageTimetable, 'title'), (DistrictCalendar, 'title'), (CollageCalendar, 'title'),
+    (Message, 'body'), (FinancialRecord, 'notes'), (ExpenseCategory, 'description'),
+    (RevenueSource, 'description'),
+]
+
+
+def clear_seeded_data():
+    """
+    Delete the rows written by Seeder: content rows whose marked column
+    starts with SEED_LABEL_PREFIX, the seeded users with their profiles and
+    memberships, then seeded collages and districts. Other rows are kept.
+    Deletes go through the ORM, so delete() overrides and post_delete
+    receivers (media files, renditions, blob references) run.
+    """
+    seeded_users = CustomUser.objects.filter(username__startswith=f'{SEED_USERNAME_PREFIX}-')
+    deleted = {}
+    with transaction.atomic():
+        for model, field in SEEDED_ROWS:
+            deleted[model.__name__] = _delete(model.objects.filter(**{f'{field}__startswith': SEED_LABEL_PREFIX}))
+        for model in (CollageMembers, Members, UserProfile):
+            deleted[model.__name__] = _delete(model.objects.filter(user__in=seeded_users.values('pk')))
+        deleted['CustomUser'] = _delete(seeded_users)
+        deleted['Collage'] = _delete(Collage.objects.filter(collage_name__startswith=SEED_LABEL_PREFIX))
+        deleted['District'] = _delete(District.objects.filter(name__startswith=SEED_LABEL_PREFIX))
+        MessageCounter.rebuild()
+    return deleted
+
+
+def _delete(queryset):
+    """Delete through the model: per instance where delete() is overridden, else queryset.delete()"""
+    model = queryset.model
+    if model.delete is not models.Model.delete:
+        count = 0
+        for instance in queryset.iterator():
+            instance.delete()
+            count += 1
+        return count
+    return queryset.delete()[1].get(model._meta.label, 0)
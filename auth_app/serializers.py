@@ -1,4 +1,6 @@
 # users/serializers.py
+import logging
+
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth import authenticate
@@ -19,6 +21,9 @@ from .models import (
     Writings, Ministry, MinistryInfos, Message
 )
 
+logger = logging.getLogger(__name__)
+from .otp import verify_otp, consume_otp
+
 CustomUser = get_user_model()
 
 # User Registration Serializer
@@ -78,30 +83,8 @@ class UserLoginSerializer(serializers.Serializer):
         raise serializers.ValidationError('Must include "username" and "password".')
 
     def get_user_role(self, user):
-        # Method 1: If role is stored in UserProfile
-        try:
-            if hasattr(user, 'profile'):
-                return user.profile.role  # e.g., 'admin' or 'user'
-        except:
-            pass
-        
-        # Method 2: If using Django groups
-        try:
-            if user.groups.filter(name='admin').exists():
-                return 'admin'
-            else:
-                return 'user'
-        except:
-            pass
-        
-        # Method 3: If role is a field on User model
-        try:
-            return user.role  # if you have a role field on User model
-        except:
-            pass
-        
-        # Default fallback
-        return 'user'
+        # The role lives on the already-loaded CustomUser row, no extra query needed
+        return getattr(user, 'role', None) or CustomUser.Role.USER
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -112,40 +95,18 @@ class PasswordResetRequestSerializer(serializers.Serializer):
     email = serializers.EmailField()
 
     def validate_email(self, value):
-        try:
-            user = CustomUser.objects.get(email=value)
-            return value
-        except CustomUser.DoesNotExist:
-            return value
+        # Existence is checked by the view; never reveal whether the email is registered
+        return value
 
 class OTPVerificationSerializer(serializers.Serializer):
     email = serializers.EmailField()
     otp = serializers.CharField(max_length=6)
 
     def validate(self, data):
-        try:
-            user = CustomUser.objects.get(email=data["email"])
-        except CustomUser.DoesNotExist:
-            raise serializers.ValidationError({"email": "User not found."})
-
-        if hasattr(user, 'verify_otp'):
-            is_valid, message = user.verify_otp(data["otp"])
-            if not is_valid:
-                raise serializers.ValidationError({"otp": message})
-        else:
-            if not hasattr(user, 'otp') or not hasattr(user, 'otp_expiry'):
-                raise serializers.ValidationError({
-                    "otp": "OTP system not properly configured. Please request a new OTP."
-                })
-                
-            if user.otp != data["otp"]:
-                raise serializers.ValidationError({"otp": "Invalid OTP."})
-                
-            if user.otp_expiry < timezone.now():
-                raise serializers.ValidationError({"otp": "OTP expired."})
-
-        user.otp_verified = True
-        user.save()
+        # OTP state lives in the cache-backed store; no user row is read or written here
+        is_valid, message = verify_otp(data["email"], data["otp"])
+        if not is_valid:
+            raise serializers.ValidationError({"otp": message})
         return data
 
 class PasswordResetSerializer(serializers.Serializer):
@@ -161,40 +122,25 @@ class PasswordResetSerializer(serializers.Serializer):
         return value
 
     def validate(self, data):
-        email = data["email"]
-        otp = data["otp"]
-        
+        if len(data["otp"]) != 6 or not data["otp"].isdigit():
+            raise serializers.ValidationError({"otp": "OTP must be 6 digits."})
+
+        is_valid, message = verify_otp(data["email"], data["otp"])
+        if not is_valid:
+            raise serializers.ValidationError({"otp": message})
+        return data
+
+    def save(self):
+        email = self.validated_data["email"]
         try:
             user = CustomUser.objects.get(email=email)
         except CustomUser.DoesNotExist:
             raise serializers.ValidationError({"email": "User not found."})
 
-        if not hasattr(user, 'otp'):
-            if len(otp) != 6 or not otp.isdigit():
-                raise serializers.ValidationError({"otp": "OTP must be 6 digits."})
-        else:
-            if not user.otp:
-                raise serializers.ValidationError({"otp": "No OTP set for this user."})
-                
-            if user.otp != otp:
-                raise serializers.ValidationError({"otp": "Invalid OTP."})
-                
-            if user.otp_expiry and user.otp_expiry < timezone.now():
-                raise serializers.ValidationError({"otp": "OTP expired. Please request a new one."})
-
-        return data
-
-    def save(self):
-        user = CustomUser.objects.get(email=self.validated_data["email"])
-        new_password = self.validated_data["new_password"]
-        
-        user.set_password(new_password)
-        
-        if hasattr(user, 'otp'):
-            user.otp = None
-            user.otp_expiry = None
-        
-        user.save()
+        # The only write of the reset flow
+        user.set_password(self.validated_data["new_password"])
+        user.save(update_fields=["password"])
+        consume_otp(email)
         return user
 
 # User Profile Serializer
@@ -210,7 +156,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
         read_only_fields = ['created_at', 'updated_at']
 
 class CustomUserSerializer(serializers.ModelSerializer):
-    profile = UserProfileSerializer(read_only=True)
+    profile = UserProfileSerializer(source='get_profile', read_only=True)
     full_name = serializers.SerializerMethodField()
     
     class Meta:
@@ -263,7 +209,7 @@ class UserCreateSerializer(serializers.ModelSerializer):
 
 # FULL USER PROFILE SERIALIZERS
 class FullUserSerializer(serializers.ModelSerializer):
-    profile = UserProfileSerializer()
+    profile = UserProfileSerializer(source='get_profile')
     
     class Meta:
         model = CustomUser
@@ -288,7 +234,7 @@ class UserUpdateSerializer(serializers.ModelSerializer):
         
         if profile_data is not None:
             profile_serializer = UserProfileSerializer(
-                instance=instance.profile,
+                instance=instance.get_profile(),
                 data=profile_data,
                 partial=True
             )
@@ -303,6 +249,15 @@ class MessageSerializer(serializers.ModelSerializer):
         model = Message
         fields = '__all__'
 
+
+class MessageThreadSerializer(MessageSerializer):
+    """Message with its nested reply tree, built by Message.get_thread()"""
+    depth = serializers.IntegerField(read_only=True)
+    replies = serializers.SerializerMethodField()
+
+    def get_replies(self, obj):
+        return MessageThreadSerializer(obj.thread_replies, many=True, context=self.context).data
+
 # serializers.py
 from rest_framework import serializers
 from .models import District, Collage
@@ -650,27 +605,57 @@ class CalendarEventSerializer(serializers.ModelSerializer):
 
 # ================================// VIDEOS //=====================
 from rest_framework import serializers
-from .models import Video
+from .models import Video, VideoRendition
 import os
 
+class VideoRenditionSerializer(serializers.ModelSerializer):
+    url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = VideoRendition
+        fields = ['kind', 'label', 'width', 'height', 'bitrate', 'file_size', 'url']
+        read_only_fields = fields
+
+    def get_url(self, obj):
+        return obj.file.url if obj.file else None
+
+
 class VideoSerializer(serializers.ModelSerializer):
     video_url = serializers.SerializerMethodField()
     file_size_mb = serializers.SerializerMethodField()
     duration_formatted = serializers.SerializerMethodField()
+    poster_url = serializers.SerializerMethodField()
+    hls_url = serializers.SerializerMethodField()
+    renditions = VideoRenditionSerializer(many=True, read_only=True)
     
     class Meta:
         model = Video
         fields = [
             'id', 'title', 'video_file', 'video_url', 'description',
             'duration', 'duration_formatted', 'file_size', 'file_size_mb',
+            'width', 'height', 'codec', 'bitrate',
+            'transcode_status', 'poster_url', 'hls_url', 'renditions',
             'status', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at', 'duration', 'file_size']
+        read_only_fields = [
+            'id', 'created_at', 'updated_at', 'duration', 'file_size',
+            'width', 'height', 'codec', 'bitrate', 'transcode_status',
+        ]
     
     def get_video_url(self, obj):
         if obj.video_file:
             return obj.video_file.url
         return None
+
+    def get_poster_url(self, obj):
+        if obj.poster:
+            return obj.poster.url
+        return None
+
+    def get_hls_url(self, obj):
+        if obj.hls_manifest:
+            return obj.hls_manifest.url
+        return None
     
     def get_file_size_mb(self, obj):
         if obj.file_size:
@@ -697,7 +682,7 @@ class VideoSerializer(serializers.ModelSerializer):
 from rest_framework import serializers
 from .models import Image
 import os
-from PIL import Image as PILImage
+from . import imaging
 from io import BytesIO
 from django.core.files.base import ContentFile
 
@@ -705,17 +690,23 @@ class ImageSerializer(serializers.ModelSerializer):
     image_url = serializers.ReadOnlyField()
     file_size_mb = serializers.ReadOnlyField()
     dimensions_display = serializers.ReadOnlyField()
+    thumbnail_url = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
+    srcset_jpeg = serializers.SerializerMethodField()
+    variants = serializers.SerializerMethodField()
     
     class Meta:
         model = Image
         fields = [
             'id', 'title', 'description', 'image_file', 'image_url',
+            'thumbnail_url', 'srcset', 'srcset_jpeg', 'variants',
             'file_size', 'file_size_mb', 'file_format', 'dimensions',
-            'dimensions_display', 'status', 'created_at', 'updated_at'
+            'dimensions_display', 'dominant_color', 'blurhash',
+            'status', 'created_at', 'updated_at'
         ]
         read_only_fields = [
             'id', 'file_size', 'file_format', 'dimensions', 
-            'created_at', 'updated_at'
+            'dominant_color', 'blurhash', 'created_at', 'updated_at'
         ]
     
     def validate_image_file(self, value):
@@ -736,45 +727,43 @@ class ImageSerializer(serializers.ModelSerializer):
             )
         
         return value
+
+    # Variant URLs follow from the row (see auth_app/imaging.py); files that do
+    # not exist yet are generated when first requested
+    def get_thumbnail_url(self, obj):
+        variants = imaging.variants(obj)
+        if not variants:
+            return obj.image_url or None
+        smallest = next(iter(variants.values()))
+        return smallest.get('webp') or smallest.get('jpeg')
+
+    def get_srcset(self, obj):
+        return imaging.srcset(obj, 'webp')
+
+    def get_srcset_jpeg(self, obj):
+        return imaging.srcset(obj, 'jpeg')
+
+    def get_variants(self, obj):
+        return imaging.variants(obj)
     
     def create(self, validated_data):
-        # Create the image instance without user
+        # Metadata is read from the upload, so the row is written once
+        validated_data.update(imaging.extract_metadata(validated_data['image_file']))
         instance = super().create(validated_data)
-        
-        # Process image to get dimensions and file size
-        self._process_image(instance)
-        
+        imaging.schedule_derivatives(instance)
         return instance
     
     def update(self, instance, validated_data):
-        # Update the instance
+        if 'image_file' in validated_data:
+            validated_data.update(imaging.extract_metadata(validated_data['image_file']))
+            # Stale when the new file cannot be read
+            validated_data.setdefault('dimensions', '')
+            validated_data.setdefault('dominant_color', '')
+            validated_data.setdefault('blurhash', '')
         instance = super().update(instance, validated_data)
-        
-        # If image file was updated, reprocess it
         if 'image_file' in validated_data:
-            self._process_image(instance)
-        
+            imaging.schedule_derivatives(instance)
         return instance
-    
-    def _process_image(self, instance):
-        """Process image to extract dimensions and file size"""
-        try:
-            if instance.image_file:
-                # Get file size
-                instance.file_size = instance.image_file.size
-                
-                # Get dimensions for raster images (not SVG)
-                if instance.file_format not in ['svg']:
-                    with PILImage.open(instance.image_file) as img:
-                        width, height = img.size
-                        instance.dimensions = f"{width}x{height}"
-                
-                instance.save()
-        except Exception as e:
-            # If processing fails, still save the instance without dimensions
-            print(f"Error processing image: {e}")
-            instance.file_size = instance.image_file.size
-            instance.save()
 
 
 
@@ -894,6 +883,42 @@ class DocumentSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 
+# =========================// RESUMABLE UPLOADS //===========================
+from .models import UploadSession
+from . import uploads
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = [
+            'id', 'target', 'filename', 'content_type', 'upload_length', 'offset', 'metadata',
+            'status', 'result_id', 'error', 'expires_at', 'created_at', 'updated_at'
+        ]
+        read_only_fields = [
+            'id', 'offset', 'status', 'result_id', 'error', 'expires_at', 'created_at', 'updated_at'
+        ]
+
+    def validate_filename(self, value):
+        # Only the base name is kept; the storage picks the final path
+        value = os.path.basename(value.replace('\\', '/'))
+        if not value:
+            raise serializers.ValidationError("A file name is required")
+        return value
+
+    def validate_upload_length(self, value):
+        max_size = uploads.upload_setting('MAX_SIZE')
+        if value < 1:
+            raise serializers.ValidationError("upload_length must be at least 1 byte")
+        if value > max_size:
+            raise serializers.ValidationError(f"Uploads cannot exceed {max_size // (1024 * 1024)}MB")
+        return value
+
+    def validate_metadata(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError("metadata must be an object")
+        return value
+
+
 
 
 # ==============================//   ADD SERIALIZERS //==================
@@ -962,6 +987,30 @@ class AddSerializer(serializers.ModelSerializer):
 
     # ==========================DEACTVATION=================
     # Add to users/serializers.py
+class BulkStatusSerializer(serializers.Serializer):
+    """
+    Target rows for a bulk activate/deactivate: either a list of ids or a
+    filter object (keys allowed by context['filter_fields']), not both.
+    """
+    MAX_IDS = 100000
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False, allow_empty=False, max_length=MAX_IDS
+    )
+    filter = serializers.DictField(required=False, allow_empty=False)
+    is_active = serializers.BooleanField()
+    stream = serializers.BooleanField(required=False, default=False)
+
+    def validate(self, attrs):
+        if ('ids' in attrs) == ('filter' in attrs):
+            raise serializers.ValidationError("Provide either ids or filter.")
+        unknown = set(attrs.get('filter', ())) - set(self.context.get('filter_fields', ()))
+        if unknown:
+            raise serializers.ValidationError({'filter': f"Unknown filter(s): {', '.join(sorted(unknown))}."})
+        return attrs
+
+
 class UserDeactivateSerializer(serializers.Serializer):
     user_id = serializers.IntegerField(required=True)
     
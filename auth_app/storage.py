@@ -0,0 +1,197 @@
+# users/storage.py
+"""
+Content-addressed media storage (the default storage, see STORAGES).
+
+Every file saved through Django (FileField uploads, storage.save()) is
+hashed with SHA-256 while it is streamed to disk, and the content is kept
+once as a blob:
+
+    MEDIA_ROOT/.blobs/ab/cd/abcd...      one file per distinct content
+    MEDIA_ROOT/members/images/x.png      hard link to its blob
+
+The storage names stay exactly what upload_to produced, so URLs, download
+file names and code that opens .path keep working. A second upload of the
+same bytes only adds a hard link: no extra disk space. FileBlob.refcount
+counts the names (FileBlobReference) pointing at a blob. delete() removes
+the name and drops the blob together with its last reference.
+
+On filesystems without hard links the name gets a private copy and only
+the bookkeeping is shared. Files written before this storage, or outside
+it, are not referenced. `manage.py dedupe_media` hashes them, links
+duplicates to one blob and recounts references.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+CONTENT_STORAGE_DEFAULTS = {
+    'BLOB_DIR': '.blobs',   # relative to MEDIA_ROOT; must be on the same filesystem
+}
+
+CHUNK_SIZE = 256 * 1024
+
+
+def content_storage_setting(name):
+    return getattr(settings, 'CONTENT_STORAGE', {}).get(name, CONTENT_STORAGE_DEFAULTS[name])
+
+
+def blob_name(digest):
+    return f"{content_storage_setting('BLOB_DIR')}/{digest[:2]}/{digest[2:4]}/{digest}"
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@deconstructible(path='auth_app.storage.ContentAddressedStorage')
+class ContentAddressedStorage(FileSystemStorage):
+
+    # Times the blob is stored again when it is released while being linked
+    LINK_ATTEMPTS = 3
+
+    def _save(self, name, content):
+        digest, size, spooled = self._spool(content)
+        # Kept until the name is linked, so a blob released meanwhile can be stored again
+        source = spooled or content.temporary_file_path()
+        try:
+            blob_path = self.path(blob_name(digest))
+            for attempt in range(self.LINK_ATTEMPTS):
+                if not os.path.exists(blob_path):
+                    self._store_blob(source, blob_path)
+                try:
+                    name = self._link(blob_path, name)
+                    break
+                except FileNotFoundError:
+                    # Its last reference was deleted after the exists() check
+                    if attempt == self.LINK_ATTEMPTS - 1:
+                        raise
+        finally:
+            if spooled is not None:
+                os.remove(spooled)
+        self.add_reference(name, digest, size)
+        return name
+
+    def _store_blob(self, source, blob_path):
+        """Make blob_path a link to (or, across filesystems, a copy of) source"""
+        self._makedirs(os.path.dirname(blob_path))
+        try:
+            os.link(source, blob_path)
+        except FileExistsError:
+            return
+        except OSError:
+            temporary = f'{blob_path}.{os.getpid()}.tmp'
+            shutil.copyfile(source, temporary)
+            os.replace(temporary, blob_path)
+        if self.file_permissions_mode is not None:
+            os.chmod(blob_path, self.file_permissions_mode)
+
+    def _spool(self, content):
+        """(digest, size, temporary path or None) for content, hashed in the same pass that writes it"""
+        digest = hashlib.sha256()
+        size = 0
+        if hasattr(content, 'temporary_file_path'):
+            # Already on disk: read it once to hash it, link it later
+            for chunk in content.chunks(CHUNK_SIZE):
+                digest.update(chunk)
+                size += len(chunk)
+            return digest.hexdigest(), size, None
+
+        directory = self.path(content_storage_setting('BLOB_DIR'))
+        self._makedirs(directory)
+        fd, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                for chunk in content.chunks(CHUNK_SIZE):
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    fh.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+        except BaseException:
+            os.remove(temporary)
+            raise
+        return digest.hexdigest(), size, temporary
+
+    def _makedirs(self, directory):
+        if self.directory_permissions_mode is not None:
+            old_umask = os.umask(0o777 & ~self.directory_permissions_mode)
+            try:
+                os.makedirs(directory, self.directory_permissions_mode, exist_ok=True)
+            finally:
+                os.umask(old_umask)
+        else:
+            os.makedirs(directory, exist_ok=True)
+
+    def _link(self, blob_path, name):
+        """Create `name` as a hard link to the blob (a copy where links are unsupported); returns the name used"""
+        full_path = self.path(name)
+        self._makedirs(os.path.dirname(full_path))
+        while True:
+            if self._allow_overwrite and os.path.lexists(full_path):
+                os.remove(full_path)
+            try:
+                try:
+                    os.link(blob_path, full_path)
+                except (FileExistsError, FileNotFoundError):
+                    raise
+                except OSError:
+                    # No hard links on this filesystem: a private copy
+                    with open(blob_path, 'rb') as source, open(full_path, 'xb') as target:
+                        shutil.copyfileobj(source, target, CHUNK_SIZE)
+            except FileExistsError:
+                # Taken since get_available_name() ran
+                name = self.get_available_name(name)
+                full_path = self.path(name)
+            else:
+                break
+        self._ensure_location_group_id(full_path)
+        return os.path.relpath(full_path, self.location).replace('\\', '/')
+
+    # -------------------- references --------------------
+    def add_reference(self, name, digest, size):
+        from .models import FileBlob, FileBlobReference
+
+        with transaction.atomic():
+            existing = FileBlobReference.objects.filter(name=name).select_related('blob').first()
+            if existing is not None and existing.blob.digest == digest:
+                return existing.blob
+            # A name saved again (overwrite) first gives up its old blob
+            self.release(name)
+            blob, _ = FileBlob.objects.get_or_create(digest=digest, defaults={'size': size})
+            if not FileBlob.objects.filter(pk=blob.pk).update(refcount=F('refcount') + 1):
+                # Its last reference was released concurrently
+                blob = FileBlob.objects.create(digest=digest, size=size, refcount=1)
+            FileBlobReference.objects.create(name=name, blob=blob)
+        return blob
+
+    def release(self, name):
+        """Drop the reference of `name`; the blob goes with its last reference"""
+        from .models import FileBlob, FileBlobReference
+
+        with transaction.atomic():
+            reference = FileBlobReference.objects.filter(name=name).select_related('blob').first()
+            if reference is None:
+                return
+            reference.delete()
+            FileBlob.objects.filter(pk=reference.blob_id, refcount__gt=0).update(refcount=F('refcount') - 1)
+            deleted, _ = FileBlob.objects.filter(pk=reference.blob_id, refcount=0).delete()
+        if deleted:
+            try:
+                os.remove(self.path(blob_name(reference.blob.digest)))
+            except FileNotFoundError:
+                pass
+
+    def delete(self, name):
+        super().delete(name)
+        self.release(name)
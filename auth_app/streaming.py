@@ -0,0 +1,204 @@
+# users/streaming.py
+"""
+Byte serving (RFC 9110 ranges) for files on local storage.
+
+ranged_file_response() answers GET/HEAD for a file with:
+
+* ETag / Last-Modified, and 304 / 412 for If-None-Match, If-Modified-Since,
+  If-Match and If-Unmodified-Since;
+* Range: one range -> 206 with Content-Range, several -> 206
+  multipart/byteranges, unsatisfiable -> 416. If-Range that no longer
+  matches falls back to the full 200 response;
+* zero-copy sends: single ranges and full files go out as a FileResponse
+  over the real file descriptor, positioned at the range start, with the
+  exact Content-Length. WSGI servers with wsgi.file_wrapper (gunicorn) then
+  use os.sendfile() for exactly that many bytes; other servers read it in
+  blocks and stop at the end of the range.
+"""
+import mimetypes
+import os
+import re
+import uuid
+
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe, quote_etag
+
+BLOCK_SIZE = 256 * 1024
+MAX_RANGES = 16
+
+_RANGE_RE = re.compile(r'^\s*(\d*)\s*-\s*(\d*)\s*$')
+
+
+class RangeFile:
+    """
+    File object limited to `length` bytes from its current position. Keeps
+    fileno() so sendfile-capable servers can send directly from the
+    descriptor (they take the byte count from Content-Length).
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def file_etag(stat):
+    return quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+
+
+def parse_range_header(header, size):
+    """
+    [(start, end)] inclusive byte ranges, sorted and coalesced; None when the
+    header is absent or malformed (serve the whole file); [] when no range
+    is satisfiable (416).
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not spec:
+        return None
+    ranges = []
+    for part in spec.split(','):
+        match = _RANGE_RE.match(part)
+        if not match:
+            return None
+        first, last = match.groups()
+        if not first and not last:
+            return None
+        if not first:
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length == 0:
+                continue
+            ranges.append((max(size - length, 0), size - 1))
+            continue
+        start = int(first)
+        end = int(last) if last else size - 1
+        if last and end < start:
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, min(end, size - 1)))
+
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _if_range_matches(request, etag, last_modified):
+    value = request.headers.get('If-Range')
+    if not value:
+        return True
+    value = value.strip()
+    if value.startswith(('"', 'W/')):
+        # Strong comparison only
+        return value == etag
+    date = parse_http_date_safe(value)
+    return date is not None and int(last_modified) == date
+
+
+def ranged_file_response(request, path, content_type=None, filename=None, as_attachment=False):
+    """Response for the file at `path`, honouring conditional and Range headers"""
+    file = open(path, 'rb')
+    try:
+        stat = os.fstat(file.fileno())
+        etag = file_etag(stat)
+        last_modified = int(stat.st_mtime)
+        size = stat.st_size
+
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            file.close()
+            not_modified['Accept-Ranges'] = 'bytes'
+            return not_modified
+
+        if content_type is None:
+            content_type, _ = mimetypes.guess_type(filename or path)
+            content_type = content_type or 'application/octet-stream'
+
+        ranges = None
+        if request.method in ('GET', 'HEAD') and _if_range_matches(request, etag, last_modified):
+            ranges = parse_range_header(request.headers.get('Range'), size)
+            if ranges is not None and len(ranges) > MAX_RANGES:
+                ranges = None
+
+        if ranges == []:
+            file.close()
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+        elif ranges is None or len(ranges) == 1:
+            start, end = ranges[0] if ranges else (0, size - 1)
+            partial = (start, end) != (0, size - 1)
+            response = FileResponse(
+                RangeFile(file, start, end - start + 1), status=206 if partial else 200,
+                content_type=content_type,
+            )
+            response['Content-Length'] = str(end - start + 1)
+            if partial:
+                response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        else:
+            file.close()
+            response = _multipart_response(path, ranges, size, content_type)
+
+        if as_attachment or filename:
+            response['Content-Disposition'] = content_disposition_header(
+                as_attachment, filename or os.path.basename(path)
+            )
+    except BaseException:
+        file.close()
+        raise
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def _multipart_response(path, ranges, size, content_type):
+    boundary = uuid.uuid4().hex
+    headers = [
+        (f'\r\n--{boundary}\r\nContent-Type: {content_type}\r\n'
+         f'Content-Range: bytes {start}-{end}/{size}\r\n\r\n').encode('latin-1')
+        for start, end in ranges
+    ]
+    closing = f'\r\n--{boundary}--\r\n'.encode('latin-1')
+    length = sum(len(h) for h in headers) + sum(end - start + 1 for start, end in ranges) + len(closing)
+
+    def parts():
+        # Opened on first iteration, so a response that is never consumed holds no descriptor
+        with open(path, 'rb') as file:
+            for header, (start, end) in zip(headers, ranges):
+                yield header
+                part = RangeFile(file, start, end - start + 1)
+                while True:
+                    block = part.read(BLOCK_SIZE)
+                    if not block:
+                        break
+                    yield block
+            yield closing
+
+    response = StreamingHttpResponse(
+        parts(), status=206, content_type=f'multipart/byteranges; boundary={boundary}'
+    )
+    response['Content-Length'] = str(length)
+    return response
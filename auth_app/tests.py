@@ -1,3 +1,540 @@
-from django.test import TestCase
+"""
+Performance regression suite.
 
-# Create your tests here.
+Seeds synthetic data and checks, per endpoint:
+
+* query-count budgets (assertNumQueries). Budgets are exact and every
+  table is seeded, so a serializer that starts querying per row (N+1)
+  fails immediately;
+* that list endpoints run the same number of queries when the data doubles;
+* latency of every router endpoint in auth_app/urls.py, written to a JSON
+  baseline file when PERF_BASELINE_FILE is set.
+
+The protocol tests at the end cover the streaming/IO endpoints whose speed
+comes from their wire protocol: resumable uploads, ranged media and
+streamed ZIP bundles.
+
+Environment:
+    PERF_SEED_SCALE        seed_perf --scale of the seeded data (default 0.05,
+                           about 500 rows; 100 is about a million)
+    PERF_BASELINE_FILE     where timings are written; unset, nothing is written
+                           and the endpoints are only checked for server errors
+    PERF_BASELINE_COMPARE  if set, fail when an endpoint is slower than the
+                           existing baseline by more than PERF_TOLERANCE (default 2.0x)
+
+    python manage.py test auth_app
+    PERF_SEED_SCALE=5 PERF_BASELINE_FILE=perf_baseline.json PERF_BASELINE_COMPARE=1 \
+        python manage.py test auth_app
+"""
+import base64
+import hashlib
+import io
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+import zipfile
+from unittest import mock
+
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import NoReverseMatch, reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .downloads import archive_names, zip_stream
+from .models import CustomUser, Document, Message, UploadSession, Writings
+from . import uploads
+from .seeding import Seeder
+from .urls import router
+from .views import DocumentViewSet
+
+SEED_SCALE = float(os.environ.get('PERF_SEED_SCALE', '0.05'))
+BASELINE_FILE = os.environ.get('PERF_BASELINE_FILE')
+BASELINE_COMPARE = bool(os.environ.get('PERF_BASELINE_COMPARE'))
+TOLERANCE = float(os.environ.get('PERF_TOLERANCE', '2.0'))
+
+
+class PerfSeedMixin:
+    """Synthetic data from auth_app.seeding (the generator behind manage.py seed_perf)"""
+
+    @classmethod
+    def seed(cls, scale=SEED_SCALE, seed=0):
+        return Seeder(scale=scale, seed=seed, media=False).run()
+
+    @classmethod
+    def create_admin(cls):
+        return CustomUser.objects.create_user(
+            username='UDOM-ZONE-BENCH-ADMIN', email='perf-admin@example.com', password=None,
+            first_name='Perf', last_name='Admin', role=CustomUser.Role.ADMIN, is_active=True,
+        )
+
+
+def router_endpoints():
+    """(basename, list url) for every viewset registered on the router"""
+    endpoints = []
+    for prefix, viewset, basename in router.registry:
+        try:
+            endpoints.append((basename, reverse(f'{basename}-list')))
+        except NoReverseMatch:
+            continue
+    return endpoints
+
+
+class QueryBudgetTests(PerfSeedMixin, TestCase):
+    """
+    Exact query budgets for list endpoints. Every list returns at least one
+    seeded row, so a per-row query always exceeds its budget.
+    """
+
+    # basename -> queries for GET <list url> as an admin (first page).
+    # Paginated lists cost COUNT(*) + the page; anything more is a relation
+    # that needs select_related/prefetch_related in the viewset queryset.
+    LIST_BUDGETS = {
+        'message': 2,
+        'district': 3,             # + prefetched collages
+        'member': 2,
+        'charityperformance': 2,
+        'collage': 2,
+        'collagemembers': 2,
+        'writings': 2,
+        'calendar-events': 2,
+        'collagecalendar': 2,
+        'districtcalendar': 2,
+        'collagetimetable': 2,
+        'districttimetable': 2,
+        'revenuesource': 2,
+        'expensecategory': 2,
+        'financialrecord': 2,
+        'ministry': 2,
+        'ministryinfos': 2,
+        'videos': 3,               # + prefetched renditions
+        'image': 2,
+        'document': 2,
+        'upload': 2,
+        'user': 2,
+        'aptec': 2,
+        'aptec-mission': 2,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seed()
+        cls.admin = cls.create_admin()
+        # Upload sessions are listed per user, so the admin needs their own
+        UploadSession.objects.bulk_create(
+            UploadSession(target=UploadSession.Target.DOCUMENT, filename=f'part-{i}.pdf', upload_length=1024,
+                          created_by=cls.admin, expires_at=timezone.now() + timezone.timedelta(days=1))
+            for i in range(3)
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_every_router_endpoint_has_a_budget(self):
+        missing = [basename for basename, _ in router_endpoints() if basename not in self.LIST_BUDGETS]
+        self.assertEqual(missing, [], "Add a query budget for new router endpoints")
+
+    def test_list_query_budgets(self):
+        for basename, url in router_endpoints():
+            with self.subTest(endpoint=basename):
+                with self.assertNumQueries(self.LIST_BUDGETS[basename]):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200, response.content[:500])
+
+    def test_message_endpoints(self):
+        root = Message.objects.filter(replies__isnull=False).first()
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('message-thread', args=[root.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['id'], root.pk)
+        self.assertCountEqual(
+            [reply['id'] for reply in response.data['replies']],
+            root.replies.values_list('pk', flat=True),
+        )
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('message-inbox'))
+        self.assertEqual(response.status_code, 200)
+        ids = [message['id'] for message in response.data['results']]
+        self.assertTrue(ids)
+        expected = Message.objects.order_by('-created_at', '-id').values_list('pk', flat=True)[:len(ids)]
+        self.assertEqual(ids, list(expected))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('message-sync'))
+        self.assertEqual(response.status_code, 200)
+        ids = [message['id'] for message in response.data['results']]
+        self.assertTrue(ids)
+        expected = Message.objects.order_by('created_at', 'id').values_list('pk', flat=True)[:len(ids)]
+        self.assertEqual(ids, list(expected))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('unread-message-count'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['new_messages_count'], Message.objects.filter(is_read=False).count())
+
+    def test_user_directory(self):
+        with self.assertNumQueries(2):  # page + approximate count
+            response = self.client.get(reverse('user-directory'), {'q': 'am'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['results'])
+        for user in response.data['results']:
+            self.assertTrue(
+                any(str(user[field]).lower().startswith('am') for field in ('first_name', 'last_name', 'email', 'username')),
+                user,
+            )
+
+        response = self.client.get(reverse('user-directory'), {'is_active': 'true', 'page_size': 5})
+        self.assertEqual(response.status_code, 200)
+        first_page = [user['id'] for user in response.data['results']]
+        self.assertEqual(len(first_page), 5)
+        with self.assertNumQueries(1):  # later pages skip the count
+            response = self.client.get(response.data['next'])
+        self.assertEqual(response.status_code, 200)
+        second_page = [user['id'] for user in response.data['results']]
+        self.assertTrue(second_page)
+        self.assertFalse(set(first_page) & set(second_page))
+        self.assertTrue(all(user['is_active'] for user in response.data['results']))
+
+    def test_collage_members_serializer(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('collagemembers-list'))
+        self.assertTrue(response.data)
+
+
+class ScaleIndependenceTests(PerfSeedMixin, TestCase):
+    """List endpoints must run the same number of queries at 1x and 2x data"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = cls.create_admin()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _query_counts(self):
+        counts = {}
+        for basename, url in router_endpoints():
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            counts[basename] = len(queries)
+        return counts
+
+    def test_query_counts_do_not_grow_with_data(self):
+        self.seed()
+        small = self._query_counts()
+        self.seed(seed=1)
+        large = self._query_counts()
+        grown = {name: (small[name], large[name]) for name in small if large[name] != small[name]}
+        self.assertEqual(grown, {}, "Query count grew with row count (N+1): {endpoint: (1x, 2x)}")
+
+
+class EndpointLatencyTests(PerfSeedMixin, TestCase):
+    """Median latency of every router endpoint (list and first detail), written to BASELINE_FILE if set"""
+    RUNS = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seed()
+        cls.admin = cls.create_admin()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def _measure(self, url):
+        timings = []
+        for _ in range(self.RUNS):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = self.client.get(url)
+                timings.append(time.perf_counter() - started)
+        return response, {
+            'status': response.status_code,
+            'median_ms': round(statistics.median(timings) * 1000, 3),
+            'queries': len(queries),
+        }
+
+    def test_record_latency_baseline(self):
+        results = {}
+        for basename, url in router_endpoints():
+            response, results[f'{basename}-list'] = self._measure(url)
+            rows = response.data.get('results', response.data) if isinstance(response.data, dict) else response.data
+            if isinstance(rows, list) and rows and isinstance(rows[0], dict) and 'id' in rows[0]:
+                try:
+                    detail_url = reverse(f'{basename}-detail', args=[rows[0]['id']])
+                except NoReverseMatch:
+                    continue
+                _, results[f'{basename}-detail'] = self._measure(detail_url)
+
+        failures = [f"{name}: {result['status']}" for name, result in results.items() if result['status'] >= 500]
+        self.assertEqual(failures, [], "Endpoints returning server errors")
+        if not BASELINE_FILE:
+            return
+
+        previous = {}
+        if os.path.exists(BASELINE_FILE):
+            with open(BASELINE_FILE) as fh:
+                baseline = json.load(fh)
+            # Timings are only comparable at the same scale and on the same database
+            if (baseline.get('seed_scale'), baseline.get('database')) == (SEED_SCALE, connection.vendor):
+                previous = baseline.get('endpoints', {})
+
+        with open(BASELINE_FILE, 'w') as fh:
+            json.dump({
+                'seed_scale': SEED_SCALE,
+                'database': connection.vendor,
+                'recorded_at': timezone.now().isoformat(),
+                'endpoints': results,
+            }, fh, indent=2, sort_keys=True)
+
+        if BASELINE_COMPARE and previous:
+            slower = {
+                name: (previous[name]['median_ms'], result['median_ms'])
+                for name, result in results.items()
+                if name in previous and result['median_ms'] > previous[name]['median_ms'] * TOLERANCE
+            }
+            self.assertEqual(slower, {}, f"Slower than baseline x{TOLERANCE}: {{endpoint: (baseline ms, now ms)}}")
+
+
+# ============================ PROTOCOL TESTS ============================
+class MediaRootMixin:
+    """A temporary MEDIA_ROOT (and upload part directory) per test"""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.media_root = os.path.join(directory, 'media')
+        os.makedirs(self.media_root)
+        override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            UPLOAD_SESSIONS={'DIRECTORY': os.path.join(directory, 'upload_sessions')},
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+
+class UploadSessionTests(MediaRootMixin, TestCase):
+    """Resumable upload protocol (auth_app/uploads.py)"""
+    CONTENT = b'%PDF-1.4 ' + bytes(range(256)) * 64
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    def create_session(self):
+        response = self.client.post(reverse('upload-list'), {
+            'target': UploadSession.Target.DOCUMENT, 'filename': 'report.pdf',
+            'upload_length': len(self.CONTENT), 'metadata': {'title': 'Report'},
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return UploadSession.objects.get(pk=response.data['id'])
+
+    def patch(self, session, offset, chunk, checksum=None):
+        headers = {'HTTP_UPLOAD_OFFSET': str(offset)}
+        if checksum:
+            headers['HTTP_UPLOAD_CHECKSUM'] = checksum
+        return self.client.patch(
+            reverse('upload-detail', args=[session.pk]), chunk,
+            content_type='application/offset+octet-stream', **headers
+        )
+
+    def test_last_chunk_creates_the_target(self):
+        session = self.create_session()
+        half = len(self.CONTENT) // 2
+        response = self.patch(session, 0, self.CONTENT[:half])
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response['Upload-Offset'], str(half))
+
+        response = self.patch(session, half, self.CONTENT[half:])
+        self.assertEqual(response.status_code, 201, response.content)
+        document = Document.objects.get(pk=response.data['id'])
+        self.assertEqual(document.title, 'Report')
+        with document.file.open('rb') as fh:
+            self.assertEqual(fh.read(), self.CONTENT)
+        session.refresh_from_db()
+        self.assertEqual((session.status, session.result_id), (UploadSession.Status.COMPLETE, document.pk))
+        self.assertEqual(os.listdir(os.path.dirname(uploads.part_path(session))), [])
+
+    def test_wrong_offset_conflicts(self):
+        session = self.create_session()
+        response = self.patch(session, 10, self.CONTENT[10:20])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Upload-Offset'], '0')
+        session.refresh_from_db()
+        self.assertEqual(session.offset, 0)
+
+    def test_checksum_mismatch_is_cut_off(self):
+        session = self.create_session()
+        chunk = self.CONTENT[:100]
+        wrong = 'sha256 ' + base64.b64encode(hashlib.sha256(b'other').digest()).decode()
+        response = self.patch(session, 0, chunk, checksum=wrong)
+        self.assertEqual(response.status_code, 460)
+        session.refresh_from_db()
+        self.assertEqual(session.offset, 0)
+        self.assertEqual(os.path.getsize(uploads.part_path(session)), 0)
+
+        right = 'sha256 ' + base64.b64encode(hashlib.sha256(chunk).digest()).decode()
+        response = self.patch(session, 0, chunk, checksum=right)
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(response['Upload-Offset'], '100')
+
+    def test_failed_assembly_fails_the_session(self):
+        session = self.create_session()
+        with mock.patch.object(DocumentViewSet, 'perform_create', side_effect=DatabaseError("disk full")):
+            with self.assertRaises(DatabaseError), self.assertLogs('auth_app.views', 'ERROR'):
+                self.patch(session, 0, self.CONTENT)
+        session.refresh_from_db()
+        self.assertEqual(session.status, UploadSession.Status.FAILED)
+        self.assertTrue(session.error)
+        # Not silently restarted from offset 0
+        response = self.patch(session, 0, self.CONTENT[:10])
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Document.objects.exists())
+
+
+class RangedMediaTests(MediaRootMixin, TestCase):
+    """Range, multi-range and conditional GETs of files under MEDIA_ROOT (auth_app/streaming.py)"""
+    CONTENT = bytes(range(256)) * 4
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs(os.path.join(self.media_root, 'videos'))
+        with open(os.path.join(self.media_root, 'videos', 'clip.mp4'), 'wb') as fh:
+            fh.write(self.CONTENT)
+        self.url = '/media/videos/clip.mp4'
+
+    def get(self, url=None, **headers):
+        response = self.client.get(url or self.url, **headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_whole_file(self):
+        response, body = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.CONTENT)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_single_range(self):
+        response, body = self.get(HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.CONTENT)}')
+        self.assertEqual(body, self.CONTENT[10:20])
+
+    def test_suffix_range(self):
+        response, body = self.get(HTTP_RANGE='bytes=-5')
+        self.assertEqual(response.status_code, 206)
+        size = len(self.CONTENT)
+        self.assertEqual(response['Content-Range'], f'bytes {size - 5}-{size - 1}/{size}')
+        self.assertEqual(body, self.CONTENT[-5:])
+
+    def test_multiple_ranges(self):
+        response, body = self.get(HTTP_RANGE='bytes=0-4,100-109')
+        self.assertEqual(response.status_code, 206)
+        content_type, _, boundary = response['Content-Type'].partition('; boundary=')
+        self.assertEqual(content_type, 'multipart/byteranges')
+        self.assertEqual(int(response['Content-Length']), len(body))
+        parts = body.split(f'\r\n--{boundary}'.encode())[1:-1]
+        size = len(self.CONTENT)
+        self.assertEqual(len(parts), 2)
+        for part, (start, end) in zip(parts, [(0, 4), (100, 109)]):
+            headers, _, data = part.partition(b'\r\n\r\n')
+            self.assertIn(f'Content-Range: bytes {start}-{end}/{size}'.encode(), headers)
+            self.assertEqual(data, self.CONTENT[start:end + 1])
+
+    def test_unsatisfiable_range(self):
+        size = len(self.CONTENT)
+        response, _ = self.get(HTTP_RANGE=f'bytes={size}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{size}')
+
+    def test_if_none_match(self):
+        response, _ = self.get()
+        not_modified, body = self.get(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(body, b'')
+
+    def test_stale_if_range_sends_the_whole_file(self):
+        response, body = self.get(HTTP_RANGE='bytes=10-19', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.CONTENT)
+
+    def test_hidden_and_traversal_paths(self):
+        os.makedirs(os.path.join(self.media_root, '.blobs'))
+        with open(os.path.join(self.media_root, '.blobs', 'blob'), 'wb') as fh:
+            fh.write(b'x')
+        for url in ('/media/.blobs/blob', '/media/videos/../../secret', '/media/videos/./clip.mp4',
+                    '/media/missing.mp4'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class ZipBundleTests(MediaRootMixin, TestCase):
+    """Streamed ZIP archives (auth_app/downloads.py) and the writings bundle endpoint"""
+
+    def write(self, name, content):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as fh:
+            fh.write(content)
+        return path
+
+    def test_zip_stream(self):
+        text = self.write('writings/notes.txt', b'plain text ' * 100)
+        pdf = self.write('writings/paper.pdf', b'%PDF-1.4 ' * 100)
+        missing = os.path.join(self.media_root, 'writings', 'gone.txt')
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(zip_stream([
+            (text, 'notes.txt'), (missing, 'gone.txt'), (pdf, 'paper.pdf'),
+        ]))))
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(archive.namelist(), ['notes.txt', 'paper.pdf'])
+        self.assertEqual(archive.getinfo('notes.txt').compress_type, zipfile.ZIP_DEFLATED)
+        self.assertEqual(archive.getinfo('paper.pdf').compress_type, zipfile.ZIP_STORED)
+        self.assertEqual(archive.read('paper.pdf'), b'%PDF-1.4 ' * 100)
+
+    def test_archive_names_are_numbered(self):
+        self.assertEqual(
+            archive_names(['a/report.pdf', 'b/report.pdf', 'c/REPORT.pdf', 'd/other.pdf']),
+            ['report.pdf', 'report (2).pdf', 'REPORT (3).pdf', 'other.pdf'],
+        )
+
+    def create_writing(self, name, content, document_type=Writings.DocumentType.SPIRITUAL):
+        self.write(name, content)
+        return Writings.objects.create(title=name, document=name, document_type=document_type)
+
+    def bundle(self, **params):
+        return self.client.get(reverse('writings-bundle'), params)
+
+    def test_bundle_of_filtered_writings(self):
+        first = self.create_writing('writings/2024/essay.txt', b'first')
+        self.create_writing('writings/2025/essay.txt', b'second')
+        self.create_writing('writings/economy.txt', b'other', Writings.DocumentType.ECONOMY)
+
+        response = self.bundle(document_type=Writings.DocumentType.SPIRITUAL)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        self.assertIn('writings.zip', response['Content-Disposition'])
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertIsNone(archive.testzip())
+        contents = sorted(archive.read(name) for name in archive.namelist())
+        self.assertEqual(sorted(archive.namelist()), ['essay (2).txt', 'essay.txt'])
+        self.assertEqual(contents, [b'first', b'second'])
+
+        response = self.bundle(id=[first.pk])
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual([archive.read(name) for name in archive.namelist()], [b'first'])
+
+    def test_bundle_limits(self):
+        self.create_writing('writings/a.txt', b'a')
+        self.create_writing('writings/b.txt', b'b')
+        with override_settings(DOWNLOADS={'MAX_BUNDLE_FILES': 1}):
+            self.assertEqual(self.bundle().status_code, 400)
+        self.assertEqual(self.bundle(document_type=Writings.DocumentType.ECONOMY).status_code, 404)
+        self.assertEqual(self.bundle(id='x').status_code, 400)
@@ -0,0 +1,254 @@
+# users/transcoding.py
+"""
+Background transcoding of uploaded videos into an adaptive ladder.
+
+For every rung of VIDEO_TRANSCODING['LADDER'] that is not taller than the
+source, one ffmpeg encode produces an H.264/AAC MP4 (faststart, keyframes
+every SEGMENT_SECONDS), which is then remuxed without re-encoding into an
+HLS variant (MPEG-TS segments + index.m3u8). A master playlist and a poster
+frame complete the set:
+
+    videos/renditions/<video id>/master.m3u8
+    videos/renditions/<video id>/poster.jpg
+    videos/renditions/<video id>/<label>.mp4
+    videos/renditions/<video id>/<label>/index.m3u8, seg_00000.ts, ...
+
+Jobs are queued after the upload transaction commits and run on a bounded
+thread pool, so at most WORKERS ffmpeg processes run per web process. Each
+job writes into a temporary directory that replaces the previous output
+only when every step succeeded; VideoRendition rows and Video.poster /
+hls_manifest / transcode_status are then updated in one transaction.
+Videos left pending by a restart are picked up with
+`manage.py transcode_videos --pending`.
+
+ffmpeg writes straight to disk, so this needs a local FileSystemStorage.
+"""
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+
+from . import video_probe
+
+logger = logging.getLogger(__name__)
+
+TRANSCODING_DEFAULTS = {
+    'ENABLED': True,
+    'FFMPEG': None,             # None: ffmpeg on PATH, else the imageio-ffmpeg binary bundled for moviepy
+    'WORKERS': 1,               # concurrent ffmpeg jobs per process
+    # (height, video bits/s, audio bits/s)
+    'LADDER': [(240, 400_000, 64_000), (480, 1_000_000, 96_000), (720, 2_500_000, 128_000)],
+    'SEGMENT_SECONDS': 6,
+    'PRESET': 'veryfast',
+    'TIMEOUT': 3600,            # seconds per ffmpeg run
+}
+
+OUTPUT_DIR = 'videos/renditions'
+
+
+def transcoding_setting(name):
+    return getattr(settings, 'VIDEO_TRANSCODING', {}).get(name, TRANSCODING_DEFAULTS[name])
+
+
+class TranscodeError(Exception):
+    pass
+
+
+def ffmpeg_binary():
+    configured = transcoding_setting('FFMPEG')
+    if configured:
+        return configured
+    found = shutil.which('ffmpeg')
+    if found:
+        return found
+    try:
+        import imageio_ffmpeg
+    except ImportError:
+        raise TranscodeError("ffmpeg not found; set VIDEO_TRANSCODING['FFMPEG']")
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+
+# ============================ QUEUE ============================
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(
+                    max_workers=transcoding_setting('WORKERS'), thread_name_prefix='video-transcode'
+                )
+    return _pool
+
+
+def schedule_transcode(video):
+    """Queue video for transcoding once the current transaction commits"""
+    if not transcoding_setting('ENABLED'):
+        return
+    video_id = video.pk
+    transaction.on_commit(lambda: _get_pool().submit(_run_job, video_id))
+
+
+def _run_job(video_id):
+    close_old_connections()
+    try:
+        transcode_video(video_id)
+    except Exception:
+        logger.exception("Transcoding of video %s crashed", video_id)
+    finally:
+        close_old_connections()
+
+
+# ============================ PIPELINE ============================
+def transcode_video(video_id):
+    """Build the rendition ladder for one video. Returns the VideoRendition rows (or None on failure)."""
+    from .models import Video, VideoRendition
+
+    try:
+        video = Video.objects.get(pk=video_id)
+    except Video.DoesNotExist:
+        return None
+    video.set_fields(transcode_status=Video.TranscodeStatus.PROCESSING)
+
+    final_name = f'{OUTPUT_DIR}/{video.pk}'
+    try:
+        final_dir = default_storage.path(final_name)
+        work_dir = f'{final_dir}.tmp-{uuid.uuid4().hex[:8]}'
+        os.makedirs(work_dir)
+        try:
+            outputs = _build_ladder(video, video.video_file.path, work_dir)
+            # Swap the finished directory into place
+            if os.path.isdir(final_dir):
+                shutil.rmtree(final_dir)
+            os.rename(work_dir, final_dir)
+        finally:
+            if os.path.isdir(work_dir):
+                shutil.rmtree(work_dir, ignore_errors=True)
+    except (TranscodeError, OSError, NotImplementedError, ValueError) as e:
+        logger.error("Transcoding of video %s failed: %s", video.pk, e)
+        video.set_fields(transcode_status=Video.TranscodeStatus.FAILED)
+        return None
+
+    renditions = [
+        VideoRendition(video=video, file=f'{final_name}/{rung.pop("relpath")}', **rung)
+        for rung in outputs['renditions']
+    ]
+    with transaction.atomic():
+        VideoRendition.objects.filter(video=video).delete()
+        VideoRendition.objects.bulk_create(renditions)
+        video.set_fields(
+            transcode_status=Video.TranscodeStatus.READY,
+            poster=f'{final_name}/poster.jpg',
+            hls_manifest=f'{final_name}/master.m3u8',
+        )
+    logger.info("Transcoded video %s into %d renditions", video.pk, len(renditions))
+    return renditions
+
+
+def ladder_for(source_height):
+    """Ladder rungs not taller than the source (at least the lowest rung)"""
+    ladder = sorted(transcoding_setting('LADDER'))
+    if not source_height:
+        return ladder
+    rungs = [rung for rung in ladder if rung[0] <= source_height]
+    return rungs or [(source_height - source_height % 2, *ladder[0][1:])]
+
+
+def _build_ladder(video, source, work_dir):
+    with open(source, 'rb') as fh:
+        info = video_probe.probe_file(fh, path=source)
+    duration = (info and info.duration) or video.duration or 0
+    source_height = (info and info.height) or video.height
+    segment = transcoding_setting('SEGMENT_SECONDS')
+
+    renditions, variants = [], []
+    for height, video_bitrate, audio_bitrate in ladder_for(source_height):
+        label = f'{height}p'
+        mp4_path = os.path.join(work_dir, f'{label}.mp4')
+        _ffmpeg([
+            '-i', source, '-map', '0:v:0', '-map', '0:a:0?',
+            '-vf', f'scale=-2:{height}',
+            '-c:v', 'libx264', '-preset', transcoding_setting('PRESET'), '-profile:v', 'main',
+            '-pix_fmt', 'yuv420p',
+            '-b:v', str(video_bitrate), '-maxrate', str(int(video_bitrate * 1.07)),
+            '-bufsize', str(int(video_bitrate * 1.5)),
+            # Keyframe on every segment boundary so the HLS remux can cut anywhere it needs
+            '-force_key_frames', f'expr:gte(t,n_forced*{segment})',
+            '-c:a', 'aac', '-b:a', str(audio_bitrate), '-ac', '2',
+            '-movflags', '+faststart', mp4_path,
+        ])
+        with open(mp4_path, 'rb') as fh:
+            encoded = video_probe.probe(fh) or video_probe.VideoInfo('mp4')
+        mp4_size = os.path.getsize(mp4_path)
+        bitrate = encoded.bitrate or video_bitrate + audio_bitrate
+        renditions.append({
+            'kind': 'mp4', 'label': label, 'width': encoded.width, 'height': encoded.height or height,
+            'bitrate': bitrate, 'file_size': mp4_size, 'relpath': f'{label}.mp4',
+        })
+
+        hls_dir = os.path.join(work_dir, label)
+        os.makedirs(hls_dir)
+        _ffmpeg([
+            '-i', mp4_path, '-c', 'copy', '-f', 'hls', '-hls_time', str(segment),
+            '-hls_playlist_type', 'vod',
+            '-hls_segment_filename', os.path.join(hls_dir, 'seg_%05d.ts'),
+            os.path.join(hls_dir, 'index.m3u8'),
+        ])
+        hls_size = sum(entry.stat().st_size for entry in os.scandir(hls_dir))
+        renditions.append({
+            'kind': 'hls', 'label': label, 'width': encoded.width, 'height': encoded.height or height,
+            'bitrate': bitrate, 'file_size': hls_size, 'relpath': f'{label}/index.m3u8',
+        })
+        # BANDWIDTH is the peak rate: the encoder's maxrate plus audio
+        peak = max(int(video_bitrate * 1.07) + audio_bitrate, bitrate)
+        variants.append((peak, bitrate, encoded.width, encoded.height or height, f'{label}/index.m3u8'))
+
+    with open(os.path.join(work_dir, 'master.m3u8'), 'w') as fh:
+        fh.write(master_playlist(variants))
+
+    _ffmpeg([
+        '-ss', f'{min(1.0, duration / 10):.3f}', '-i', source, '-frames:v', '1',
+        '-vf', "scale=-2:'min(720,ih)'", '-q:v', '3', os.path.join(work_dir, 'poster.jpg'),
+    ])
+    return {'renditions': renditions}
+
+
+def master_playlist(variants):
+    """HLS master playlist for [(peak bandwidth, average bandwidth, width, height, uri)]"""
+    lines = ['#EXTM3U', '#EXT-X-VERSION:3']
+    for bandwidth, average, width, height, uri in sorted(variants):
+        resolution = f',RESOLUTION={width}x{height}' if width and height else ''
+        lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},AVERAGE-BANDWIDTH={average}{resolution}')
+        lines.append(uri)
+    return '\n'.join(lines) + '\n'
+
+
+def _ffmpeg(args):
+    command = [ffmpeg_binary(), '-hide_banner', '-loglevel', 'error', '-nostdin', '-y', *args]
+    try:
+        result = subprocess.run(
+            command, capture_output=True, timeout=transcoding_setting('TIMEOUT'), check=False
+        )
+    except subprocess.TimeoutExpired:
+        raise TranscodeError(f"ffmpeg timed out after {transcoding_setting('TIMEOUT')}s")
+    if result.returncode != 0:
+        raise TranscodeError(result.stderr.decode(errors='replace').strip()[-2000:] or 'ffmpeg failed')
+
+
+def delete_renditions(video):
+    """Remove the rendition directory of a video (rows go with the cascade)"""
+    try:
+        path = default_storage.path(f'{OUTPUT_DIR}/{video.pk}')
+    except NotImplementedError:
+        return
+    shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,227 @@
+# users/uploads.py
+"""
+Resumable uploads, modelled on the tus protocol (https://tus.io/protocols/resumable-upload):
+
+    POST   api/uploads/          {target, filename, upload_length, metadata} -> 201, Location
+    HEAD   api/uploads/<id>/     -> Upload-Offset / Upload-Length
+    PATCH  api/uploads/<id>/     Content-Type: application/offset+octet-stream
+                                 Upload-Offset: <bytes received so far>
+                                 Upload-Checksum: sha256 <base64 digest>   (optional)
+                                 -> 204 with the new Upload-Offset, or 201 with the
+                                    created object once the last byte arrived
+    DELETE api/uploads/<id>/     -> 204, discards the upload
+
+Each chunk is streamed from the request body onto the end of a part file
+(UPLOAD_SESSIONS['DIRECTORY']), so a dropped connection only loses the
+chunk in flight and memory use is one block per request. Earlier chunks are
+never read again: when the last byte arrives the part file is handed to
+the target serializer as a disk-spooled upload, which FileSystemStorage
+moves into MEDIA_ROOT with a rename. The part directory should therefore
+be on the same filesystem as MEDIA_ROOT (the default is next to it).
+
+Checksums are per chunk (tus checksum extension). A chunk whose digest does
+not match is cut off again and answered with 460; the client resends it.
+"""
+import base64
+import binascii
+import hashlib
+import os
+import time
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.utils import timezone
+from django.utils.http import http_date
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, concurrent PATCHes are not detected
+    fcntl = None
+
+TUS_VERSION = '1.0.0'
+TUS_EXTENSIONS = 'creation,checksum,termination,expiration'
+CHECKSUM_ALGORITHMS = ('md5', 'sha1', 'sha256')
+CHUNK_CONTENT_TYPE = 'application/offset+octet-stream'
+BLOCK_SIZE = 256 * 1024
+
+UPLOAD_SESSIONS_DEFAULTS = {
+    'DIRECTORY': None,                  # None: upload_sessions/ next to MEDIA_ROOT
+    'MAX_SIZE': 500 * 1024 * 1024,      # bytes per upload
+    'MAX_CHUNK_SIZE': 32 * 1024 * 1024, # bytes per PATCH
+    'EXPIRY': 24 * 3600,                # seconds an unfinished upload is kept
+}
+
+
+def upload_setting(name):
+    return getattr(settings, 'UPLOAD_SESSIONS', {}).get(name, UPLOAD_SESSIONS_DEFAULTS[name])
+
+
+class UploadError(Exception):
+    pass
+
+
+class OffsetMismatch(UploadError):
+    def __init__(self, offset):
+        super().__init__(f"Upload-Offset does not match the {offset} bytes received")
+        self.offset = offset
+
+
+class ChecksumMismatch(UploadError):
+    pass
+
+
+class UploadBusy(UploadError):
+    pass
+
+
+def upload_directory():
+    directory = upload_setting('DIRECTORY')
+    if not directory:
+        directory = os.path.join(os.path.dirname(os.path.normpath(settings.MEDIA_ROOT)), 'upload_sessions')
+    return directory
+
+
+def expiry_time():
+    return timezone.now() + timezone.timedelta(seconds=upload_setting('EXPIRY'))
+
+
+def part_path(session):
+    return os.path.join(upload_directory(), f'{session.pk}.part')
+
+
+def create_part(session):
+    os.makedirs(upload_directory(), exist_ok=True)
+    with open(part_path(session), 'xb'):
+        pass
+
+
+def discard_part(session):
+    try:
+        os.remove(part_path(session))
+    except FileNotFoundError:
+        pass
+
+
+def parse_checksum(header):
+    """(algorithm, digest bytes) from an Upload-Checksum header, None if absent"""
+    if not header:
+        return None
+    algorithm, _, value = header.strip().partition(' ')
+    algorithm = algorithm.lower()
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        raise UploadError(f"Unsupported checksum algorithm; use one of {', '.join(CHECKSUM_ALGORITHMS)}")
+    try:
+        return algorithm, base64.b64decode(value.strip(), validate=True)
+    except (binascii.Error, ValueError):
+        raise UploadError("Upload-Checksum digest must be base64")
+
+
+def append_chunk(session, stream, offset, length, checksum=None):
+    """
+    Append up to `length` bytes from `stream` to the part file of `session`,
+    which must hold exactly `offset` bytes. Without a checksum a short body
+    (dropped connection) keeps what arrived; with one the whole chunk must
+    arrive and match. Returns the new offset.
+    """
+    with open(part_path(session), 'ab') as part:
+        if fcntl is not None:
+            try:
+                fcntl.flock(part.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise UploadBusy("Another chunk of this upload is being written")
+
+        # The database offset is only advanced after a write, so bytes past
+        # it are the remains of an interrupted request
+        size = os.fstat(part.fileno()).st_size
+        if size > session.offset:
+            part.truncate(session.offset)
+        elif size < session.offset:
+            session.set_fields(offset=size)
+        if offset != session.offset:
+            raise OffsetMismatch(session.offset)
+
+        digest = hashlib.new(checksum[0]) if checksum else None
+        written = 0
+        try:
+            while written < length:
+                block = stream.read(min(BLOCK_SIZE, length - written))
+                if not block:
+                    break
+                part.write(block)
+                if digest is not None:
+                    digest.update(block)
+                written += len(block)
+        except OSError:
+            # Client went away mid-chunk; keep what was received
+            pass
+        part.flush()
+
+        if digest is not None and (written != length or digest.digest() != checksum[1]):
+            part.truncate(offset)
+            raise ChecksumMismatch("Upload-Checksum does not match the chunk received")
+        if written:
+            # Active uploads do not expire
+            session.set_fields(offset=offset + written, expires_at=expiry_time())
+        return session.offset
+
+
+class AssembledUpload(UploadedFile):
+    """
+    The finished part file, presented like a disk-spooled upload: validators
+    read it from its path and FileSystemStorage moves it into place instead
+    of copying it.
+    """
+
+    def __init__(self, path, name, content_type, size):
+        super().__init__(open(path, 'rb'), name, content_type or None, size)
+        self.path = path
+
+    def temporary_file_path(self):
+        return self.path
+
+    def close(self):
+        try:
+            return self.file.close()
+        except FileNotFoundError:
+            # Already moved away by the storage
+            pass
+
+
+def assembled_upload(session):
+    return AssembledUpload(part_path(session), session.filename, session.content_type, session.upload_length)
+
+
+def upload_headers(session):
+    """tus response headers describing the state of `session`"""
+    headers = {
+        'Tus-Resumable': TUS_VERSION,
+        'Upload-Offset': str(session.offset),
+        'Upload-Length': str(session.upload_length),
+        'Cache-Control': 'no-store',
+    }
+    if session.expires_at:
+        headers['Upload-Expires'] = http_date(session.expires_at.timestamp())
+    return headers
+
+
+def purge_expired():
+    """Delete expired sessions and part files nobody has written to within EXPIRY"""
+    from .models import UploadSession
+
+    expired = UploadSession.objects.filter(expires_at__lte=timezone.now())
+    for session in expired.only('pk'):
+        discard_part(session)
+    count, _ = expired.delete()
+
+    cutoff = time.time() - upload_setting('EXPIRY')
+    try:
+        entries = list(os.scandir(upload_directory()))
+    except FileNotFoundError:
+        return count
+    for entry in entries:
+        if entry.name.endswith('.part') and entry.stat().st_mtime < cutoff:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+    return count
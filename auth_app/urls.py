@@ -1,5 +1,7 @@
+import re
+
 from django.urls import path
-from django.urls import path, include
+from django.urls import path, include, re_path
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
@@ -8,7 +10,6 @@ from rest_framework_simplejwt.views import (
 from . import views
 from .views import MessageViewSet
 from django.conf import settings
-from django.conf.urls.static import static
 
 router = DefaultRouter()
 from . import views
@@ -52,6 +53,7 @@ router.register(r'api/images', views.ImageViewSet, basename='image')
 
 # ======================= // LIBRARY  //========================
 router.register(r'api/documents', views.DocumentViewSet)
+router.register(r'api/uploads', views.UploadSessionViewSet, basename='upload')
 router.register(r'users', views.UserViewSet, basename='user')
 
 
@@ -85,14 +87,24 @@ urlpatterns = [
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('admin/users/', views.UserListView.as_view(), name='user_list'),
+    path('api/users/directory/', views.UserDirectoryView.as_view(), name='user-directory'),
+    path('api/users/bulk-status/', views.UserBulkStatusAPIView.as_view(), name='user-bulk-status'),
 
     # Messaging/Notification endpoints
     path('api/messages/unread-count/', views.UnreadMessageCountAPIView.as_view(), name='unread-message-count'),
     path('api/messages/mark-all-read/', views.MarkAllAsReadAPIView.as_view(), name='mark-all-read'),
+    path('api/messages/events/', views.MessageEventStreamView.as_view(), name='message-events'),
     path('dashboard/', views.DashboardAPIView.as_view(), name='dashboard'),
+    path('api/metrics/', views.MetricsAPIView.as_view(), name='api-metrics'),
+    path('api/media-resize/sign/', views.ResizeURLAPIView.as_view(), name='media-resize-sign'),
    
 
 
     path('', include(router.urls)),
 
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    # Media with byte-range support (replaces django.conf.urls.static.static, which
+    # ignores Range and only served files with DEBUG=True)
+    re_path(r'^%s(?P<path>.+)$' % re.escape(settings.MEDIA_URL.lstrip('/')), views.serve_media, name='media'),
+    # Resized pictures from the on-disk cache (auth_app/resizing.py)
+    re_path(r'^media-resize/(?P<width>\d+)x(?P<height>\d+)/(?P<path>.+)$', views.resize_media, name='media-resize'),
+]
@@ -0,0 +1,358 @@
+# users/video_probe.py
+"""
+Video metadata from container headers.
+
+probe(fileobj) reads duration, resolution, codec and bitrate straight from
+the container structures instead of starting ffmpeg:
+
+* MP4 / MOV: walks the top-level boxes (seeking over mdat, so a trailing
+  moov costs one seek) and parses moov -> mvhd / trak -> tkhd, hdlr, stsd;
+* WebM / Matroska: EBML header, then Segment -> Info and Tracks up to the
+  first Cluster;
+* AVI: RIFF hdrl -> avih, strh and strf of the first video stream.
+
+Only headers are read, so probing costs the same for a 5 MB and a 5 GB
+file. Unknown or damaged files return None; probe_file() then falls back to
+moviepy (which decodes through ffmpeg) when a filesystem path is available.
+"""
+import io
+import logging
+import struct
+
+logger = logging.getLogger(__name__)
+
+HEAD_BYTES = 256 * 1024          # Matroska/AVI headers are parsed from this much of the file
+MAX_MOOV_BYTES = 32 * 1024 * 1024
+
+MP4_CODECS = {
+    b'avc1': 'h264', b'avc3': 'h264', b'hvc1': 'hevc', b'hev1': 'hevc', b'mp4v': 'mpeg4',
+    b'vp08': 'vp8', b'vp09': 'vp9', b'av01': 'av1', b'jpeg': 'mjpeg', b's263': 'h263',
+    b'apcn': 'prores', b'apch': 'prores', b'apcs': 'prores', b'apco': 'prores', b'ap4h': 'prores',
+}
+MATROSKA_CODECS = {
+    'V_VP8': 'vp8', 'V_VP9': 'vp9', 'V_AV1': 'av1', 'V_MPEG4/ISO/AVC': 'h264',
+    'V_MPEGH/ISO/HEVC': 'hevc', 'V_MPEG4/ISO/ASP': 'mpeg4', 'V_THEORA': 'theora', 'V_MJPEG': 'mjpeg',
+}
+AVI_CODECS = {
+    'H264': 'h264', 'X264': 'h264', 'AVC1': 'h264', 'XVID': 'mpeg4', 'DIVX': 'mpeg4', 'DX50': 'mpeg4',
+    'FMP4': 'mpeg4', 'MJPG': 'mjpeg', 'HEVC': 'hevc', 'H265': 'hevc', 'VP80': 'vp8', 'VP90': 'vp9',
+}
+
+
+class VideoInfo:
+    __slots__ = ('container', 'duration', 'width', 'height', 'codec', 'bitrate')
+
+    def __init__(self, container, duration=None, width=None, height=None, codec='', bitrate=None):
+        self.container = container
+        self.duration = duration      # seconds
+        self.width = width
+        self.height = height
+        self.codec = codec
+        self.bitrate = bitrate        # bits per second, whole file
+
+    def as_fields(self):
+        """Values for the matching Video model fields"""
+        return {
+            'duration': self.duration, 'width': self.width, 'height': self.height,
+            'codec': self.codec or '', 'bitrate': self.bitrate,
+        }
+
+    def __repr__(self):
+        return (f'VideoInfo({self.container}, {self.duration}s, {self.width}x{self.height}, '
+                f'{self.codec or "?"}, {self.bitrate} bps)')
+
+
+def probe(fileobj, size=None):
+    """VideoInfo from the container headers of a seekable binary file, or None"""
+    if size is None:
+        fileobj.seek(0, io.SEEK_END)
+        size = fileobj.tell()
+    fileobj.seek(0)
+    head = fileobj.read(HEAD_BYTES)
+    try:
+        if head[4:8] in (b'ftyp', b'moov', b'mdat', b'free', b'wide', b'skip'):
+            info = _probe_mp4(fileobj, size)
+        elif head[:4] == b'\x1a\x45\xdf\xa3':
+            info = _probe_matroska(head)
+        elif head[:4] == b'RIFF' and head[8:12] == b'AVI ':
+            info = _probe_avi(head)
+        else:
+            return None
+    except (struct.error, ValueError, IndexError, UnicodeDecodeError) as e:
+        logger.debug("Header probe failed: %s", e)
+        return None
+    finally:
+        fileobj.seek(0)
+
+    if info is not None and info.bitrate is None and info.duration:
+        info.bitrate = int(size * 8 / info.duration)
+    return info
+
+
+def probe_with_moviepy(path, size=None):
+    """Fallback: open the file with moviepy/ffmpeg (slow; decodes the first frame)"""
+    from moviepy import VideoFileClip
+
+    with VideoFileClip(path, audio=False) as clip:
+        width, height = clip.size if clip.size else (None, None)
+        infos = getattr(clip.reader, 'infos', {}) or {}
+        bitrate = infos.get('video_bitrate')
+        info = VideoInfo(
+            'ffmpeg', duration=clip.duration, width=width, height=height,
+            codec=infos.get('video_codec_name', '') or '',
+            bitrate=int(bitrate * 1000) if bitrate else None,
+        )
+    if info.bitrate is None and info.duration and size:
+        info.bitrate = int(size * 8 / info.duration)
+    return info
+
+
+def probe_file(fileobj, size=None, path=None):
+    """
+    Header probe, falling back to moviepy when the headers give no duration
+    and a path is available. Returns a VideoInfo or None.
+    """
+    info = probe(fileobj, size)
+    if (info is None or not info.duration) and path:
+        try:
+            fallback = probe_with_moviepy(path, size)
+        except Exception as e:
+            logger.warning("Could not probe video %s: %s", path, e)
+        else:
+            if info is not None:
+                # Keep what the headers did provide
+                for name in ('width', 'height', 'codec'):
+                    setattr(fallback, name, getattr(info, name) or getattr(fallback, name))
+            info = fallback
+    return info
+
+
+# ============================ MP4 / MOV ============================
+_MP4_CONTAINERS = {b'trak', b'mdia', b'minf', b'stbl'}
+
+
+def _boxes(f, start, end):
+    """(type, payload start, box end) for the boxes between start and end"""
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        header = f.read(16)
+        if len(header) < 8:
+            return
+        size, kind = struct.unpack('>I4s', header[:8])
+        header_size = 8
+        if size == 1:
+            size = struct.unpack('>Q', header[8:16])[0]
+            header_size = 16
+        elif size == 0:
+            size = end - pos
+        if size < header_size:
+            return
+        yield kind, pos + header_size, min(pos + size, end)
+        pos += size
+
+
+def _probe_mp4(f, size):
+    container = 'mp4'
+    for kind, start, end in _boxes(f, 0, size):
+        if kind == b'ftyp':
+            f.seek(start)
+            if f.read(4) == b'qt  ':
+                container = 'mov'
+        elif kind == b'moov':
+            if end - start > MAX_MOOV_BYTES:
+                return None
+            f.seek(start)
+            return _parse_moov(io.BytesIO(f.read(end - start)), end - start, container)
+    return None
+
+
+def _parse_moov(moov, size, container):
+    info = VideoInfo(container)
+    for kind, start, end in _boxes(moov, 0, size):
+        moov.seek(start)
+        if kind == b'mvhd':
+            data = moov.read(end - start)
+            if data[0] == 1:
+                timescale, duration = struct.unpack('>IQ', data[20:32])
+            else:
+                timescale, duration = struct.unpack('>II', data[12:20])
+            if timescale:
+                info.duration = duration / timescale
+        elif kind == b'trak' and not info.codec:
+            track = _parse_track(moov, start, end)
+            if track is not None:
+                info.width, info.height, info.codec = track
+    return info
+
+
+def _parse_track(f, start, end):
+    """(width, height, codec) of a video track, None for other tracks"""
+    found = {}
+
+    def walk(start, end):
+        for kind, payload, box_end in _boxes(f, start, end):
+            if kind in _MP4_CONTAINERS:
+                walk(payload, box_end)
+                continue
+            f.seek(payload)
+            if kind == b'tkhd':
+                data = f.read(box_end - payload)
+                width, height = struct.unpack('>II', data[-8:])
+                found['size'] = (width >> 16, height >> 16)
+            elif kind == b'hdlr':
+                # mdia's handler comes first; QuickTime also has a data handler in minf
+                found.setdefault('handler', f.read(12)[8:12])
+            elif kind == b'stsd':
+                entry = f.read(8 + 36)[8:]
+                found['format'] = entry[4:8]
+                found['entry_size'] = struct.unpack('>HH', entry[32:36]) if len(entry) >= 36 else None
+
+    walk(start, end)
+    if found.get('handler') != b'vide':
+        return None
+    width, height = found.get('size') or (0, 0)
+    if not (width and height) and found.get('entry_size'):
+        width, height = found['entry_size']
+    fourcc = found.get('format', b'')
+    codec = MP4_CODECS.get(fourcc, fourcc.decode('latin-1').strip())
+    return width or None, height or None, codec
+
+
+# ============================ MATROSKA / WEBM ============================
+EBML_HEADER, DOC_TYPE = 0x1A45DFA3, 0x4282
+SEGMENT, CLUSTER = 0x18538067, 0x1F43B675
+INFO, TIMECODE_SCALE, DURATION = 0x1549A966, 0x2AD7B1, 0x4489
+TRACKS, TRACK_ENTRY, TRACK_TYPE, CODEC_ID = 0x1654AE6B, 0xAE, 0x83, 0x86
+VIDEO, PIXEL_WIDTH, PIXEL_HEIGHT = 0xE0, 0xB0, 0xBA
+
+
+def _vint(buf, pos, keep_marker=False):
+    """EBML variable-size integer -> (value, next position, unknown size)"""
+    first = buf[pos]
+    if not first:
+        raise ValueError("Invalid EBML vint")
+    length = 9 - first.bit_length()
+    value = first if keep_marker else first & ((1 << (8 - length)) - 1)
+    for byte in buf[pos + 1:pos + length]:
+        value = (value << 8) | byte
+    unknown = not keep_marker and value == (1 << (7 * length)) - 1
+    return value, pos + length, unknown
+
+
+def _elements(buf, start, end):
+    """(id, payload start, payload end) for the EBML elements in buf[start:end]"""
+    pos = start
+    while pos < end:
+        element_id, pos, _ = _vint(buf, pos, keep_marker=True)
+        size, pos, unknown = _vint(buf, pos)
+        payload_end = end if unknown else min(pos + size, end)
+        yield element_id, pos, payload_end
+        if element_id == CLUSTER:
+            return
+        pos = payload_end
+
+
+def _uint(buf, start, end):
+    return int.from_bytes(buf[start:end], 'big')
+
+
+def _probe_matroska(head):
+    doc_type = ''
+    info = None
+    for element_id, start, end in _elements(head, 0, len(head)):
+        if element_id == EBML_HEADER:
+            for child, cstart, cend in _elements(head, start, end):
+                if child == DOC_TYPE:
+                    doc_type = head[cstart:cend].decode('ascii').rstrip('\x00')
+        elif element_id == SEGMENT:
+            info = VideoInfo(doc_type or 'matroska')
+            _parse_segment(head, start, end, info)
+    return info
+
+
+def _parse_segment(buf, start, end, info):
+    scale, duration = 1000000, None
+    for element_id, cstart, cend in _elements(buf, start, end):
+        if element_id == INFO:
+            for child, s, e in _elements(buf, cstart, cend):
+                if child == TIMECODE_SCALE:
+                    scale = _uint(buf, s, e)
+                elif child == DURATION:
+                    duration = struct.unpack('>f' if e - s == 4 else '>d', buf[s:e])[0]
+        elif element_id == TRACKS:
+            for entry, s, e in _elements(buf, cstart, cend):
+                if entry == TRACK_ENTRY and not info.codec:
+                    _parse_track_entry(buf, s, e, info)
+    if duration:
+        info.duration = duration * scale / 1e9
+
+
+def _parse_track_entry(buf, start, end, info):
+    fields = {}
+    for child, s, e in _elements(buf, start, end):
+        if child == TRACK_TYPE:
+            fields['type'] = _uint(buf, s, e)
+        elif child == CODEC_ID:
+            fields['codec'] = buf[s:e].decode('ascii').rstrip('\x00')
+        elif child == VIDEO:
+            for video_child, vs, ve in _elements(buf, s, e):
+                if video_child == PIXEL_WIDTH:
+                    fields['width'] = _uint(buf, vs, ve)
+                elif video_child == PIXEL_HEIGHT:
+                    fields['height'] = _uint(buf, vs, ve)
+    if fields.get('type') == 1:
+        info.codec = MATROSKA_CODECS.get(fields.get('codec', ''), fields.get('codec', '').lower())
+        info.width, info.height = fields.get('width'), fields.get('height')
+
+
+# ============================ AVI ============================
+def _chunks(buf, start, end):
+    """(fourcc, list type or None, payload start, payload end) for RIFF chunks"""
+    pos = start
+    while pos + 8 <= end:
+        fourcc, size = struct.unpack('<4sI', buf[pos:pos + 8])
+        payload = pos + 8
+        if fourcc == b'LIST':
+            yield fourcc, buf[payload:payload + 4], payload + 4, min(payload + size, end)
+        else:
+            yield fourcc, None, payload, min(payload + size, end)
+        pos = payload + size + (size & 1)
+
+
+def _probe_avi(head):
+    info = VideoInfo('avi')
+    for fourcc, list_type, start, end in _chunks(head, 12, len(head)):
+        if list_type == b'hdrl':
+            _parse_avi_header(head, start, end, info)
+            return info
+    return None
+
+
+def _parse_avi_header(buf, start, end, info):
+    total_frames = us_per_frame = 0
+    for fourcc, list_type, s, e in _chunks(buf, start, end):
+        if fourcc == b'avih':
+            us_per_frame, _, _, _, total_frames = struct.unpack('<5I', buf[s:s + 20])
+            info.width, info.height = struct.unpack('<II', buf[s + 32:s + 40])
+        elif list_type == b'strl' and not info.codec:
+            stream = {}
+            for child, _, cs, ce in _chunks(buf, s, e):
+                if child == b'strh':
+                    stream['type'] = buf[cs:cs + 4]
+                    stream['handler'] = buf[cs + 4:cs + 8]
+                    stream['scale'], stream['rate'], _, stream['length'] = struct.unpack('<4I', buf[cs + 20:cs + 36])
+                elif child == b'strf':
+                    stream['compression'] = buf[cs + 16:cs + 20]
+            if stream.get('type') == b'vids':
+                fourcc_code = (stream.get('compression') or stream.get('handler') or b'').decode('latin-1').strip('\x00 ')
+                info.codec = AVI_CODECS.get(fourcc_code.upper(), fourcc_code.lower())
+                if stream.get('rate') and stream.get('length'):
+                    info.duration = stream['length'] * stream['scale'] / stream['rate']
+        elif list_type == b'odml':
+            for child, _, cs, ce in _chunks(buf, s, e):
+                if child == b'dmlh':
+                    # OpenDML (>1 GB) files: avih only counts the first RIFF chunk
+                    total_frames = max(total_frames, struct.unpack('<I', buf[cs:cs + 4])[0])
+    if not info.duration and total_frames and us_per_frame:
+        info.duration = total_frames * us_per_frame / 1e6
@@ -1,3 +1,4 @@
+import logging
 from rest_framework import status, generics, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -23,6 +24,9 @@ from django.conf import settings
 from .models import CustomUser
 from .serializers import UserRegistrationSerializer, EmailVerificationSerializer, UserSerializer
 from .utils import Util
+from .authentication import ClaimsRefreshToken
+
+logger = logging.getLogger(__name__)
 
 class UserRegistrationAPIView(APIView):
     authentication_classes = []  # disable auth completely
@@ -102,11 +106,12 @@ class UserLoginAPIView(APIView):
         serializer = UserLoginSerializer(data=request.data)
         if serializer.is_valid():
             user = serializer.validated_data['user']
-            login(request, user)
-            refresh = RefreshToken.for_user(user)
-            
-            # Get user role (you need to implement this method)
-            user_role = self.get_user_role(user)
+            # The Vue client only uses the JWT; in token-only mode skip the
+            # session row write and cookie rotation done by login().
+            if not getattr(settings, 'AUTH_TOKEN_ONLY_LOGIN', False):
+                login(request, user)
+            # Embed role/is_active so StatelessJWTAuthentication needs no user query
+            refresh = ClaimsRefreshToken.for_user(user)
             
             return Response({
                 'message': 'Login successful',
@@ -117,7 +122,7 @@ class UserLoginAPIView(APIView):
                     'last_name': user.last_name,
                     'is_active': user.is_active,
                     'date_joined': user.date_joined,
-                    'role': user_role,  # Add role here
+                    'role': serializer.validated_data['role'],
                 },
                 'tokens': {
                     'refresh': str(refresh),
@@ -126,22 +131,6 @@ class UserLoginAPIView(APIView):
             }, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    def get_user_role(self, user):
-        # Method 1: If using Django groups
-        if user.groups.filter(name='admin').exists():
-            return 'admin'
-        else:
-            return 'user'
-        
-        # OR Method 2: If you have a custom User model with role field
-        # return user.role
-        
-        # OR Method 3: If you have a UserProfile model
-        # try:
-        #     return user.profile.role
-        # except UserProfile.DoesNotExist:
-        #     return 'user'
-
 class UserLogoutAPIView(APIView):
     def post(self, request):
         logout(request)
@@ -166,6 +155,7 @@ from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from .serializers import PasswordResetRequestSerializer
+from .otp import issue_otp, otp_request_limited, otp_verify_limited, otp_setting
 import threading
 
 class EmailThread(threading.Thread):
@@ -189,7 +179,7 @@ class PasswordResetRequestAPIView(APIView):
             html_content = render_to_string('password_reset_otpl.html', {
                 'user_first_name': user.first_name,
                 'otp_code': otp,
-                'expiry_minutes': 100
+                'expiry_minutes': otp_setting('TTL') // 60
             })
             
             # Create plain text version
@@ -206,24 +196,32 @@ class PasswordResetRequestAPIView(APIView):
             EmailThread(email).start()
             return True
         except Exception as e:
-            print(f"Email sending error: {e}")
+            logger.exception("Password reset email failed: %s", e)
             return False
 
     def post(self, request):
-        print("API View is being called!")  # Debug
         serializer = PasswordResetRequestSerializer(data=request.data)
         
         if serializer.is_valid():
             email = serializer.validated_data['email']
+
+            if otp_request_limited(email, request.META.get('REMOTE_ADDR')):
+                return Response(
+                    {
+                        "success": False,
+                        "message": "Too many OTP requests. Please try again later."
+                    },
+                    status=status.HTTP_429_TOO_MANY_REQUESTS
+                )
             
             try:
                 from django.contrib.auth import get_user_model
                 CustomUser = get_user_model()
-                user = CustomUser.objects.get(email=email)
+                # Read-only lookup: the OTP itself is kept in the cache-backed store
+                user = CustomUser.objects.only('email', 'first_name').get(email=email)
                 
                 # Generate OTP
-                otp = user.generate_otp()
-                print(f"Generated OTP for {email}: {otp}")
+                otp = issue_otp(user.email)
                 
                 # Send OTP email with HTML template
                 email_sent = self.send_otp_email(user, otp)
@@ -280,7 +278,14 @@ class OTPVerificationAPIView(APIView):
     renderer_classes = [JSONRenderer]  # Force JSON response
 
     def post(self, request):
-        print("OTP Verification API called")  # Debug
+        if otp_verify_limited(request.META.get('REMOTE_ADDR')):
+            return Response(
+                {
+                    "success": False,
+                    "message": "Too many attempts. Please try again later."
+                },
+                status=status.HTTP_429_TOO_MANY_REQUESTS
+            )
         serializer = OTPVerificationSerializer(data=request.data)
         if serializer.is_valid():
             return Response(
@@ -323,16 +328,21 @@ class PasswordResetAPIView(APIView):
     renderer_classes = [JSONRenderer]
 
     def post(self, request):
-        print("=== PASSWORD RESET CONFIRMATION ===")
-        print("Request data:", request.data)
+        if otp_verify_limited(request.META.get('REMOTE_ADDR')):
+            return Response(
+                {
+                    "success": False,
+                    "message": "Too many attempts. Please try again later."
+                },
+                status=status.HTTP_429_TOO_MANY_REQUESTS
+            )
         
         serializer = PasswordResetSerializer(data=request.data)
         
         if serializer.is_valid():
-            print("Serializer is valid, saving...")
             try:
                 user = serializer.save()
-                print(f"Password reset successful for: {user.email}")
+                logger.info("Password reset for user %s", user.pk)
                 return Response(
                     {
                         "success": True, 
@@ -342,7 +352,7 @@ class PasswordResetAPIView(APIView):
                     status=status.HTTP_200_OK
                 )
             except Exception as e:
-                print(f"Error during save: {str(e)}")
+                logger.exception("Password reset failed")
                 return Response(
                     {
                         "success": False,
@@ -351,7 +361,6 @@ class PasswordResetAPIView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
         
-        print("Serializer errors:", serializer.errors)
         return Response(
             {
                 "success": False,
@@ -416,6 +425,21 @@ from rest_framework import status
 from django.shortcuts import get_object_or_404
 from .models import CustomUser
 from .serializers import UserListSerializer, UserDeactivateSerializer
+from datetime import datetime
+from django.db.models import Q, Value
+from django.db.models.functions import Lower
+from django.db.models.lookups import GreaterThanOrEqual, LessThan
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+from .pagination import ApproximateCountKeysetPagination
+from .permissions import IsAdmin
+import json
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from rest_framework.views import APIView
+from .authentication import clear_user_cache
+from .serializers import BulkStatusSerializer
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
@@ -428,6 +452,197 @@ def user_list(request):
         'results': serializer.data
     })
 
+USER_FILTER_FIELDS = ('role', 'is_active', 'joined_after', 'joined_before', 'q')
+USER_PREFIX_SEARCH_FIELDS = ('first_name', 'last_name', 'email', 'username')
+
+
+def _parse_moment(param, value):
+    try:
+        moment = parse_datetime(value)
+        day = parse_date(value) if moment is None else None
+    except ValueError:
+        # Well formed but out of range, e.g. 2024-02-30
+        moment = day = None
+    if moment is None:
+        if day is None:
+            raise ValidationError({param: "Use an ISO 8601 date or date/time."})
+        moment = datetime.combine(day, datetime.min.time())
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def _parse_flag(param, value):
+    """True/False for a true/false/1/0 parameter"""
+    value = str(value).lower()
+    if value not in ('true', 'false', '1', '0'):
+        raise ValidationError({param: "Use true or false."})
+    return value in ('true', '1')
+
+
+def _prefix_filter(term, fields):
+    """
+    lower(col) >= term AND lower(col) < next(term) for each field: a range
+    the lower(col) indexes can serve, unlike ILIKE 'term%'.
+    """
+    upper = term[:-1] + chr(ord(term[-1]) + 1)
+    condition = Q()
+    for field in fields:
+        expr = Lower(field)
+        condition |= Q(GreaterThanOrEqual(expr, Value(term)), LessThan(expr, Value(upper)))
+    return condition
+
+
+def filter_users(queryset, params):
+    """
+    Apply the directory filters (USER_FILTER_FIELDS) from query params or a
+    JSON filter object. Raises ValidationError on bad values.
+    """
+    role = params.get('role')
+    if role:
+        if role not in CustomUser.Role.values:
+            raise ValidationError({'role': f"Choose one of {', '.join(CustomUser.Role.values)}."})
+        queryset = queryset.filter(role=role)
+
+    is_active = params.get('is_active')
+    if is_active not in (None, ''):
+        queryset = queryset.filter(is_active=_parse_flag('is_active', is_active))
+
+    for param, lookup in (('joined_after', 'date_joined__gte'), ('joined_before', 'date_joined__lt')):
+        value = params.get(param)
+        if value:
+            queryset = queryset.filter(**{lookup: _parse_moment(param, value)})
+
+    term = str(params.get('q') or '').strip().lower()
+    if term:
+        queryset = queryset.filter(_prefix_filter(term, USER_PREFIX_SEARCH_FIELDS))
+    return queryset
+
+
+class UserDirectoryPagination(ApproximateCountKeysetPagination):
+    ordering = ('-date_joined', '-id')
+
+
+class UserDirectoryView(generics.ListAPIView):
+    """
+    Admin user directory.
+
+    Filters: role, is_active (true/false), joined_after / joined_before
+    (ISO date or date/time) and q, a case-insensitive prefix matched against
+    first name, last name, email and username. Results are keyset paginated
+    on (-date_joined, -id); the first page carries an approximate total.
+    """
+    serializer_class = UserListSerializer
+    permission_classes = [permissions.IsAuthenticated, IsAdmin]
+    pagination_class = UserDirectoryPagination
+
+    def get_queryset(self):
+        queryset = CustomUser.objects.only(
+            'id', 'username', 'email', 'first_name', 'last_name',
+            'role', 'is_staff', 'is_active', 'date_joined',
+        )
+        return filter_users(queryset, self.request.query_params)
+
+
+# ========bulk activation===============
+BULK_STATUS_BATCH_SIZE = 1000
+BULK_STATUS_STREAM_THRESHOLD = 5000
+
+
+def _pk_batches(queryset, batch_size):
+    """Successive (low, high] pk ranges of at most batch_size rows of queryset"""
+    low = 0
+    while True:
+        high = queryset.filter(pk__gt=low).order_by('pk').values_list('pk', flat=True)[batch_size - 1:batch_size]
+        high = next(iter(high), None)
+        yield low, high
+        if high is None:
+            return
+        low = high
+
+
+def bulk_set_active(queryset, is_active, batch_size=BULK_STATUS_BATCH_SIZE):
+    """
+    Set is_active on every row of queryset, one UPDATE per pk range, each in
+    its own transaction. Yields the number of rows changed by each batch.
+    The queryset's conditions (admin protection etc.) are part of every
+    UPDATE's WHERE clause, so they are enforced at write time.
+    """
+    queryset = queryset.exclude(is_active=is_active)
+    for low, high in _pk_batches(queryset, batch_size):
+        batch = queryset.filter(pk__gt=low)
+        if high is not None:
+            batch = batch.filter(pk__lte=high)
+        with transaction.atomic():
+            yield batch.update(is_active=is_active)
+
+
+def bulk_status_response(queryset, data, on_batch=None):
+    """
+    Run bulk_set_active for a validated BulkStatusSerializer payload.
+    Small jobs run in one transaction and return the counts. Large jobs (or
+    stream=true) return NDJSON, one progress line per committed batch.
+    """
+    is_active = data['is_active']
+    requested = len(data['ids']) if 'ids' in data else None
+    stream = data.get('stream') or (
+        requested if requested is not None
+        else queryset[:BULK_STATUS_STREAM_THRESHOLD + 1].count()
+    ) > BULK_STATUS_STREAM_THRESHOLD
+
+    def result(updated):
+        body = {'is_active': is_active, 'updated': updated}
+        if requested is not None:
+            # protected, missing or already in the requested state
+            body['skipped'] = requested - updated
+        return body
+
+    if not stream:
+        with transaction.atomic():
+            updated = 0
+            for count in bulk_set_active(queryset, is_active):
+                updated += count
+                if on_batch:
+                    on_batch()
+        return Response(result(updated))
+
+    def progress():
+        updated = 0
+        for batch, count in enumerate(bulk_set_active(queryset, is_active), start=1):
+            updated += count
+            if on_batch:
+                on_batch()
+            yield json.dumps({'batch': batch, 'updated': count, 'total_updated': updated}) + '\n'
+        yield json.dumps({'done': True, **result(updated)}) + '\n'
+
+    return StreamingHttpResponse(progress(), content_type='application/x-ndjson')
+
+
+class UserBulkStatusAPIView(APIView):
+    """
+    POST {"ids": [...]} or {"filter": {...directory filters...}} with
+    "is_active": true/false. Admin accounts and the requesting admin are
+    never deactivated.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsAdmin]
+
+    def post(self, request):
+        serializer = BulkStatusSerializer(data=request.data, context={'filter_fields': USER_FILTER_FIELDS})
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        queryset = CustomUser.objects.all()
+        if 'ids' in data:
+            queryset = queryset.filter(pk__in=data['ids'])
+        else:
+            queryset = filter_users(queryset, data['filter'])
+        if not data['is_active']:
+            queryset = queryset.exclude(role=CustomUser.Role.ADMIN).exclude(pk=request.user.pk)
+
+        # Updates bypass save(), so drop the cached rows used by StatelessJWTAuthentication
+        return bulk_status_response(queryset, data, on_batch=clear_user_cache)
+
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def deactivate_user(request):
@@ -453,8 +668,7 @@ def deactivate_user(request):
                 }, status=status.HTTP_400_BAD_REQUEST)
             
             # Deactivate the user
-            user.is_active = False
-            user.save()
+            user.set_fields(is_active=False)
             
             return Response({
                 'message': f'User {user.username} has been deactivated successfully.',
@@ -481,8 +695,7 @@ def activate_user(request):
             user = CustomUser.objects.get(id=user_id)
             
             # Activate the user
-            user.is_active = True
-            user.save()
+            user.set_fields(is_active=True)
             
             return Response({
                 'message': f'User {user.username} has been activated successfully.',
@@ -580,7 +793,7 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
         
         # Handle profile data update
         profile_serializer = UserProfileSerializer(
-            user.profile,
+            user.get_profile(),
             data=request.data,
             partial=True,
             context={'request': request}
@@ -612,7 +825,7 @@ class ProfileUpdateView(generics.UpdateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        return self.request.user.profile
+        return self.request.user.get_profile()
 
     def update(self, request, *args, **kwargs):
         response = super().update(request, *args, **kwargs)
@@ -657,7 +870,7 @@ def current_user_data(request):
     """
     user_id = request.query_params.get('user_id')
 
-    if user_id and request.user.is_admin():
+    if user_id and request.user.is_admin:
         # Admin can view any user's data
         user = get_object_or_404(CustomUser, id=user_id)
     else:
@@ -686,8 +899,14 @@ from rest_framework import viewsets, permissions
 from django.core.mail import send_mass_mail
 from django.contrib.auth import get_user_model
 from .models import Message
-from .serializers import MessageSerializer
-class MessageViewSet(viewsets.ModelViewSet):
+from .serializers import MessageSerializer, MessageThreadSerializer
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .middleware import SerializerTimingMixin
+from .pagination import KeysetPagination
+class MessageViewSet(SerializerTimingMixin, viewsets.ModelViewSet):
     queryset = Message.objects.all().order_by('-created_at')
     serializer_class = MessageSerializer
     permission_classes = [permissions.AllowAny]  # Allow public access
@@ -707,35 +926,192 @@ class MessageViewSet(viewsets.ModelViewSet):
             recipient_list,
         ),), fail_silently=False)
 
+    def _filter_period(self, queryset, request):
+        """Optional ?since= / ?before= (ISO 8601) bounds on created_at"""
+        for param, lookup in (('since', 'created_at__gte'), ('before', 'created_at__lt')):
+            value = request.query_params.get(param)
+            if not value:
+                continue
+            try:
+                parsed = parse_datetime(value)
+            except ValueError:
+                # Well formed but out of range, e.g. 2024-02-30T10:00
+                parsed = None
+            if parsed is None:
+                raise ValidationError({param: "Use an ISO 8601 date/time."})
+            if timezone.is_naive(parsed):
+                parsed = timezone.make_aware(parsed)
+            queryset = queryset.filter(**{lookup: parsed})
+        return queryset
+
+    @action(detail=False, methods=['get'])
+    def inbox(self, request):
+        """Newest first, cursor paginated on (created_at, id)"""
+        paginator = KeysetPagination(ordering=('-created_at', '-id'))
+        queryset = self._filter_period(Message.objects.all(), request)
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        return paginator.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def sync(self, request):
+        """
+        Incremental sync: messages created after ?cursor=, oldest first.
+        Store the returned cursor and pass it on the next call; repeat while
+        has_more is true. Without a cursor it starts from the first message.
+        """
+        paginator = KeysetPagination(ordering=('created_at', 'id'))
+        queryset = self._filter_period(Message.objects.all(), request)
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        return paginator.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    @action(detail=True, methods=['get'])
+    def thread(self, request, pk=None):
+        """Message pk with its whole reply tree, loaded in a single query"""
+        try:
+            root = Message.get_thread(int(pk))
+        except (TypeError, ValueError):
+            root = None
+        if root is None:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(MessageThreadSerializer(root, context={'request': request}).data)
+
 
 
 # ##################   FETCH Parent Messages with Replies  #####################
+from django.db import transaction
+from .models import MessageCounter
+
 class UnreadMessageCountAPIView(APIView):
     permission_classes = [AllowAny] 
     def get(self, request):
-        unread_count = Message.objects.filter(is_read=False).count()
+        # Maintained counter row, no COUNT(*) over Message per poll
+        unread_count = MessageCounter.get_value(MessageCounter.UNREAD)
         return Response({
             "new_messages_count": unread_count
         })
 
 
 class MarkAllAsReadAPIView(APIView):
-     permission_classes = [AllowAny] 
-def post(self, request):
-        Message.objects.filter(is_read=False).update(is_read=True)
+    permission_classes = [AllowAny] 
+    def post(self, request):
+        # Same transaction so the badge never shows messages that are already read
+        with transaction.atomic():
+            updated = Message.objects.filter(is_read=False).update(is_read=True)
+            MessageCounter.adjust(MessageCounter.UNREAD, -updated)
         return Response({"message": "All messages marked as read."})
 
+
+# ##################   MESSAGE EVENT STREAM (SSE)  #####################
+import asyncio
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.views import View
+from . import events
+
+
+def _message_snapshot(after_id=None, limit=50):
+    """Unread count, newest message id and messages newer than after_id"""
+    count = MessageCounter.get_value(MessageCounter.UNREAD)
+    latest_id = Message.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    new_messages = []
+    if after_id is not None and latest_id > after_id:
+        new_messages = MessageSerializer(
+            Message.objects.filter(id__gt=after_id).order_by('id')[:limit], many=True
+        ).data
+    return count, latest_id, new_messages
+
+
+class MessageEventStreamView(View):
+    """
+    Server-sent events replacing the unread-count / message list polling.
+
+    Streams `message.created` and `unread.count` events from the in-process
+    broker (events.py), replays missed events after a reconnect with
+    Last-Event-ID, and checks the database every DB_POLL_INTERVAL seconds for
+    changes made by other worker processes.
+
+    Needs the ASGI entry point (py_vue/asgi.py). Under WSGI a long-lived
+    response would pin a worker thread, so it answers with a single snapshot
+    and lets EventSource reconnect after the poll interval.
+    """
+
+    async def get(self, request):
+        try:
+            last_event_id = int(request.headers.get('Last-Event-ID') or request.GET['last_event_id'])
+        except (KeyError, TypeError, ValueError):
+            last_event_id = None
+
+        if isinstance(request, ASGIRequest):
+            stream = self._stream(last_event_id)
+        else:
+            stream = self._snapshot()
+
+        response = StreamingHttpResponse(stream, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # disable nginx proxy buffering
+        return response
+
+    def _snapshot(self):
+        count, _, _ = _message_snapshot()
+        retry = (events.events_setting('DB_POLL_INTERVAL') or 0) * 1000 or events.events_setting('RETRY')
+        yield f"retry: {retry}\n\n"
+        yield events.Event(None, events.UNREAD_COUNT, {'new_messages_count': count}).encode()
+
+    async def _stream(self, last_event_id):
+        entry, resumed = events.broker.subscribe(last_event_id)
+        queue = entry[1]
+        loop = asyncio.get_running_loop()
+        keepalive = events.events_setting('KEEPALIVE')
+        poll_interval = events.events_setting('DB_POLL_INTERVAL')
+        try:
+            yield f"retry: {events.events_setting('RETRY')}\n\n"
+
+            count, latest_id, _ = await sync_to_async(_message_snapshot)()
+            if not resumed:
+                yield events.Event(None, events.UNREAD_COUNT, {'new_messages_count': count}).encode()
+
+            next_poll = loop.time() + poll_interval if poll_interval else None
+            while True:
+                timeout = keepalive
+                if next_poll is not None:
+                    timeout = max(0, min(timeout, next_poll - loop.time()))
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    event = None
+
+                if event is not None:
+                    if event.name == events.MESSAGE_CREATED:
+                        latest_id = max(latest_id, event.data['id'])
+                    elif event.name == events.UNREAD_COUNT:
+                        count = event.data['new_messages_count']
+                    yield event.encode()
+                elif next_poll is not None and loop.time() >= next_poll:
+                    # Fallback for writes made by other processes
+                    new_count, new_latest_id, new_messages = await sync_to_async(_message_snapshot)(latest_id)
+                    for message in new_messages:
+                        yield events.Event(None, events.MESSAGE_CREATED, message).encode()
+                    if new_count != count:
+                        yield events.Event(None, events.UNREAD_COUNT, {'new_messages_count': new_count}).encode()
+                    count, latest_id = new_count, max(latest_id, new_latest_id)
+                    next_poll = loop.time() + poll_interval
+                else:
+                    yield ": keepalive\n\n"
+        finally:
+            events.broker.unsubscribe(entry)
+
 # ###################################     DISTRICT  OF UDOM    #####################################
 
 # views.py
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Count, Sum
+from django.db.models import Count, Prefetch, Sum
 from .models import District, Collage
 from .serializers import DistrictSerializer, CollageSerializer
 
-class DistrictViewSet(viewsets.ModelViewSet):
+class DistrictViewSet(SerializerTimingMixin, viewsets.ModelViewSet):
     queryset = District.objects.all().order_by('name')
     serializer_class = DistrictSerializer
     
@@ -746,7 +1122,10 @@ class DistrictViewSet(viewsets.ModelViewSet):
             collages_count=Count('collages'),
             calculated_total_members=Sum('collages__total_members')
         )
-        return queryset
+        # Nested collages (and their district_name) in one query for the whole page
+        return queryset.prefetch_related(
+            Prefetch('collages', queryset=Collage.objects.select_related('district'))
+        )
     
     def perform_create(self, serializer):
         instance = serializer.save()
@@ -774,8 +1153,8 @@ from django_filters.rest_framework import DjangoFilterBackend
 from .models import Members
 from .serializers import MembersSerializer, MembersCreateSerializer
 
-class MembersViewSet(viewsets.ModelViewSet):
-    queryset = Members.objects.all().select_related('user')
+class MembersViewSet(SerializerTimingMixin, viewsets.ModelViewSet):
+    queryset = Members.objects.all().select_related('user', 'user__profile')
     permission_classes = [permissions.AllowAny]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['is_active']
@@ -822,17 +1201,57 @@ class MembersViewSet(viewsets.ModelViewSet):
     def activate(self, request, pk=None):
         """Activate a member"""
         member = self.get_object()
-        member.is_active = True
-        member.save()
+        member.set_fields(is_active=True)
         return Response({"status": "member activated"})
     
     @action(detail=True, methods=['post'])
     def deactivate(self, request, pk=None):
         """Deactivate a member"""
         member = self.get_object()
-        member.is_active = False
-        member.save()
+        member.set_fields(is_active=False)
         return Response({"status": "member deactivated"})
+
+    @action(detail=False, methods=['post'], url_path='bulk-status',
+            permission_classes=[permissions.IsAuthenticated, IsAdmin])
+    def bulk_status(self, request):
+        """
+        Activate/deactivate many members: {"ids": [...]} or
+        {"filter": {"role", "is_active", "joined_after", "joined_before"}}
+        plus "is_active". Admin members and the caller's own membership are
+        never deactivated.
+        """
+        serializer = BulkStatusSerializer(
+            data=request.data,
+            context={'filter_fields': ('role', 'is_active', 'joined_after', 'joined_before')},
+        )
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        queryset = Members.objects.all()
+        if 'ids' in data:
+            queryset = queryset.filter(pk__in=data['ids'])
+        else:
+            filters = data['filter']
+            role = filters.get('role')
+            if role:
+                if role not in Members.Role.values:
+                    raise ValidationError({'role': f"Choose one of {', '.join(Members.Role.values)}."})
+                queryset = queryset.filter(role=role)
+            if filters.get('is_active') not in (None, ''):
+                queryset = queryset.filter(is_active=_parse_flag('is_active', filters['is_active']))
+            for param, lookup in (('joined_after', 'date_joined__gte'), ('joined_before', 'date_joined__lt')):
+                if filters.get(param):
+                    try:
+                        day = parse_date(str(filters[param]))
+                    except ValueError:
+                        day = None
+                    if day is None:
+                        raise ValidationError({param: "Use an ISO 8601 date."})
+                    queryset = queryset.filter(**{lookup: day})
+        if not data['is_active']:
+            queryset = queryset.exclude(role=Members.Role.ADMIN).exclude(user_id=request.user.pk)
+
+        return bulk_status_response(queryset, data)
     
 
 # ############################ CHARITY VIEWS #############################
@@ -851,7 +1270,7 @@ from datetime import datetime
 from .models import CharityPerformance
 from .serializers import CharityPerformanceSerializer
 
-class CharityPerformanceViewSet(viewsets.ModelViewSet):
+class CharityPerformanceViewSet(SerializerTimingMixin, viewsets.ModelViewSet):
     queryset = CharityPerformance.objects.all().order_by('period_date')
     serializer_class = CharityPerformanceSerializer
 
@@ -970,12 +1389,12 @@ class CharityPerformanceViewSet(viewsets.ModelViewSet):
 
 
 # ################################ COLLAGE #########################
-class CollageViewSet(viewsets.ModelViewSet):
+class CollageViewSet(SerializerTimingMixin, viewsets.ModelViewSet):
     queryset = Collage.objects.all()
     serializer_class = CollageSerializer
     
     def get_queryset(self):
-        queryset = Collage.objects.all()
+        queryset = Collage.objects.select_related('district')
         district_id = self.request.query_params.get('district_id')
         
         if district_id:
@@ -1013,7 +1432,7 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
 
-class CollageMembersViewSet(viewsets.ModelViewSet):
+class CollageMembersViewSet(SerializerTimingMixin, viewsets.ModelViewSet):
     """
     Simple ViewSet for CollageMembers that accepts any JSON data
     No authentication required, all fields optional
@@ -1120,7 +1539,7 @@ from rest_framework.response import Response
 from django.db import transaction
 from .models import CustomUser
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(SerializerTimingMixin, viewsets.ModelViewSet):
     queryset = CustomUser.objects.all()
     permission_classes = [permissions.AllowAny]
     
@@ -1198,7 +1617,9 @@ class UserViewSet(viewsets.ModelViewSet):
 
 
 # ======================================== CALENDARS AND TIMETABLES VIEW =================================================
-class CollageCalendarViewSet(viewsets.ModelViewSet):
+from .downloads import DownloadMixin
+
+class CollageCalendarViewSet(SerializerTimingMixin, DownloadMixin, viewsets.ModelViewSet):
     queryset = CollageCalendar.objects.all()
     permission_classes = [permissions.AllowAny]
     filter_backends = [DjangoFilterBackend]
@@ -1213,15 +1634,15 @@ class CollageCalendarViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def download(self, request, pk=None):
         """Download the calendar document"""
-        calendar = self.get_object()
-        if calendar.document:
-            response = FileResponse(calendar.document.open(), as_attachment=True)
-            response['Content-Disposition'] = f'attachment; filename="{calendar.document.name}"'
-            return response
-        return Response({'error': 'Document not found'}, status=404)
+        return self.download_response(request, self.get_object())
+
+    @action(detail=False, methods=['get'])
+    def bundle(self, request):
+        """The documents of the filtered calendars as one ZIP archive"""
+        return self.bundle_response(request)
 
 
-class DistrictCalendarViewSet(viewsets.ModelViewSet):
+class DistrictCalendarViewSet(SerializerTimingMixin, DownloadMixin, viewsets.ModelViewSet):
     queryset = DistrictCalendar.objects.all()
     permission_classes = [permissions.AllowAny]
     filter_backends = [DjangoFilterBackend]
@@ -1236,15 +1657,15 @@ class DistrictCalendarViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def download(self, request, pk=None):
         """Download the calendar document"""
-        calendar = self.get_object()
-        if calendar.document:
-            response = FileResponse(calendar.document.open(), as_attachment=True)
-            response['Content-Disposition'] = f'attachment; filename="{calendar.document.name}"'
-            return response
-        return Response({'error': 'Document not found'}, status=404)
+        return self.download_response(request, self.get_object())
+
+    @action(detail=False, methods=['get'])
+    def bundle(self, request):
+        """The documents of the filtered calendars as one ZIP archive"""
+        return self.bundle_response(request)
 
 # views.py
-class CollageTimetableViewSet(viewsets.ModelViewSet):
+class CollageTimetableViewSet(SerializerTimingMixin, DownloadMixin, viewsets.ModelViewSet):
     queryset = CollageTimetable.objects.all()
     permission_classes = [permissions.AllowAny]
     filter_backends = [DjangoFilterBackend]
@@ -1273,14 +1694,14 @@ class CollageTimetableViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def download(self, request, pk=None):
         """Download the timetable document"""
-        timetable = self.get_object()
-        if timetable.document:
-            response = FileResponse(timetable.document.open(), as_attachment=True)
-            response['Content-Disposition'] = f'attachment; filename="{timetable.document.name}"'
-            return response
-        return Response({'error': 'Document not found'}, status=404)
+        return self.download_response(request, self.get_object())
 
-class DistrictTimetableViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def bundle(self, request):
+        """The documents of the filtered timetables as one ZIP archive"""
+        return self.bundle_response(request)
+
+class DistrictTimetableViewSet(SerializerTimingMixin, DownloadMixin, viewsets.ModelViewSet):
     queryset = DistrictTimetable.objects.all()
     permission_classes = [permissions.AllowAny]
     filter_backends = [DjangoFilterBackend]
@@ -1295,12 +1716,12 @@ class DistrictTimetableViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def download(self, request, pk=None):
         """Download the timetable document"""
-        timetable = self.get_object()
-        if timetable.document:
-            response = FileResponse(timetable.document.open(), as_attachment=True)
-            response['Content-Disposition'] = f'attachment; filename="{timetable.document.name}"'
-            return response
-        return Response({'error': 'Document not found'}, status=404)
+        return self.download_response(request, self.get_object())
+
+    @action(detail=False, methods=['get'])
+    def bundle(self, request):
+        """The documents of the filtered timetables as one ZIP archive"""
+        return self.bundle_response(request)
 
 
 
@@ -1309,7 +1730,7 @@ class DistrictTimetableViewSet(viewsets.ModelViewSet):
 from .models import Writings
 from .serializers import WritingsSerializer, WritingsCreateSerializer
 
-class WritingsViewSet(viewsets.ModelViewSet):
+class WritingsViewSet(SerializerTimingMixin, DownloadMixin, viewsets.ModelViewSet):
     """
     ViewSet for Writings with document upload/download functionality
     """
@@ -1345,28 +1766,7 @@ class WritingsViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def download(self, request, pk=None):
         """Download the writing document"""
-        writing = self.get_object()
-        if writing.document:
-            try:
-                # Get the filename using your model property
-                filename = writing.filename
-                if not filename:
-                    filename = os.path.basename(writing.document.name)
-                
-                response = FileResponse(
-                    writing.document.open('rb'),
-                    as_attachment=True,
-                    filename=filename
-                )
-                response['Content-Type'] = 'application/octet-stream'
-                response['Content-Disposition'] = f'attachment; filename="{filename}"'
-                return response
-            except Exception as e:
-                return Response(
-                    {'error': f'Error downloading file: {str(e)}'}, 
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
-        return Response({'error': 'Document not found'}, status=status.HTTP_404_NOT_FOUND)
+        return self.download_response(request, self.get_object())
     
     @action(detail=False, methods=['get'])
     def download_by_id(self, request):
@@ -1375,8 +1775,13 @@ class WritingsViewSet(viewsets.ModelViewSet):
         if not writing_id:
             return Response({'error': 'ID parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
         
-        writing = get_object_or_404(Writings, id=writing_id)
-        return self.download(request, pk=writing.id)
+        writing = get_object_or_404(self.get_queryset(), id=writing_id)
+        return self.download_response(request, writing)
+
+    @action(detail=False, methods=['get'])
+    def bundle(self, request):
+        """The documents of the filtered writings as one ZIP archive"""
+        return self.bundle_response(request)
     
     @action(detail=False, methods=['get'])
     def recent_writings(self, request):
@@ -1429,7 +1834,7 @@ import os
 from .models import Ministry, MinistryInfos
 from .serializers import MinistrySerializer, MinistryInfosSerializer
 
-class MinistryViewSet(viewsets.ModelViewSet):
+class MinistryViewSet(SerializerTimingMixin, viewsets.ModelViewSet):
     queryset = Ministry.objects.all()
     serializer_class = MinistrySerializer
     
@@ -1455,9 +1860,11 @@ class MinistryViewSet(viewsets.ModelViewSet):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class MinistryInfosViewSet(viewsets.ModelViewSet):
+class MinistryInfosViewSet(SerializerTimingMixin, DownloadMixin, viewsets.ModelViewSet):
     queryset = MinistryInfos.objects.all()
     serializer_class = MinistryInfosSerializer
+    download_field = 'pdf_report'
+    download_error = 'No PDF report available for this ministry'
     
     def get_queryset(self):
         """Optionally filter by ministry name"""
@@ -1470,34 +1877,7 @@ class MinistryInfosViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'])
     def download_report(self, request, pk=None):
         """Download the PDF report for a ministry info"""
-        ministry_info = self.get_object()
-        
-        if not ministry_info.pdf_report:
-            return Response(
-                {'error': 'No PDF report available for this ministry'},
-                status=status.HTTP_404_NOT_FOUND
-            )
-        
-        try:
-            # Get the file path
-            file_path = ministry_info.pdf_report.path
-            file_name = os.path.basename(file_path)
-            
-            # Open the file and create response
-            response = FileResponse(
-                open(file_path, 'rb'),
-                content_type='application/pdf'
-            )
-            response['Content-Disposition'] = f'attachment; filename="{file_name}"'
-            response['Content-Length'] = ministry_info.pdf_report.size
-            
-            return response
-            
-        except Exception as e:
-            return Response(
-                {'error': f'Error downloading file: {str(e)}'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+        return self.download_response(request, self.get_object())
     
     @action(detail=False, methods=['get'])
     def download_all_reports(self, request):
@@ -1515,6 +1895,11 @@ class MinistryInfosViewSet(viewsets.ModelViewSet):
                 
         return Response(data)
 
+    @action(detail=False, methods=['get'])
+    def bundle(self, request):
+        """The PDF reports of the (filtered) ministry infos as one ZIP archive"""
+        return self.bundle_response(request)
+
 
 
 
@@ -1527,7 +1912,7 @@ from rest_framework.response import Response
 from .models import CalendarEvent
 from .serializers import CalendarEventSerializer
 
-class CalendarEventViewSet(viewsets.ModelViewSet):
+class CalendarEventViewSet(SerializerTimingMixin, viewsets.ModelViewSet):
     serializer_class = CalendarEventSerializer
     queryset = CalendarEvent.objects.all()
     
@@ -1542,8 +1927,7 @@ class CalendarEventViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        event.is_done = new_status
-        event.save()
+        event.set_fields(is_done=new_status)
         
         serializer = self.get_serializer(event)
         return Response(serializer.data)
@@ -1553,19 +1937,18 @@ class CalendarEventViewSet(viewsets.ModelViewSet):
 from django.db import models  # This fixes the undefined variable error
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from moviepy import VideoFileClip
-import os
-from django.conf import settings
+from . import video_probe
+from django.db.models import Case, Value, When
 from .models import Video
 from .serializers import VideoSerializer
 from rest_framework import viewsets  # Make sure this is also imported
 
-class VideoViewSet(viewsets.ModelViewSet):
+class VideoViewSet(SerializerTimingMixin, viewsets.ModelViewSet):
     serializer_class = VideoSerializer
     queryset = Video.objects.all()
     
     def get_queryset(self):
-        queryset = Video.objects.all()
+        queryset = Video.objects.prefetch_related('renditions')
         status_filter = self.request.query_params.get('status', None)
         if status_filter:
             queryset = queryset.filter(status=status_filter)
@@ -1573,31 +1956,31 @@ class VideoViewSet(viewsets.ModelViewSet):
     
     def perform_create(self, serializer):
         video_file = serializer.validated_data['video_file']
-        
-        # Save the instance first to get the file path
-        instance = serializer.save()
-        
-        try:
-            # Calculate duration using moviepy
-            video_path = os.path.join(settings.MEDIA_ROOT, instance.video_file.name)
-            with VideoFileClip(video_path) as video:
-                instance.duration = video.duration
-            
-            # Get file size
-            instance.file_size = video_file.size
-            
-            instance.save()
-        except Exception as e:
-            # If duration calculation fails, still save the video
-            print(f"Error calculating video duration: {e}")
-            instance.file_size = video_file.size
-            instance.save()
+        # Metadata comes from the container headers of the upload itself, so
+        # the row is written once. Large uploads are spooled to disk by Django
+        # and can use the moviepy fallback from that temporary path.
+        temporary_path = getattr(video_file, 'temporary_file_path', lambda: None)()
+        info = video_probe.probe_file(video_file, size=video_file.size, path=temporary_path)
+        metadata = info.as_fields() if info is not None else {}
+        instance = serializer.save(file_size=video_file.size, **metadata)
+
+        if info is None or not info.duration:
+            # In-memory upload the headers could not describe: fall back to
+            # moviepy on the stored file, then update only those columns
+            try:
+                info = video_probe.probe_with_moviepy(instance.video_file.path, video_file.size)
+            except Exception as e:
+                logger.warning("Could not read metadata of video %s: %s", instance.pk, e)
+            else:
+                instance.set_fields(**info.as_fields())
     
     @action(detail=True, methods=['post'])
     def toggle_status(self, request, pk=None):
         video = self.get_object()
-        video.status = 'active' if video.status == 'inactive' else 'inactive'
-        video.save()
+        # Flipped by the database, so concurrent toggles cannot overwrite each other
+        video.set_fields(status=Case(
+            When(status='inactive', then=Value('active')), default=Value('inactive')
+        ))
         serializer = self.get_serializer(video)
         return Response(serializer.data)
     
@@ -1628,7 +2011,7 @@ from .models import Image
 from .serializers import ImageSerializer
 import os
 
-class ImageViewSet(viewsets.ModelViewSet):
+class ImageViewSet(SerializerTimingMixin, viewsets.ModelViewSet):
     serializer_class = ImageSerializer
     permission_classes = [AllowAny]  # Make API public
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
@@ -1655,8 +2038,9 @@ class ImageViewSet(viewsets.ModelViewSet):
     def toggle_status(self, request, pk=None):
         """Toggle image status between active and inactive"""
         image = self.get_object()
-        image.status = 'active' if image.status == 'inactive' else 'inactive'
-        image.save()
+        image.set_fields(status=Case(
+            When(status='inactive', then=Value('active')), default=Value('inactive')
+        ))
         serializer = self.get_serializer(image)
         return Response(serializer.data)
     
@@ -1709,7 +2093,7 @@ from .serializers import (
 )
 
 # ==================== REVENUE SOURCE CRUD ====================
-class RevenueSourceViewSet(viewsets.ModelViewSet):
+class RevenueSourceViewSet(SerializerTimingMixin, viewsets.ModelViewSet):
     """
     CRUD operations for Revenue Sources
     """
@@ -1722,7 +2106,7 @@ class RevenueSourceViewSet(viewsets.ModelViewSet):
     ordering = ['name']
 
 # ==================== EXPENSE CATEGORY CRUD ====================
-class ExpenseCategoryViewSet(viewsets.ModelViewSet):
+class ExpenseCategoryViewSet(SerializerTimingMixin, viewsets.ModelViewSet):
     """
     CRUD operations for Expense Categories
     """
@@ -1735,11 +2119,11 @@ class ExpenseCategoryViewSet(viewsets.ModelViewSet):
     ordering = ['name']
 
 # ==================== FINANCIAL RECORD CRUD ====================
-class FinancialRecordViewSet(viewsets.ModelViewSet):
+class FinancialRecordViewSet(SerializerTimingMixin, viewsets.ModelViewSet):
     """
     CRUD operations for Financial Records with automatic reporting
     """
-    queryset = FinancialRecord.objects.all()
+    queryset = FinancialRecord.objects.select_related('source', 'expense_category')
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     search_fields = [
         'source__name', 
@@ -2080,20 +2464,169 @@ from rest_framework.response import Response
 from .models import Document
 from .serializers import DocumentSerializer
 
-class DocumentViewSet(viewsets.ModelViewSet):
+class DocumentViewSet(SerializerTimingMixin, DownloadMixin, viewsets.ModelViewSet):
     queryset = Document.objects.all()
     serializer_class = DocumentSerializer
+    download_field = 'file'
 
-    # Optional: Custom action to download file
     @action(detail=True, methods=['get'])
     def download(self, request, pk=None):
-        document = self.get_object()
-        response = Response()
-        # You can customize the download response here
+        """Download the document file"""
+        return self.download_response(request, self.get_object())
+
+
+# ======================================// RESUMABLE UPLOADS //=====================
+from rest_framework import mixins
+from .models import UploadSession
+from .serializers import UploadSessionSerializer
+from . import uploads
+
+# target -> (viewset that creates the object, its file field)
+UPLOAD_TARGETS = {
+    UploadSession.Target.VIDEO: (VideoViewSet, 'video_file'),
+    UploadSession.Target.IMAGE: (ImageViewSet, 'image_file'),
+    UploadSession.Target.WRITINGS: (WritingsViewSet, 'document'),
+    UploadSession.Target.DOCUMENT: (DocumentViewSet, 'file'),
+}
+
+
+class UploadSessionViewSet(SerializerTimingMixin, mixins.CreateModelMixin, mixins.ListModelMixin,
+                           mixins.RetrieveModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    """
+    Resumable uploads for large media (protocol in auth_app/uploads.py).
+    The finished file goes through the create() path of the target
+    endpoint, with the same permissions and validation as a direct POST.
+    """
+    serializer_class = UploadSessionSerializer
+    http_method_names = ['get', 'post', 'patch', 'delete', 'head', 'options']
+
+    def get_queryset(self):
+        queryset = UploadSession.objects.all()
+        user = self.request.user
+        if user.is_authenticated:
+            return queryset.filter(created_by_id=user.pk)
+        if self.action == 'list':
+            return queryset.none()
+        # Anonymous uploads are addressed by their unguessable id only
+        return queryset.filter(created_by__isnull=True, expires_at__gt=timezone.now())
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response['Tus-Resumable'] = uploads.TUS_VERSION
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def options(self, request, *args, **kwargs):
+        response = super().options(request, *args, **kwargs)
+        response['Tus-Version'] = uploads.TUS_VERSION
+        response['Tus-Extension'] = uploads.TUS_EXTENSIONS
+        response['Tus-Max-Size'] = str(uploads.upload_setting('MAX_SIZE'))
+        response['Tus-Checksum-Algorithm'] = ','.join(uploads.CHECKSUM_ALGORITHMS)
         return response
 
+    def _target_view(self, target):
+        viewset, file_field = UPLOAD_TARGETS[target]
+        view = viewset(request=self.request, args=(), kwargs={}, format_kwarg=None, action='create')
+        view.headers = {}
+        return view, file_field
 
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        view, file_field = self._target_view(serializer.validated_data['target'])
+        view.check_permissions(request)
+
+        # Validate the metadata now rather than after the whole file arrived
+        metadata = serializer.validated_data.get('metadata', {})
+        if file_field in metadata:
+            return Response({'metadata': {file_field: ["The file is sent in chunks, not in metadata"]}},
+                            status=status.HTTP_400_BAD_REQUEST)
+        target_serializer = view.get_serializer(data=metadata)
+        target_serializer.is_valid()
+        errors = {name: error for name, error in target_serializer.errors.items() if name != file_field}
+        if errors:
+            return Response({'metadata': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        uploads.purge_expired()
+        user = request.user
+        session = serializer.save(
+            created_by_id=user.pk if user.is_authenticated else None, expires_at=uploads.expiry_time()
+        )
+        uploads.create_part(session)
+        headers = uploads.upload_headers(session)
+        headers['Location'] = request.build_absolute_uri(reverse('upload-detail', args=[session.pk]))
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+
+    def retrieve(self, request, *args, **kwargs):
+        session = self.get_object()
+        return Response(self.get_serializer(session).data, headers=uploads.upload_headers(session))
+
+    def partial_update(self, request, *args, **kwargs):
+        """Append one chunk (the raw request body) at Upload-Offset"""
+        session = self.get_object()
+        headers = uploads.upload_headers(session)
+        if session.status != UploadSession.Status.UPLOADING:
+            return Response({'error': f'Upload is {session.status}'}, status=status.HTTP_409_CONFLICT,
+                            headers=headers)
+        if request.content_type.split(';')[0].strip() != uploads.CHUNK_CONTENT_TYPE:
+            return Response({'error': f'Content-Type must be {uploads.CHUNK_CONTENT_TYPE}'},
+                            status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, headers=headers)
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            return Response({'error': 'Upload-Offset and Content-Length headers are required'},
+                            status=status.HTTP_400_BAD_REQUEST, headers=headers)
+        if length > uploads.upload_setting('MAX_CHUNK_SIZE') or offset + length > session.upload_length:
+            return Response({'error': 'Chunk is larger than allowed or runs past Upload-Length'},
+                            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, headers=headers)
 
+        try:
+            checksum = uploads.parse_checksum(request.headers.get('Upload-Checksum'))
+            uploads.append_chunk(session, request.stream, offset, length, checksum)
+        except uploads.OffsetMismatch as e:
+            headers['Upload-Offset'] = str(e.offset)
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT, headers=headers)
+        except uploads.UploadBusy as e:
+            return Response({'error': str(e)}, status=status.HTTP_423_LOCKED, headers=headers)
+        except uploads.ChecksumMismatch as e:
+            response = Response({'error': str(e)}, status=460, headers=headers)
+            response.reason_phrase = 'Checksum Mismatch'
+            return response
+        except uploads.UploadError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST, headers=headers)
+
+        if session.offset < session.upload_length:
+            return Response(status=status.HTTP_204_NO_CONTENT, headers=uploads.upload_headers(session))
+        return self._assemble(session)
+
+    def _assemble(self, session):
+        """Create the target object from the finished part file"""
+        view, file_field = self._target_view(session.target)
+        upload = uploads.assembled_upload(session)
+        try:
+            serializer = view.get_serializer(data={**session.metadata, file_field: upload})
+            if not serializer.is_valid():
+                session.set_fields(status=UploadSession.Status.FAILED, error=serializer.errors)
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST,
+                                headers=uploads.upload_headers(session))
+            view.perform_create(serializer)
+        except ValidationError as e:
+            session.set_fields(status=UploadSession.Status.FAILED, error=e.detail)
+            return Response(e.detail, status=status.HTTP_400_BAD_REQUEST, headers=uploads.upload_headers(session))
+        except Exception:
+            # The part file goes below, so the session cannot be resumed: say so
+            # instead of leaving it UPLOADING with offset == upload_length
+            logger.exception("Could not create the %s of upload %s", session.target, session.pk)
+            session.set_fields(status=UploadSession.Status.FAILED,
+                               error={'error': 'The upload could not be stored, start a new one'})
+            raise
+        finally:
+            upload.close()
+            # Left behind only if the storage had to copy instead of move
+            uploads.discard_part(session)
+
+        session.set_fields(status=UploadSession.Status.COMPLETE, result_id=serializer.instance.pk)
+        headers = uploads.upload_headers(session)
+        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
 
 # ======================================// APTEC VIEWS //=====================
@@ -2104,16 +2637,16 @@ from rest_framework import status
 from .models import APTEC, APTEC_MISSION
 from .serializers import APTECSerializer, APTEC_MISSIONSerializer
 
-class APTECViewSet(viewsets.ModelViewSet):
+class APTECViewSet(SerializerTimingMixin, viewsets.ModelViewSet):
     queryset = APTEC.objects.all()
     serializer_class = APTECSerializer
 
-class APTEC_MISSIONViewSet(viewsets.ModelViewSet):
+class APTEC_MISSIONViewSet(SerializerTimingMixin, viewsets.ModelViewSet):
     queryset = APTEC_MISSION.objects.all()
     serializer_class = APTEC_MISSIONSerializer
     
     def get_queryset(self):
-        queryset = APTEC_MISSION.objects.all()
+        queryset = APTEC_MISSION.objects.select_related('aptec_group')
         aptec_group_id = self.request.query_params.get('aptec_group_id')
         success_reached = self.request.query_params.get('success_reached')
         
@@ -2123,3 +2656,115 @@ class APTEC_MISSIONViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(success_reached=success_reached)
             
         return queryset
+
+
+# ======================================// METRICS //=====================
+from django.http import HttpResponse
+from rest_framework import permissions
+from rest_framework.views import APIView
+from .middleware import registry
+from .permissions import IsAdmin
+
+class MetricsAPIView(APIView):
+    """Per-route request metrics from RouteMetricsMiddleware, in Prometheus text format"""
+    permission_classes = [permissions.IsAuthenticated, IsAdmin]
+
+    def get(self, request):
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# ======================================// MEDIA STREAMING //=====================
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404
+from django.utils._os import safe_join
+from django.views.decorators.http import require_safe
+from . import downloads, imaging
+
+@require_safe
+def serve_media(request, path):
+    """
+    Files under MEDIA_ROOT with Range, multi-range and conditional request
+    support, so players can seek in videos without downloading them whole.
+    Image variants that were not generated yet are generated on the spot.
+    """
+    if any(part.startswith('.') for part in path.split('/')):
+        # Hidden entries, e.g. the content store's .blobs/
+        raise Http404("File not found")
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("File not found")
+    derivative = imaging.is_derivative(path)
+    if not os.path.isfile(full_path) and not (derivative and imaging.ensure_derivative(path)):
+        raise Http404("File not found")
+    response = downloads.send_file(request, full_path)
+    if derivative:
+        # Variant names change with the source file
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+# ======================================// IMAGE RESIZING //=====================
+from django.http import HttpResponseBadRequest, HttpResponseForbidden
+from . import resizing
+
+@require_safe
+def resize_media(request, width, height, path):
+    """
+    A picture under MEDIA_ROOT resized on demand, from the resize cache
+    (protocol in auth_app/resizing.py).
+    """
+    width, height = int(width), int(height)
+    mode = request.GET.get('mode', 'fit')
+    fmt = request.GET.get('format') or None
+    try:
+        resizing.check_request(path, width, height, mode, fmt, request.GET.get('sig'))
+    except resizing.SignatureError as e:
+        return HttpResponseForbidden(str(e))
+    except resizing.ResizeError as e:
+        return HttpResponseBadRequest(str(e))
+    try:
+        cached, content_type = resizing.get_or_render(path, width, height, mode, fmt)
+    except resizing.RenderTimeout as e:
+        response = HttpResponse(str(e), status=503, content_type='text/plain')
+        response['Retry-After'] = '5'
+        return response
+    except resizing.ResizeError:
+        raise Http404("File not found")
+    response = downloads.send_file(request, cached, content_type=content_type)
+    response['Cache-Control'] = 'public, max-age=86400'
+    return response
+
+
+class ResizeURLAPIView(APIView):
+    """
+    Signed media-resize URLs for sizes outside IMAGE_RESIZE['SIZES'].
+    GET ?path=<media path>&size=300x200[&size=...][&mode=crop][&format=webp]
+    Admins may sign any size, other users the IMAGE_RESIZE['SIGNED_SIZES'].
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        path = request.query_params.get('path', '')
+        mode = request.query_params.get('mode', 'fit')
+        fmt = request.query_params.get('format') or None
+        sizes = request.query_params.getlist('size')
+        if not path or not sizes:
+            return Response({'error': 'path and size are required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        signable = set(resizing.resize_setting('SIZES')) | set(resizing.resize_setting('SIGNED_SIZES'))
+        urls = {}
+        for size in sizes[:20]:
+            try:
+                width, height = (int(value) for value in size.split('x'))
+                resizing.validate(path, width, height, mode, fmt)
+            except ValueError:
+                return Response({'error': f'Invalid size {size!r}; use <width>x<height>'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            except resizing.ResizeError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            if f'{width}x{height}' not in signable and not request.user.is_admin:
+                return Response({'error': f'Size {size!r} can only be signed by admins'},
+                                status=status.HTTP_403_FORBIDDEN)
+            urls[size] = request.build_absolute_uri(resizing.resize_url(path, width, height, mode, fmt))
+        return Response({'urls': urls})
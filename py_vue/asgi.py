@@ -5,6 +5,10 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Serve the app through this entry point (e.g. ``uvicorn py_vue.asgi:application``)
+so the message event stream (api/messages/events/) can hold connections open
+without tying up a worker thread per client.
 """
 
 import os
@@ -40,6 +40,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # ⚠️ CORS middleware must be at the top
+    'auth_app.middleware.RouteMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -101,6 +102,44 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# --------------------
+# Password hashing (auth performance mode)
+# --------------------
+# 'scrypt' (stdlib), 'argon2' (needs argon2-cffi) or 'pbkdf2' (Django default).
+# Hashes made by the other hashers below are still accepted and are rehashed
+# with the active profile on the next successful login.
+AUTH_HASHER_PROFILE = 'scrypt'
+
+# scrypt memory per hash: 128 * work_factor * block_size bytes (16 MB here).
+AUTH_HASHER_PARAMS = {
+    'scrypt_work_factor': 2 ** 14,
+    'scrypt_block_size': 8,
+    'scrypt_parallelism': 1,
+    'argon2_time_cost': 2,
+    'argon2_memory_cost': 19456,  # KiB
+    'argon2_parallelism': 1,
+}
+
+AUTH_HASHER_PROFILES = {
+    'scrypt': 'auth_app.hashers.TunedScryptPasswordHasher',
+    'argon2': 'auth_app.hashers.TunedArgon2PasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+PASSWORD_HASHERS = [AUTH_HASHER_PROFILES[AUTH_HASHER_PROFILE]] + [
+    hasher for hasher in (
+        'auth_app.hashers.TunedScryptPasswordHasher',
+        'auth_app.hashers.TunedArgon2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    ) if hasher != AUTH_HASHER_PROFILES[AUTH_HASHER_PROFILE]
+]
+
+# Offload hashing to a bounded thread pool so login bursts cannot take every core.
+AUTH_PERFORMANCE_MODE = True
+AUTH_HASHER_POOL_SIZE = max(1, (os.cpu_count() or 2) // 2)
+AUTH_HASHER_QUEUE_DEPTH = AUTH_HASHER_POOL_SIZE * 8
+AUTH_HASHER_QUEUE_TIMEOUT = 5  # seconds before answering 503
+
 # --------------------
 # Internationalization
 # --------------------
@@ -121,7 +160,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # --------------------
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'auth_app.authentication.StatelessJWTAuthentication',
         'rest_framework.authentication.TokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
@@ -148,6 +187,114 @@ REST_FRAMEWORK = {
     ],
 }
 
+# --------------------
+# JWT Settings
+# --------------------
+# Tokens carry role/is_active claims so StatelessJWTAuthentication can build
+# request.user without a database query.
+SIMPLE_JWT = {
+    'TOKEN_OBTAIN_SERIALIZER': 'auth_app.authentication.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'auth_app.authentication.ClaimsTokenRefreshSerializer',
+}
+
+# In-process cache of user rows used when a view needs the full CustomUser.
+# Entries are invalidated on save in this process; other processes see the
+# change within AUTH_USER_CACHE_TTL seconds.
+AUTH_USER_CACHE_TTL = 30
+AUTH_USER_CACHE_SIZE = 1024
+
+# --------------------
+# Cache / OTP store
+# --------------------
+# Password reset OTPs, attempt counters and throttles live in the cache.
+# LocMemCache is per process; use a shared backend (e.g. Redis) when running
+# several workers so counters and codes are seen by every process.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'py-vue-default',
+    }
+}
+
+OTP_STORE = {
+    'TTL': 600,
+    'MAX_ATTEMPTS': 3,
+    'LOCKOUT': 1800,
+    'THROTTLE_WINDOW': 3600,
+    'REQUESTS_PER_EMAIL': 5,
+    'REQUESTS_PER_IP': 20,
+    'VERIFY_PER_IP': 30,
+}
+
+# --------------------
+# Message events (server-sent events)
+# --------------------
+# api/messages/events/ streams message.created / unread.count events. It needs
+# the ASGI entry point (py_vue/asgi.py); under WSGI it returns one snapshot.
+MESSAGE_EVENTS = {
+    'HISTORY': 256,
+    'QUEUE_SIZE': 100,
+    'KEEPALIVE': 15,
+    'DB_POLL_INTERVAL': 30,
+    'RETRY': 3000,
+}
+
+# --------------------
+# Video transcoding
+# --------------------
+# New uploads are transcoded in the background into MP4 + HLS renditions
+# (auth_app/transcoding.py). Videos left pending by a restart:
+# `python manage.py transcode_videos --pending`.
+VIDEO_TRANSCODING = {
+    'ENABLED': True,
+    'WORKERS': 1,
+    'LADDER': [(240, 400_000, 64_000), (480, 1_000_000, 96_000), (720, 2_500_000, 128_000)],
+    'SEGMENT_SECONDS': 6,
+}
+
+# --------------------
+# Image variants
+# --------------------
+# Thumbnails / srcset candidates of uploaded images in WebP and JPEG
+# (auth_app/imaging.py), scaled to these widths and never upscaled.
+IMAGE_DERIVATIVES = {
+    'ENABLED': True,
+    'SIZES': {'thumb': 320, 'medium': 800, 'large': 1600},
+    'FORMATS': ('webp', 'jpeg'),
+    'QUALITY': {'webp': 80, 'jpeg': 82},
+}
+
+# media-resize/<w>x<h>/<path>: arbitrary sizes of uploaded pictures, cached
+# on disk and evicted least recently used first beyond MAX_CACHE_SIZE. Sizes
+# not listed in SIZES need a signed URL (api/media-resize/sign/).
+IMAGE_RESIZE = {
+    'CACHE_DIR': os.path.join(BASE_DIR, 'resize_cache'),
+    'MAX_CACHE_SIZE': 512 * 1024 * 1024,
+    'MAX_DIMENSION': 2400,
+    'SIZES': ('64x64', '128x128', '256x256', '320x0', '640x0'),
+}
+
+# --------------------
+# API metrics / logging
+# --------------------
+# Fraction of requests RouteMetricsMiddleware times (latency, queries,
+# serializer and render histograms). Every request is counted whatever the
+# rate; with the default 0 the timing histograms stay empty, so set e.g. 0.05
+# to time one request in twenty. Metrics are served to admins at api/metrics/
+# in Prometheus text format.
+API_METRICS_SAMPLE_RATE = 0
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'auth_app': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
 # --------------------
 # CORS Settings
 # --------------------
@@ -195,9 +342,24 @@ MAX_RETRIES = 100
 
 # Session settings for maximum security
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True  # Session ends when browser closes
+
+# Login returns JWTs only and does not create a session row / rotate the cookie.
+# Set to False if a client still relies on session authentication after api/login/.
+AUTH_TOKEN_ONLY_LOGIN = True
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploads are stored once per distinct content (auth_app/storage.py): each
+# file name is a hard link to a blob in MEDIA_ROOT/.blobs/, reference counted
+# in FileBlob. `python manage.py dedupe_media` folds in older duplicates.
+STORAGES = {
+    'default': {'BACKEND': 'auth_app.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+CONTENT_STORAGE = {
+    'BLOB_DIR': '.blobs',
+}
+
 # Add these to your existing settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 52428800  # 50MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 52428800  # 50MB
@@ -207,4 +369,24 @@ DATA_UPLOAD_MAX_NUMBER_FIELDS = 1000    # Increase if needed
 FILE_UPLOAD_HANDLERS = [
     'django.core.files.uploadhandler.TemporaryFileUploadHandler',
     'django.core.files.uploadhandler.MemoryFileUploadHandler',
-]
\ No newline at end of file
+]
+
+# Resumable uploads (api/uploads/, see auth_app/uploads.py). Part files live in
+# DIRECTORY, which must be on the same filesystem as MEDIA_ROOT so the
+# finished file is moved rather than copied.
+UPLOAD_SESSIONS = {
+    'DIRECTORY': os.path.join(BASE_DIR, 'upload_sessions'),
+    'MAX_SIZE': 500 * 1024 * 1024,
+    'MAX_CHUNK_SIZE': 32 * 1024 * 1024,
+    'EXPIRY': 24 * 3600,
+}
+
+# File downloads (auth_app/downloads.py). Set SENDFILE_BACKEND to
+# 'x-accel-redirect' (nginx, with an internal location ACCEL_PREFIX aliased
+# to MEDIA_ROOT) or 'x-sendfile' (Apache mod_xsendfile) to let the front
+# proxy send file bodies. MAX_BUNDLE_FILES caps the ZIP bundle endpoints.
+DOWNLOADS = {
+    'SENDFILE_BACKEND': None,
+    'ACCEL_PREFIX': '/protected-media/',
+    'MAX_BUNDLE_FILES': 1000,
+}